@@ -0,0 +1,213 @@
+"""
+Measures the migration end to end against the local stub servers (benchmarks/stub_servers.py).
+
+Each scenario runs importer.py on a fresh dataset and migration ledger, and reports the duration, the number of
+migrated issues/pages per second and the number of requests per entity. The request counts can be saved as a
+baseline, a later run fails if a scenario sends more requests to an entity than the baseline (plus a tolerance),
+which catches the round trip regressions without depending on the speed of the machine. The order of the
+migrated issues changes the relations to create when several threads are used, run the baseline comparisons
+with -t 1 to get the same request counts on every run.
+
+    python benchmarks/bench_e2e.py [--scenario NAME] [--issues N] [--pages N] [--latency MS] [--error-rate RATE]
+                                   [--rate-limit RPS] [--save-baseline FILE] [--baseline FILE] [--tolerance RATIO]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import benchmarks.stub_servers as stub_servers
+
+IMPORTER = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'importer.py')
+
+# Name, arguments of the importer (formatted with the dataset sizes) and migrated entity of each scenario.
+SCENARIOS = [
+    ('issue', ['-i', '1'], 'issues'),
+    ('issues', ['-i', '1-{issues}'], 'issues'),
+    ('wiki-section', ['-w', 'Page_1', '-m'], 'pages'),
+    ('wiki-all', ['-w', 'Wiki', '-a'], 'pages'),
+]
+
+
+def write_config(directory, servers):
+    """
+    Writes the YAML file of the importer for the stub servers.
+    """
+    config = {
+        'redmine_server': servers['redmine'].url,
+        'redmine_apikey': 'bench',
+        'redmine_wiki_project': stub_servers.PROJECT_IDENTIFIER,
+        'jira_server': servers['jira'].url,
+        'jira_user': 'bench',
+        'jira_password': stub_servers.PASSWORD,
+        'jira_project': stub_servers.JIRA_PROJECT,
+        'confluence_server': servers['confluence'].url,
+        'confluence_user': 'bench',
+        'confluence_password': stub_servers.PASSWORD,
+        'confluence_space': stub_servers.CONFLUENCE_SPACE,
+        'ledger_file': os.path.join(directory, 'migration_ledger.db'),
+        'issue_types': {'DEFAULT': 'Story', 'NPD': 'Story', 'SPIKE': 'Spike', 'EPIC': 'Epic'},
+        'issue_relations': {'relates': 'Relates'},
+        'teams': {},
+        'fix_versions': {},
+        'assignee': {},
+        'work_type': {'NPD': 'New Product Development'},
+        'esc_stories': {},
+        'esc_priorites': {},
+        'issue_status': {'in progress': [11, 21], 'to do': [11]},
+        'subtask_status': {'in progress': [21]},
+    }
+    path = os.path.join(directory, 'bench.yaml')
+    with open(path, 'w') as file_handle:
+        # JSON is valid YAML, the benchmark does not need PyYAML.
+        json.dump(config, file_handle, indent=2)
+    return path
+
+
+def run_scenario(name, arguments, entity, args):
+    """
+    Runs the importer on a fresh dataset.
+    Returns:
+        A dictionary with the results of the scenario.
+    """
+    dataset = stub_servers.Dataset(issues=args.issues, pages=args.pages, journals=args.journals,
+                                   attachments=args.attachments, attachment_size=args.attachment_size,
+                                   subtasks=args.subtasks)
+    stats, servers = stub_servers.start(dataset, args.latency / 1000.0, args.error_rate,
+                                       rate_limit=args.rate_limit)
+    directory = tempfile.mkdtemp(prefix='bench-e2e-')
+    try:
+        config = write_config(directory, servers)
+        command = [args.python, IMPORTER, '-yml', config, '-t', str(args.threads)] + \
+                  [argument.format(issues=args.issues) for argument in arguments]
+        start = time.perf_counter()
+        process = subprocess.run(command, cwd=directory, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                 universal_newlines=True)
+        elapsed = time.perf_counter() - start
+    finally:
+        for server in servers.values():
+            server.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if entity == 'issues':
+        migrated = len(servers['jira'].issues)
+        attachments = sum(issue['attachments'] for issue in servers['jira'].issues.values())
+    else:
+        migrated = len(servers['confluence'].pages)
+        attachments = sum(page['attachments'] for page in servers['confluence'].pages.values())
+    snapshot = stats.snapshot()
+    return {
+        'scenario': name,
+        'returncode': process.returncode,
+        'output': process.stdout,
+        'elapsed': elapsed,
+        'entity': entity,
+        'migrated': migrated,
+        # Attachments downloaded from Redmine and attachments added to Jira/Confluence.
+        'downloaded_attachments': snapshot['requests'].get('redmine:attachment_download', 0),
+        'attachments': attachments,
+        'rate': migrated / elapsed if elapsed else 0.0,
+        'requests': snapshot['requests'],
+        'errors': snapshot['errors'],
+        'bytes_sent': snapshot['bytes_sent'],
+    }
+
+
+def compare(result, baseline, tolerance):
+    """
+    Returns the regressions of the request counts of a scenario compared with the baseline.
+    """
+    regressions = []
+    expected = baseline.get(result['scenario'], {})
+    for key, count in sorted(result['requests'].items()):
+        limit = expected.get(key, 0) * (1 + tolerance)
+        if count > limit:
+            regressions.append('{}: {} requests to {} (baseline: {})'.format(
+                result['scenario'], count, key, expected.get(key, 0)))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End to end benchmark of the migration against stub servers')
+    parser.add_argument('--scenario', action='append', choices=[name for name, _, _ in SCENARIOS],
+                        help='Scenario(s) to run (default: all)')
+    parser.add_argument('--issues', type=int, default=20, help='Number of top level issues (default: 20)')
+    parser.add_argument('--pages', type=int, default=50, help='Number of Wiki pages (default: 50)')
+    parser.add_argument('--journals', type=int, default=5, help='Number of journals per issue (default: 5)')
+    parser.add_argument('--attachments', type=int, default=2,
+                        help='Number of attachments per issue/page (default: 2)')
+    parser.add_argument('--attachment-size', type=int, default=64 * 1024,
+                        help='Size of the attachments in bytes (default: 64 KB)')
+    parser.add_argument('--subtasks', type=int, default=2, help='Number of sub-tasks per issue (default: 2)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Latency of every request in ms (default: 0)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Share of the read requests failing with a 503 (default: 0)')
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='Requests per second accepted by each server, 0 for no limit (default: 0)')
+    parser.add_argument('-t', '--threads', type=int, default=4, help='Threads of the importer (default: 4)')
+    parser.add_argument('--python', default=sys.executable, help='Python interpreter running the importer')
+    parser.add_argument('--save-baseline', help='Save the request counts of the scenarios in the given file')
+    parser.add_argument('--baseline', help='Fail if the request counts exceed the ones of the given file')
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help='Tolerated increase of the request counts over the baseline (default: 0)')
+    parser.add_argument('--verbose', action='store_true', help='Print the output of the importer')
+    args = parser.parse_args()
+
+    failed = False
+    results = []
+    for name, arguments, entity in SCENARIOS:
+        if args.scenario and name not in args.scenario:
+            continue
+        result = run_scenario(name, arguments, entity, args)
+        results.append(result)
+        if args.verbose or result['returncode']:
+            print(result['output'])
+        if result['returncode']:
+            failed = True
+            print('{}: the importer exited with {}'.format(name, result['returncode']))
+        if result['requests'].get('redmine:unknown') or result['requests'].get('jira:unknown') or \
+                result['requests'].get('confluence:unknown'):
+            failed = True
+            print('{}: requests to endpoints missing in the stubs, see --verbose'.format(name))
+        if result['attachments'] < result['downloaded_attachments'] or 'Could not add attachment' in result['output']:
+            failed = True
+            print('{}: {} of {} attachments added, see --verbose'.format(
+                name, result['attachments'], result['downloaded_attachments']))
+
+    print('{:<14} {:>9} {:>9} {:>10} {:>9} {:>12}'.format(
+        'scenario', 'migrated', 'time (s)', 'items/s', 'requests', 'req/item'))
+    for result in results:
+        total = sum(result['requests'].values())
+        print('{:<14} {:>9} {:>9.2f} {:>10.2f} {:>9} {:>12.1f}'.format(
+            result['scenario'], '{} {}'.format(result['migrated'], result['entity'][0]), result['elapsed'],
+            result['rate'], total, total / float(result['migrated']) if result['migrated'] else 0.0))
+    for result in results:
+        print('\n{} - requests per entity:'.format(result['scenario']))
+        for key, count in sorted(result['requests'].items()):
+            print('  {:<32} {:>7} {:>12} bytes'.format(key, count, result['bytes_sent'].get(key, 0)))
+        for key, count in sorted(result['errors'].items()):
+            print('  {:<32} {:>7} errors'.format(key, count))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file_handle:
+            json.dump({result['scenario']: result['requests'] for result in results}, file_handle, indent=2,
+                      sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as file_handle:
+            baseline = json.load(file_handle)
+        for result in results:
+            for regression in compare(result, baseline, args.tolerance):
+                failed = True
+                print(regression)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Measures the Redmine to Jira/Confluence markup translation on the benchmark corpus.
+
+The single pass translation (helpers/markup.py) is compared with the legacy implementation, which made
+one str.replace pass per pattern and per distinct match. Both implementations must produce the same
+output on the corpus, the script exits with an error if they differ or if the translation is slower
+than the given throughput.
+
+    python benchmarks/bench_markup.py [--legacy-max-size BYTES] [--min-throughput MB/s]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import benchmarks.corpus as corpus
+import helpers.markup as markup
+
+REDMINE_SERVER = 'https://redmine.example.com'
+
+
+def resolve_link(link_markup):
+    """
+    Resolves the links in memory, the same way for both implementations.
+    """
+    return '[{}]'.format(link_markup.split('|')[0].split('#')[0].replace('_', ' '))
+
+
+def legacy_translate(description, redmine_server, wiki=False, resolve_link=None):
+    """
+    Legacy translation (settings.update_formatting before the single pass translation), with the
+    Redmine/Confluence lookups replaced by resolve_link.
+    """
+    formatted_description = description.replace('<pre><code class', '<code class')
+    formatted_description = formatted_description.replace('</code></pre>', '</code>')
+    formatted_description = formatted_description.replace('<pre>', '{noformat}')
+    formatted_description = formatted_description.replace('</pre>', '{noformat}')
+    match_inline_codes = re.findall(r"\@(.*?)\@", formatted_description)
+    for matched_inline_code in set(match_inline_codes):
+        formatted_description = formatted_description.replace(
+            '@{}@'.format(matched_inline_code), '{{' + matched_inline_code + '}}')
+    formatted_description = formatted_description.replace('*READY FOR MIGRATION TO JIRA*', '')
+    match_pbis = re.findall(r'#(\d+)', formatted_description)
+    for matched_pbi in set(match_pbis):
+        formatted_description = formatted_description.replace(
+            '#{}'.format(matched_pbi), '[#{}|{}/issues/{}]'.format(
+                matched_pbi, redmine_server, matched_pbi))
+
+    if wiki:
+        formatted_description = formatted_description.replace('{{>toc}}', '{toc}')
+        formatted_description = formatted_description.replace('||', '| | ')
+        formatted_description = formatted_description.replace('|_.', '||')
+        formatted_description = formatted_description.replace('|^.', '|')
+        formatted_description = formatted_description.replace('|>.', '|')
+        formatted_description = formatted_description.replace('|<.', '|')
+        formatted_description = formatted_description.replace('|~.', '|')
+        formatted_description = formatted_description.replace('|=.', '|')
+        formatted_description = formatted_description.replace('|_<.', '||')
+        formatted_description = formatted_description.replace('<notextile>', '')
+        formatted_description = formatted_description.replace('</notextile>', '')
+        formatted_description = formatted_description.replace('<code>', '{code}')
+        formatted_description = formatted_description.replace('</code>', '{code}')
+        match_source_code = re.findall(r"<code class=\"(.*?)\">", formatted_description)
+        match_child_macro = re.findall(r"{{child_pages\(depth=(.*?)\)}}", formatted_description)
+        match_single_square_markup = re.findall(r"\[(.*?)\]", formatted_description)
+        match_double_square_markup = re.findall(r"\[\[(.*?)\]\]", formatted_description)
+        match_pc_markup = re.findall(r"%(.*?)%", formatted_description)
+        match_bg_markup = re.findall(r"{background:(.*?)}", formatted_description)
+        for matched_code in set(match_pc_markup):
+            formatted_description = formatted_description.replace(
+                '%{}%'.format(matched_code), '*{}*'.format(matched_code))
+        for matched_code in set(match_bg_markup):
+            formatted_description = formatted_description.replace(
+                '{{background:{}}}'.format(matched_code), '')
+        for matched_code in set(match_source_code):
+            formatted_description = formatted_description.replace(
+                '<code class="{}">'.format(matched_code), '{{code:language={}}}'.format(matched_code))
+        for matched_macro in set(match_child_macro):
+            formatted_description = formatted_description.replace(
+                '{{child_pages(depth={0})}}'.format(matched_macro),
+                'children:sort=creation|depth={0}'.format(matched_macro))
+        for matched_square_markup in set(match_single_square_markup):
+            if not matched_square_markup.startswith('[') and \
+                    matched_square_markup[1:] not in set(match_double_square_markup):
+                formatted_description = formatted_description.replace(
+                    '[{0}]'.format(matched_square_markup), '[[{0}]]'.format(matched_square_markup))
+        for matched_square_markup in set(match_double_square_markup):
+            formatted_description = formatted_description.replace(
+                '[[{0}]]'.format(matched_square_markup), resolve_link(matched_square_markup))
+    return formatted_description
+
+
+def measure(function, text, wiki):
+    start = time.perf_counter()
+    result = function(text, REDMINE_SERVER, wiki=wiki, resolve_link=resolve_link)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the markup translation')
+    parser.add_argument('--legacy-max-size', type=int, default=corpus.ONE_MB,
+                        help='Largest page also translated with the legacy implementation (default: 1 MB)')
+    parser.add_argument('--min-throughput', type=float, default=0.0,
+                        help='Fail if the translation of a page is slower than the given MB/s')
+    parser.add_argument('--only', action='append', help='Name of the page(s) of the corpus to run')
+    args = parser.parse_args()
+
+    failed = False
+    print('{:<18} {:<6} {:>10} {:>10} {:>10} {:>10} {:>8}'.format(
+        'page', 'mode', 'size', 'time (s)', 'MB/s', 'legacy (s)', 'speedup'))
+    for name, kind, size in corpus.CORPUS:
+        if args.only and name not in args.only:
+            continue
+        text = corpus.generate(kind, size)
+        megabytes = len(text) / float(corpus.ONE_MB)
+        for wiki in (False, True):
+            result, elapsed = measure(markup.translate, text, wiki)
+            throughput = megabytes / elapsed if elapsed else float('inf')
+            legacy_elapsed, speedup = '-', '-'
+            if size <= args.legacy_max_size:
+                legacy_result, legacy_time = measure(legacy_translate, text, wiki)
+                legacy_elapsed = '{:.3f}'.format(legacy_time)
+                speedup = '{:.1f}x'.format(legacy_time / elapsed if elapsed else float('inf'))
+                if legacy_result != result:
+                    failed = True
+                    print('{}: output differs from the legacy translation'.format(name))
+            if throughput < args.min_throughput:
+                failed = True
+                print('{}: throughput {:.2f} MB/s is below {:.2f} MB/s'.format(
+                    name, throughput, args.min_throughput))
+            print('{:<18} {:<6} {:>10} {:>10.3f} {:>10.2f} {:>10} {:>8}'.format(
+                name, 'wiki' if wiki else 'jira', len(text), elapsed, throughput, legacy_elapsed, speedup))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark corpus of Redmine Wiki pages/issue descriptions used to measure the markup translation.
+Pages are generated from a fixed seed, so the same corpus is produced on every run.
+"""
+
+import random
+
+SMALL = 4 * 1024
+ONE_MB = 1024 * 1024
+TEN_MB = 10 * 1024 * 1024
+
+# Name, kind and approximate size (in characters) of each page of the corpus.
+CORPUS = [
+    ('synthetic-small', 'synthetic', SMALL),
+    ('synthetic-1mb', 'synthetic', ONE_MB),
+    ('synthetic-10mb', 'synthetic', TEN_MB),
+    ('page-small', 'page', SMALL),
+    ('page-1mb', 'page', ONE_MB),
+    ('page-10mb', 'page', TEN_MB),
+]
+
+_WORDS = ['release', 'server', 'install', 'the', 'configure', 'client', 'build', 'and', 'with',
+          'migration', 'database', 'for', 'user', 'report', 'test', 'to', 'of', 'backup', 'license']
+
+_CODE = ['def update(value):', '    result = value + 1', '    return result', 'for item in items:',
+         '    print(item)', 'SELECT name FROM users WHERE id = 1;', 'make install']
+
+
+def _words(rnd, count):
+    return ' '.join(rnd.choice(_WORDS) for _ in range(count))
+
+
+def _issue(rnd):
+    # Issue numbers have the same length, see the legacy translation in bench_markup.py.
+    return '#{}'.format(rnd.randint(1000, 9999))
+
+
+def _link(rnd):
+    title = 'Page_{}'.format(rnd.randint(1, 300))
+    return rnd.choice(['[[{}]]', '[[{}|Label]]', '[[{}#Section|Label]]']).format(title)
+
+
+def _code_block(rnd):
+    lines = '\n'.join(rnd.choice(_CODE) for _ in range(rnd.randint(2, 8)))
+    return rnd.choice(['<pre>{}</pre>', '<pre><code class="python">{}</code></pre>',
+                       '<code>{}</code>']).format(lines)
+
+
+def _synthetic_piece(rnd):
+    return rnd.choice([
+        lambda: _words(rnd, 6),
+        lambda: _issue(rnd),
+        lambda: '@{}@'.format(_words(rnd, 2)),
+        lambda: '%{{color:red}}{}%'.format(_words(rnd, 2)),
+        lambda: '{background:#ddd}',
+        lambda: _link(rnd),
+        lambda: '[{}]'.format(rnd.choice(['optional', 'draft', 'todo'])),
+        lambda: '|_. {} |_. {} |\n| {} |>. {} ||'.format(*[_words(rnd, 1) for _ in range(4)]),
+        lambda: '<notextile>{}</notextile>'.format(_words(rnd, 2)),
+        lambda: '\n' + _code_block(rnd) + '\n',
+        lambda: '\n',
+        lambda: '100% {}\n'.format(_words(rnd, 3)),
+    ])()
+
+
+def _page_section(rnd, number):
+    rows = '\n'.join('| {} | {} | {} |'.format(_issue(rnd), _words(rnd, 3), rnd.choice(['yes', 'no', '']))
+                     for _ in range(rnd.randint(2, 6)))
+    return '\n'.join([
+        'h2. {} {}'.format(number, _words(rnd, 3).capitalize()),
+        '',
+        '{} (see {} and {}), {}.'.format(_words(rnd, 12), _issue(rnd), _link(rnd), _words(rnd, 8)),
+        '',
+        '* {} @{}@'.format(_words(rnd, 5), _words(rnd, 1)),
+        '* %{{color:red}}{}% {}'.format(_words(rnd, 2), _words(rnd, 4)),
+        '* {} [{}]'.format(_words(rnd, 4), rnd.choice(['optional', 'draft', 'todo'])),
+        '',
+        '|_. Issue |_. Description |_. Done |',
+        rows,
+        '',
+        _code_block(rnd),
+        '',
+        '{} {}'.format(_words(rnd, 20), _link(rnd)),
+        '',
+    ])
+
+
+def generate(kind, size, seed=0):
+    """
+    Generates a page of the corpus.
+    Parameters:
+        kind (str): 'synthetic' for a random mix of all the supported markup, 'page' for a page
+            shaped like the real Wiki pages (headings, lists, tables and code blocks).
+        size (int): Approximate size of the page in characters.
+        seed (int): Seed of the random generator.
+    Returns:
+        Returns the page text.
+    """
+    rnd = random.Random('{}-{}-{}'.format(kind, size, seed))
+    if kind == 'page':
+        parts = ['{{>toc}}\n\nh1. ' + _words(rnd, 3).capitalize() + '\n\n*READY FOR MIGRATION TO JIRA*\n',
+                 '{{child_pages(depth=2)}}\n']
+    else:
+        parts = []
+    length = sum(len(part) for part in parts)
+    number = 1
+    while length < size:
+        part = _page_section(rnd, number) if kind == 'page' else _synthetic_piece(rnd) + ' '
+        parts.append(part)
+        length += len(part)
+        number += 1
+    return ''.join(parts)
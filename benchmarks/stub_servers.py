@@ -0,0 +1,709 @@
+"""
+Local stand-ins of the Redmine, Jira and Confluence servers, used to measure the migration without live servers.
+
+The servers implement the endpoints used by the importer on a generated dataset (users, issues with journals,
+relations, checklists, attachments and sub-tasks, and a Wiki with a hierarchy of pages). A latency can be added to
+every request and a share of the read requests can fail with a 503, to exercise the retries. Requests are counted
+per server and entity.
+
+    python benchmarks/stub_servers.py [--issues N] [--pages N] [--latency MS] [--error-rate RATE]
+"""
+
+import argparse
+import base64
+import collections
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import benchmarks.corpus as corpus
+
+PROJECT_ID = 1
+PROJECT_IDENTIFIER = 'bench'
+JIRA_PROJECT = 'BENCH'
+CONFLUENCE_SPACE = 'BENCH'
+# Password of the Jira and Confluence stubs, base64 encoded as in the YAML file.
+PASSWORD = base64.b64encode(b'bench').decode('ascii')
+STATUS_IN_PROGRESS = {'id': 2, 'name': 'In Progress'}
+KNOWN_MACROS = ['code', 'noformat', 'toc', 'children', 'info', 'note', 'panel', 'jira']
+
+
+class Dataset(object):
+    """
+    Generated Redmine content, the same content is produced for the same parameters.
+    """
+
+    def __init__(self, issues=20, pages=50, users=30, journals=5, attachments=2, attachment_size=64 * 1024,
+                 subtasks=2, fanout=4, text_size=2048, seed=0):
+        rnd = random.Random(seed)
+        self.users = [{'id': user_id, 'login': 'user{}'.format(user_id), 'firstname': 'First{}'.format(user_id),
+                       'lastname': 'Last{}'.format(user_id), 'mail': 'user{}@example.com'.format(user_id)}
+                      for user_id in range(1, users + 1)]
+        self.attachments = dict()
+        self.issues = dict()
+        self.relations = collections.defaultdict(list)
+        next_id = issues + 1
+        for issue_id in range(1, issues + 1):
+            self.issues[issue_id] = self._issue(rnd, issue_id, None, journals, attachments, attachment_size,
+                                                text_size)
+            if issue_id < issues:
+                relation = {'id': issue_id, 'issue_id': issue_id, 'issue_to_id': issue_id + 1,
+                            'relation_type': 'relates', 'delay': None}
+                self.relations[issue_id].append(relation)
+                self.relations[issue_id + 1].append(relation)
+            for _ in range(subtasks):
+                self.issues[next_id] = self._issue(rnd, next_id, issue_id, journals, attachments, attachment_size,
+                                                   text_size)
+                next_id += 1
+
+        self.pages = collections.OrderedDict()
+        for index in range(pages):
+            title = 'Wiki' if index == 0 else 'Page_{}'.format(index)
+            parent = None if index == 0 else ('Wiki' if index <= fanout else 'Page_{}'.format((index - 1) // fanout))
+            text = corpus.generate('page', text_size, seed=seed + 100000 + index)
+            self.pages[title] = {
+                'title': title,
+                'parent': {'title': parent} if parent else None,
+                'text': text,
+                'version': 1 if index % 3 else 3,
+                'author': self._user_ref(rnd),
+                'created_on': '2019-01-01T10:00:00Z',
+                'updated_on': '2020-01-01T10:00:00Z',
+                'attachments': [self._attachment(rnd, attachment_size) for _ in range(attachments)],
+            }
+
+    def _user_ref(self, rnd):
+        user = rnd.choice(self.users)
+        return {'id': user['id'], 'name': '{} {}'.format(user['firstname'], user['lastname'])}
+
+    def _attachment(self, rnd, size):
+        attachment_id = len(self.attachments) + 1
+        content = bytes(rnd.getrandbits(8) for _ in range(min(size, 256))) * (size // 256 + 1)
+        content = content[:size]
+        self.attachments[attachment_id] = content
+        return {'id': attachment_id, 'filename': 'file{}.bin'.format(attachment_id), 'filesize': size,
+                'content_type': 'application/octet-stream', 'description': '',
+                'digest': hashlib.md5(content).hexdigest(), 'author': {'id': 1, 'name': 'First1 Last1'},
+                'created_on': '2019-01-01T10:00:00Z'}
+
+    def _issue(self, rnd, issue_id, parent_id, journals, attachments, attachment_size, text_size):
+        issue = {
+            'id': issue_id,
+            'project': {'id': PROJECT_ID, 'name': 'Bench'},
+            'tracker': {'id': 2, 'name': 'Feature'},
+            'status': dict(STATUS_IN_PROGRESS),
+            'priority': {'id': 2, 'name': 'Normal'},
+            'author': self._user_ref(rnd),
+            'assigned_to': self._user_ref(rnd),
+            'subject': '[NPD] Issue {}'.format(issue_id),
+            'description': corpus.generate('synthetic', text_size, seed=issue_id),
+            'start_date': '2019-01-01',
+            'done_ratio': 0,
+            'spent_hours': 1.5,
+            'custom_fields': [{'id': 1, 'name': 'Is Ready', 'value': 'Yes'},
+                              {'id': 2, 'name': 'Is Reviewed', 'value': 'Yes'},
+                              {'id': 3, 'name': 'Live Demo', 'value': 'no'}],
+            'created_on': '2019-01-01T10:00:00Z',
+            'updated_on': '2020-01-01T10:00:00Z',
+            'journals': [{'id': issue_id * 1000 + index, 'user': self._user_ref(rnd),
+                          'notes': 'Note {} of #{}: {}'.format(index, issue_id,
+                                                               corpus.generate('synthetic', 256, seed=index)),
+                          'created_on': '2019-01-02T10:00:00Z',
+                          'details': [{'property': 'attr', 'name': 'story_points', 'old_value': None,
+                                       'new_value': str(index + 1)}]}
+                         for index in range(journals)],
+            'attachments': [self._attachment(rnd, attachment_size) for _ in range(attachments)],
+            'checklists': [{'id': issue_id * 10 + index, 'subject': 'Check {}'.format(index),
+                            'is_done': index % 2 == 0} for index in range(2)],
+        }
+        if parent_id:
+            issue['parent'] = {'id': parent_id}
+        return issue
+
+
+class Stats(object):
+    """
+    Counts the requests per server and entity.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = collections.Counter()
+        self.errors = collections.Counter()
+        self.bytes_sent = collections.Counter()
+
+    def add(self, server, entity, status, size):
+        with self._lock:
+            key = '{}:{}'.format(server, entity)
+            self.requests[key] += 1
+            self.bytes_sent[key] += size
+            if status >= 400:
+                self.errors['{} {}'.format(key, status)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'requests': dict(self.requests), 'errors': dict(self.errors),
+                    'bytes_sent': dict(self.bytes_sent)}
+
+
+def _entity(name):
+    """
+    Decorator naming the entity of a route, used to count the requests.
+    """
+    def decorate(function):
+        function.entity = name
+        return function
+    return decorate
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Stub HTTP server, the routes are the (method, pattern, handler) of the subclasses.
+    """
+    daemon_threads = True
+    name = 'stub'
+    routes = []
+
+    def __init__(self, dataset, stats, latency=0.0, error_rate=0.0, seed=0, host='127.0.0.1', port=0,
+                 rate_limit=0.0):
+        ThreadingHTTPServer.__init__(self, (host, port), StubHandler)
+        self.dataset = dataset
+        self.stats = stats
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self._tokens = rate_limit
+        self._refilled = time.time()
+        self.lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self.server_address)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def inject_error(self, method):
+        if not self.error_rate or method not in ('GET', 'HEAD'):
+            return False
+        with self.lock:
+            return self._random.random() < self.error_rate
+
+    def throttle(self):
+        """
+        Token bucket of the rate limit (requests per second, bursts of up to one second of requests).
+        Returns:
+            The delay (in seconds) before a token is available, None if the request is accepted.
+        """
+        if not self.rate_limit:
+            return None
+        with self.lock:
+            now = time.time()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            return (1 - self._tokens) / self.rate_limit
+
+    def dispatch(self, method, path, query, body):
+        for route_method, pattern, handler in self.routes:
+            if route_method != method:
+                continue
+            match = re.match(pattern + '$', path)
+            if match:
+                return getattr(self, handler).entity, getattr(self, handler)(match, query, body)
+        return 'unknown', (404, {'errorMessages': ['No stub for {} {}'.format(method, path)]})
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _handle(self):
+        server = self.server
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if server.latency:
+            time.sleep(server.latency)
+
+        retry_after = server.throttle()
+        if retry_after is not None:
+            entity, result = 'throttled', (429, {'message': 'Rate limit exceeded'})
+        elif server.inject_error(self.command):
+            entity, result = 'injected', (503, {'message': 'Injected error'})
+        else:
+            entity, result = server.dispatch(self.command, unquote(url.path), query, body)
+        status, payload = result[0], result[1]
+        if isinstance(payload, bytes):
+            data, content_type = payload, 'application/octet-stream'
+        elif payload is None:
+            data, content_type = b'', 'application/json'
+        else:
+            data, content_type = json.dumps(payload).encode('utf-8'), 'application/json'
+        server.stats.add(server.name, entity, status, len(data))
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        if status == 503:
+            self.send_header('Retry-After', '0')
+        elif status == 429:
+            self.send_header('Retry-After', str(int(math.ceil(retry_after))))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _handle
+
+
+def _json(body):
+    try:
+        return json.loads(body.decode('utf-8')) if body else {}
+    except ValueError:
+        return {}
+
+
+def _filename(body):
+    match = re.search(rb'filename="([^"]*)"', body or b'')
+    return match.group(1).decode('utf-8') if match else None
+
+
+class RedmineStub(StubServer):
+    name = 'redmine'
+    routes = [
+        ('GET', r'/projects/([^/]+)\.json', 'get_project'),
+        ('GET', r'/users\.json', 'get_users'),
+        ('GET', r'/users/(\d+)\.json', 'get_user'),
+        ('GET', r'/issues\.json', 'get_issues'),
+        ('GET', r'/issues/(\d+)\.json', 'get_issue'),
+        ('PUT', r'/issues/(\d+)\.json', 'update_issue'),
+        ('GET', r'/issues/(\d+)/relations\.json', 'get_relations'),
+        ('GET', r'/issues/(\d+)/checklists\.json', 'get_checklists'),
+        ('GET', r'/projects/([^/]+)/wiki/index\.json', 'get_wiki_index'),
+        ('GET', r'/projects/([^/]+)/wiki/(.+?)(?:/(\d+))?\.json', 'get_wiki_page'),
+        ('PUT', r'/projects/([^/]+)/wiki/(.+?)\.json', 'update_wiki_page'),
+        ('GET', r'/attachments/download/(\d+)/.*', 'download_attachment'),
+    ]
+
+    def _attachments(self, attachments):
+        return [dict(attachment, content_url='{}/attachments/download/{}/{}'.format(
+            self.url, attachment['id'], attachment['filename'])) for attachment in attachments]
+
+    def _issue(self, issue, include=()):
+        raw = {key: value for key, value in issue.items()
+               if key not in ('journals', 'attachments', 'checklists')}
+        if 'journals' in include:
+            raw['journals'] = issue['journals']
+        if 'attachments' in include:
+            raw['attachments'] = self._attachments(issue['attachments'])
+        if 'children' in include:
+            raw['children'] = [{'id': child['id'], 'tracker': child['tracker'], 'subject': child['subject']}
+                               for child in self.dataset.issues.values()
+                               if child.get('parent', {}).get('id') == issue['id']]
+        if 'relations' in include:
+            raw['relations'] = self.dataset.relations.get(issue['id'], [])
+        return raw
+
+    @_entity('project')
+    def get_project(self, match, query, body):
+        return 200, {'project': {'id': PROJECT_ID, 'identifier': PROJECT_IDENTIFIER, 'name': 'Bench'}}
+
+    @_entity('users')
+    def get_users(self, match, query, body):
+        users = self.dataset.users
+        if query.get('name'):
+            name = query['name'].lower()
+            users = [user for user in users if name in (user['login'].lower(),
+                                                          '{} {}'.format(user['firstname'], user['lastname']).lower())]
+        offset, limit = int(query.get('offset') or 0), int(query.get('limit') or 25)
+        return 200, {'users': users[offset:offset + limit], 'total_count': len(users), 'offset': offset,
+                     'limit': limit}
+
+    @_entity('user')
+    def get_user(self, match, query, body):
+        for user in self.dataset.users:
+            if user['id'] == int(match.group(1)):
+                return 200, {'user': user}
+        return 404, None
+
+    @_entity('issues')
+    def get_issues(self, match, query, body):
+        issues = list(self.dataset.issues.values())
+        if query.get('issue_id'):
+            issue_ids = set(int(issue_id) for issue_id in query['issue_id'].split(','))
+            issues = [issue for issue in issues if issue['id'] in issue_ids]
+        if query.get('parent_id'):
+            issues = [issue for issue in issues if issue.get('parent', {}).get('id') == int(query['parent_id'])]
+        elif query.get('query_id'):
+            issues = [issue for issue in issues if 'parent' not in issue]
+        include = query.get('include', '').split(',')
+        offset, limit = int(query.get('offset') or 0), int(query.get('limit') or 25)
+        with self.lock:
+            page = [self._issue(issue, include) for issue in issues[offset:offset + limit]]
+        return 200, {'issues': page, 'total_count': len(issues), 'offset': offset, 'limit': limit}
+
+    @_entity('issue')
+    def get_issue(self, match, query, body):
+        issue = self.dataset.issues.get(int(match.group(1)))
+        if issue is None:
+            return 404, None
+        with self.lock:
+            return 200, {'issue': self._issue(issue, query.get('include', '').split(','))}
+
+    @_entity('issue_update')
+    def update_issue(self, match, query, body):
+        issue = self.dataset.issues.get(int(match.group(1)))
+        if issue is None:
+            return 404, None
+        with self.lock:
+            for key, value in _json(body).get('issue', {}).items():
+                if key in ('subject', 'description'):
+                    issue[key] = value
+        return 204, None
+
+    @_entity('relations')
+    def get_relations(self, match, query, body):
+        return 200, {'relations': self.dataset.relations.get(int(match.group(1)), [])}
+
+    @_entity('checklists')
+    def get_checklists(self, match, query, body):
+        issue = self.dataset.issues.get(int(match.group(1)))
+        return 200, {'checklists': issue['checklists'] if issue else []}
+
+    @_entity('wiki_index')
+    def get_wiki_index(self, match, query, body):
+        pages = []
+        for page in self.dataset.pages.values():
+            info = {'title': page['title'], 'version': page['version'], 'created_on': page['created_on'],
+                    'updated_on': page['updated_on']}
+            if page['parent']:
+                info['parent'] = page['parent']
+            pages.append(info)
+        return 200, {'wiki_pages': pages}
+
+    @_entity('wiki_page')
+    def get_wiki_page(self, match, query, body):
+        page = self.dataset.pages.get(match.group(2))
+        if page is None:
+            for title in self.dataset.pages:
+                if title.lower() == match.group(2).lower():
+                    page = self.dataset.pages[title]
+        if page is None:
+            return 404, None
+        with self.lock:
+            raw = {key: value for key, value in page.items() if key != 'attachments' and value is not None}
+            if 'attachments' in query.get('include', '').split(','):
+                raw['attachments'] = self._attachments(page['attachments'])
+        if match.group(3) or query.get('version'):
+            raw['version'] = int(match.group(3) or query['version'])
+        return 200, {'wiki_page': raw}
+
+    @_entity('wiki_page_update')
+    def update_wiki_page(self, match, query, body):
+        page = self.dataset.pages.get(match.group(2))
+        if page is None:
+            return 404, None
+        with self.lock:
+            page['text'] = _json(body).get('wiki_page', {}).get('text', page['text'])
+        return 204, None
+
+    @_entity('attachment_download')
+    def download_attachment(self, match, query, body):
+        content = self.dataset.attachments.get(int(match.group(1)))
+        return (200, content) if content is not None else (404, None)
+
+
+class JiraStub(StubServer):
+    name = 'jira'
+    routes = [
+        ('GET', r'/rest/api/2/serverInfo', 'get_server_info'),
+        ('GET', r'/rest/api/2/field', 'get_fields'),
+        ('GET', r'/rest/api/2/issue/createmeta', 'get_createmeta'),
+        ('POST', r'/rest/api/2/issue', 'create_issue'),
+        ('POST', r'/rest/api/2/issue/bulk', 'create_issues'),
+        ('GET', r'/rest/api/2/issue/([^/]+)', 'get_issue'),
+        ('PUT', r'/rest/api/2/issue/([^/]+)', 'update_issue'),
+        ('GET', r'/rest/api/2/issue/([^/]+)/transitions', 'get_transitions'),
+        ('POST', r'/rest/api/2/issue/([^/]+)/transitions', 'transition_issue'),
+        ('POST', r'/rest/api/2/issue/([^/]+)/worklog', 'add_worklog'),
+        ('POST', r'/rest/api/2/issue/([^/]+)/attachments', 'add_attachment'),
+        ('POST', r'/rest/api/2/issue/([^/]+)/comment', 'add_comment'),
+        ('GET', r'/rest/api/2/issueLinkType', 'get_link_types'),
+        ('POST', r'/rest/api/2/issueLink', 'create_link'),
+    ]
+    FIELDS = ['summary', 'description', 'issuetype', 'project', 'parent', 'priority', 'fixVersions', 'timetracking',
+              'reporter', 'assignee', 'customfield_11706', 'customfield_10002', 'customfield_13504',
+              'customfield_12802', 'customfield_10005', 'customfield_10006', 'customfield_10205',
+              'customfield_14001', 'customfield_14002', 'customfield_14003', 'customfield_10104']
+
+    def __init__(self, *args, **kwargs):
+        StubServer.__init__(self, *args, **kwargs)
+        self.issues = collections.OrderedDict()
+        self.counter = 0
+
+    def _new_issue(self, fields):
+        with self.lock:
+            self.counter += 1
+            key = '{}-{}'.format(JIRA_PROJECT, self.counter)
+            self.issues[key] = {'id': str(10000 + self.counter), 'key': key,
+                                'self': '{}/rest/api/2/issue/{}'.format(self.url, 10000 + self.counter),
+                                'fields': fields, 'comments': 0, 'attachments': 0}
+            return {name: self.issues[key][name] for name in ('id', 'key', 'self')}
+
+    def _find(self, key_or_id):
+        with self.lock:
+            for issue in self.issues.values():
+                if key_or_id in (issue['key'], issue['id']):
+                    return issue
+        return None
+
+    @_entity('server_info')
+    def get_server_info(self, match, query, body):
+        return 200, {'baseUrl': self.url, 'version': '7.13.0', 'versionNumbers': [7, 13, 0],
+                     'deploymentType': 'Server', 'serverTitle': 'Jira stub'}
+
+    @_entity('fields')
+    def get_fields(self, match, query, body):
+        return 200, [{'id': name, 'name': name, 'custom': name.startswith('customfield_'), 'clauseNames': [name]}
+                     for name in self.FIELDS]
+
+    @_entity('createmeta')
+    def get_createmeta(self, match, query, body):
+        issue_type = query.get('issuetypeNames', 'Story')
+        return 200, {'projects': [{'key': JIRA_PROJECT, 'issuetypes': [
+            {'name': issue_type, 'fields': {name: {'name': name} for name in self.FIELDS}}]}]}
+
+    @_entity('issue_create')
+    def create_issue(self, match, query, body):
+        return 201, self._new_issue(_json(body).get('fields', {}))
+
+    @_entity('issue_bulk_create')
+    def create_issues(self, match, query, body):
+        return 201, {'issues': [self._new_issue(update.get('fields', {}))
+                                for update in _json(body).get('issueUpdates', [])], 'errors': []}
+
+    @_entity('issue')
+    def get_issue(self, match, query, body):
+        issue = self._find(match.group(1))
+        if issue is None:
+            return 404, {'errorMessages': ['Issue does not exist']}
+        return 200, {'id': issue['id'], 'key': issue['key'], 'self': issue['self'], 'fields': issue['fields']}
+
+    @_entity('issue_update')
+    def update_issue(self, match, query, body):
+        issue = self._find(match.group(1))
+        if issue is None:
+            return 404, None
+        with self.lock:
+            issue['fields'].update(_json(body).get('fields', {}))
+        return 204, None
+
+    @_entity('transitions')
+    def get_transitions(self, match, query, body):
+        return 200, {'transitions': [{'id': '11', 'name': 'To Do'}, {'id': '21', 'name': 'In Progress'}]}
+
+    @_entity('transition')
+    def transition_issue(self, match, query, body):
+        return (204, None) if self._find(match.group(1)) else (404, None)
+
+    @_entity('worklog')
+    def add_worklog(self, match, query, body):
+        issue = self._find(match.group(1))
+        if issue is None:
+            return 404, None
+        return 201, dict(_json(body), id='1', self='{}/worklog/1'.format(issue['self']))
+
+    @_entity('attachment')
+    def add_attachment(self, match, query, body):
+        issue = self._find(match.group(1))
+        if issue is None:
+            return 404, None
+        with self.lock:
+            issue['attachments'] += 1
+            attachment_id = '{}{}'.format(issue['id'], issue['attachments'])
+        return 200, [{'id': attachment_id, 'filename': 'attachment', 'size': len(body),
+                      'self': '{}/rest/api/2/attachment/{}'.format(self.url, attachment_id)}]
+
+    @_entity('comment')
+    def add_comment(self, match, query, body):
+        issue = self._find(match.group(1))
+        if issue is None:
+            return 404, None
+        with self.lock:
+            issue['comments'] += 1
+            comment_id = '{}{}'.format(issue['id'], issue['comments'])
+        return 201, {'id': comment_id, 'body': _json(body).get('body', ''),
+                     'self': '{}/comment/{}'.format(issue['self'], comment_id)}
+
+    @_entity('link_types')
+    def get_link_types(self, match, query, body):
+        return 200, {'issueLinkTypes': [{'id': '10000', 'name': 'Relates', 'inward': 'relates to',
+                                         'outward': 'relates to'}]}
+
+    @_entity('link')
+    def create_link(self, match, query, body):
+        return 201, None
+
+
+class ConfluenceStub(StubServer):
+    name = 'confluence'
+    routes = [
+        ('GET', r'/rest/api/content/?', 'get_contents'),
+        ('POST', r'/rest/api/content/?', 'create_content'),
+        ('GET', r'/rest/api/content/(\d+)', 'get_content'),
+        ('POST', r'/rest/api/content/(\d+)/child/attachment', 'add_attachment'),
+        ('GET', r'/rest/api/content/(\d+)/child/attachment', 'get_attachments'),
+        ('POST', r'/rest/api/content/(\d+)/child/attachment/(\w+)/data', 'update_attachment'),
+        ('GET', r'/rest/tinymce/1/macro/browse-macros\.json', 'get_macros'),
+    ]
+
+    def __init__(self, *args, **kwargs):
+        StubServer.__init__(self, *args, **kwargs)
+        self.pages = collections.OrderedDict()
+        self.comments = 0
+
+    def _page(self, page):
+        return {'id': page['id'], 'type': 'page', 'status': 'current', 'title': page['title'],
+                '_links': {'base': self.url, 'webui': '/pages/viewpage.action?pageId={}'.format(page['id'])}}
+
+    @_entity('pages')
+    def get_contents(self, match, query, body):
+        with self.lock:
+            pages = [page for page in self.pages.values()
+                     if not query.get('title') or page['title'] == query['title']]
+        start, limit = int(query.get('start') or 0), int(query.get('limit') or 25)
+        results = [self._page(page) for page in pages[start:start + limit]]
+        return 200, {'results': results, 'start': start, 'limit': limit, 'size': len(results)}
+
+    @_entity('page')
+    def get_content(self, match, query, body):
+        with self.lock:
+            page = self.pages.get(match.group(1))
+        return (200, self._page(page)) if page else (404, {'statusCode': 404, 'message': 'Not found'})
+
+    @_entity('page_create')
+    def create_content(self, match, query, body):
+        data = _json(body)
+        if data.get('type') == 'comment':
+            with self.lock:
+                self.comments += 1
+                return 200, {'id': str(900000 + self.comments), 'type': 'comment'}
+        with self.lock:
+            if any(page['title'] == data.get('title') for page in self.pages.values()):
+                return 400, {'statusCode': 400, 'reason': 'Bad Request',
+                             'message': 'A page with this title already exists: {}'.format(data.get('title'))}
+            page_id = str(100000 + len(self.pages))
+            self.pages[page_id] = {'id': page_id, 'title': data.get('title'),
+                                   'ancestors': data.get('ancestors'), 'attachments': 0, 'files': dict()}
+            return 200, self._page(self.pages[page_id])
+
+    @_entity('attachment')
+    def add_attachment(self, match, query, body):
+        filename = _filename(body)
+        with self.lock:
+            page = self.pages.get(match.group(1))
+            if page is None:
+                return 404, {'statusCode': 404, 'message': 'Not found', 'reason': 'Not Found'}
+            if filename in page['files']:
+                return 400, {'statusCode': 400, 'reason': 'Bad Request',
+                             'message': 'Cannot add a new attachment with same file name as an existing '
+                                        'attachment: {}'.format(filename)}
+            page['attachments'] += 1
+            page['files'][filename] = 'att{}'.format(page['attachments'])
+        return 200, {'results': [{'id': page['files'][filename], 'type': 'attachment'}], 'size': 1}
+
+    @_entity('attachments')
+    def get_attachments(self, match, query, body):
+        with self.lock:
+            page = self.pages.get(match.group(1))
+            if page is None:
+                return 404, {'statusCode': 404, 'message': 'Not found', 'reason': 'Not Found'}
+            results = [{'id': attachment_id, 'type': 'attachment', 'title': filename}
+                       for filename, attachment_id in page['files'].items()
+                       if not query.get('filename') or filename == query['filename']]
+        return 200, {'results': results, 'size': len(results)}
+
+    @_entity('attachment_update')
+    def update_attachment(self, match, query, body):
+        with self.lock:
+            page = self.pages.get(match.group(1))
+            if page is None or match.group(2) not in page['files'].values():
+                return 404, {'statusCode': 404, 'message': 'Not found', 'reason': 'Not Found'}
+        return 200, {'id': match.group(2), 'type': 'attachment'}
+
+    @_entity('macros')
+    def get_macros(self, match, query, body):
+        return 200, {'macros': [{'macroName': name, 'alternateNames': []} for name in KNOWN_MACROS]}
+
+
+def start(dataset, latency=0.0, error_rate=0.0, seed=0, rate_limit=0.0):
+    """
+    Starts the Redmine, Jira and Confluence stubs on free local ports.
+    Parameters:
+        dataset (obj): Dataset served by the Redmine stub.
+        latency (float): Latency (in seconds) added to every request.
+        error_rate (float): Share of the read requests failing with a 503.
+        seed (int): Seed of the injected errors.
+        rate_limit (float): Requests per second accepted by each server, the others are rejected with a 429.
+    Returns:
+        A (stats, {name: server}) tuple, the servers are running in background threads.
+    """
+    stats = Stats()
+    servers = collections.OrderedDict()
+    for index, server_class in enumerate((RedmineStub, JiraStub, ConfluenceStub)):
+        server = server_class(dataset, stats, latency=latency, error_rate=error_rate, seed=seed + index,
+                              rate_limit=rate_limit)
+        servers[server.name] = server.start()
+    return stats, servers
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub Redmine, Jira and Confluence servers')
+    parser.add_argument('--issues', type=int, default=20, help='Number of top level issues (default: 20)')
+    parser.add_argument('--pages', type=int, default=50, help='Number of Wiki pages (default: 50)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Latency of every request in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Share of the read requests failing with a 503 (default: 0)')
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='Requests per second accepted by each server, 0 for no limit (default: 0)')
+    args = parser.parse_args()
+
+    stats, servers = start(Dataset(issues=args.issues, pages=args.pages), args.latency / 1000.0, args.error_rate,
+                           rate_limit=args.rate_limit)
+    for name, server in servers.items():
+        print('{:<12} {}'.format(name, server.url))
+    print('Redmine project: {}, Jira project: {}, Confluence space: {}, password (base64): {}'.format(
+        PROJECT_IDENTIFIER, JIRA_PROJECT, CONFLUENCE_SPACE, PASSWORD))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(json.dumps(stats.snapshot(), indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
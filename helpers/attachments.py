@@ -0,0 +1,334 @@
+"""
+Transfer of the attachments from Redmine to Jira/Confluence without intermediate files.
+Attachments are downloaded in a bounded buffer (in memory, spilled to an anonymous temporary file
+for large attachments) and uploaded from it. The total size of the attachments being transferred at
+once is limited by a byte budget, shared by all the workers.
+Optionally, the attachments are kept in a local cache, so that an attachment used on several
+pages/issues is downloaded only once.
+"""
+
+import collections
+import hashlib
+import helpers.workers as workers
+import io
+import os
+import tempfile
+import threading
+
+# Attachments bigger than this are buffered in an anonymous temporary file instead of the memory.
+SPOOL_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# Default number of attachments transferred in parallel for an issue/page and default byte budget.
+DEFAULT_WORKERS = 4
+DEFAULT_BUDGET = 256 * 1024 * 1024
+# Default maximum size of the attachment cache.
+DEFAULT_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+
+
+class ByteBudget(object):
+    """
+    Limits the number of bytes being transferred at once. A transfer bigger than the whole budget
+    is allowed, but only when nothing else is being transferred.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.used = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size):
+        with self._condition:
+            while self.used and self.used + size > self.size:
+                self._condition.wait()
+            self.used += size
+
+    def release(self, size):
+        with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+
+max_workers = DEFAULT_WORKERS
+budget = ByteBudget(DEFAULT_BUDGET)
+
+
+def init(transfer_workers=None, budget_bytes=None, cache_path=None, cache_bytes=None):
+    """
+    Configures the attachment transfers.
+    Parameters:
+        transfer_workers (int): Number of attachments transferred in parallel for an issue/page.
+        budget_bytes (int): Maximum number of bytes being transferred at once, by all the workers.
+        cache_path (str): Optional, directory of the attachment cache. No cache is used by default.
+        cache_bytes (int): Maximum size of the attachment cache.
+    Returns:
+        None.
+    """
+    global max_workers, budget, cache
+    max_workers = transfer_workers or DEFAULT_WORKERS
+    budget = ByteBudget(budget_bytes or DEFAULT_BUDGET)
+    cache = AttachmentCache(cache_path, cache_bytes or DEFAULT_CACHE_SIZE) if cache_path else None
+
+
+def download(session, url, timeout=None):
+    """
+    Downloads a file in a bounded buffer.
+    Parameters:
+        session (obj): requests.Session object, authenticated on the server.
+        url (str): URL of the file.
+        timeout (float): Timeout of the request.
+    Returns:
+        A file-like object with the content, positioned at the beginning.
+    """
+    buffer = io.BytesIO()
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if isinstance(buffer, io.BytesIO) and buffer.tell() + len(chunk) > SPOOL_SIZE:
+                # The temporary file has no name, nothing is left behind if the process dies.
+                spool = tempfile.TemporaryFile()
+                spool.write(buffer.getvalue())
+                buffer = spool
+            buffer.write(chunk)
+    buffer.seek(0)
+    return buffer
+
+
+class CachedContent(object):
+    """
+    File object of a cached content, the content is not evicted until the file object is closed.
+    """
+
+    def __init__(self, cache, blob, file_handle):
+        self._cache = cache
+        self._blob = blob
+        self._file = file_handle
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._file.close()
+            self._cache.release(self._blob)
+
+
+class AttachmentCache(object):
+    """
+    Content addressed cache of the attachments on the disk. Each content is stored once, named
+    after its SHA-256, and looked up by the Redmine digest and size of the attachment (by the
+    Redmine attachment ID if the digest is not available). The least recently used contents are
+    evicted once the cache is bigger than its maximum size, but the contents being read.
+    A read only cache (e.g. the attachments of an offline snapshot) is neither downloaded to nor evicted.
+    """
+
+    def __init__(self, path, max_size, read_only=False):
+        self.path = path
+        self.max_size = max_size
+        self.read_only = read_only
+        self._blobs = os.path.join(path, 'blobs')
+        self._keys = os.path.join(path, 'keys')
+        for directory in (self._blobs, self._keys):
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        self.size = 0
+        for entry in os.scandir(self._blobs):
+            if not entry.is_file():
+                continue
+            if entry.name.startswith('.'):
+                # Download left behind by an interrupted run.
+                if not read_only:
+                    os.remove(entry.path)
+            else:
+                self.size += entry.stat().st_size
+        self._lock = threading.Lock()
+        self._key_locks = dict()
+        # Name of the content - number of open file objects.
+        self._in_use = collections.Counter()
+
+    @staticmethod
+    def key(attachment):
+        """
+        Returns the cache key of a Redmine attachment (Resource object).
+        """
+        digest = getattr(attachment, 'digest', None)
+        if digest:
+            return '{}-{}'.format(digest, attachment.filesize)
+        return 'id-{}'.format(attachment.id)
+
+    def key_lock(self, key):
+        """
+        Returns the lock of a given key, so that an attachment is downloaded once when it is
+        needed by several workers at the same time.
+        """
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _open_blob(self, name):
+        # Called with the lock held, so that the content is not evicted before it is marked as in use.
+        blob = os.path.join(self._blobs, name)
+        content = open(blob, 'rb')
+        if not self.read_only:
+            # Mark the content as recently used.
+            os.utime(blob, None)
+        self._in_use[name] += 1
+        return CachedContent(self, name, content)
+
+    def release(self, name):
+        """
+        Records that a file object of a content is closed, see CachedContent.
+        """
+        with self._lock:
+            self._in_use[name] -= 1
+            if self._in_use[name] <= 0:
+                del self._in_use[name]
+
+    def open(self, key):
+        """
+        Opens the cached content of a given key.
+        Returns:
+            A file object, None if the content is not cached.
+        """
+        key_path = os.path.join(self._keys, key)
+        try:
+            with open(key_path) as file_handle:
+                name = file_handle.read().strip()
+        except (IOError, OSError):
+            return None
+        with self._lock:
+            try:
+                return self._open_blob(name)
+            except (IOError, OSError):
+                pass
+            # The content was evicted, the key is stale.
+            if not self.read_only and os.path.exists(key_path):
+                os.remove(key_path)
+        return None
+
+    def download(self, key, session, url, timeout=None):
+        """
+        Downloads a file in the cache.
+        Returns:
+            A file object with the content.
+        """
+        sha256 = hashlib.sha256()
+        handle, temp_path = tempfile.mkstemp(dir=self._blobs, prefix='.download-')
+        try:
+            with os.fdopen(handle, 'wb') as file_handle:
+                with session.get(url, stream=True, timeout=timeout) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        sha256.update(chunk)
+                        file_handle.write(chunk)
+            name = sha256.hexdigest()
+            blob = os.path.join(self._blobs, name)
+            size = os.path.getsize(temp_path)
+            with self._lock:
+                if os.path.exists(blob):
+                    os.remove(temp_path)
+                else:
+                    os.rename(temp_path, blob)
+                    self.size += size
+                with open(os.path.join(self._keys, key), 'w') as file_handle:
+                    file_handle.write(name)
+                # Opening the content marks a deduplicated content as recently used as well.
+                content = self._open_blob(name)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.evict()
+        return content
+
+    def evict(self):
+        """
+        Removes the least recently used contents until the cache is within its maximum size, along with
+        their keys. The contents being read are kept.
+        """
+        with self._lock:
+            if self.read_only or self.size <= self.max_size:
+                return
+            entries = sorted((entry for entry in os.scandir(self._blobs)
+                              if entry.is_file() and not entry.name.startswith('.')
+                              and entry.name not in self._in_use),
+                             key=lambda entry: entry.stat().st_mtime)
+            evicted = set()
+            for entry in entries:
+                if self.size <= self.max_size:
+                    break
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.size -= size
+                evicted.add(entry.name)
+            if not evicted:
+                return
+            for entry in os.scandir(self._keys):
+                try:
+                    with open(entry.path) as file_handle:
+                        stale = file_handle.read().strip() in evicted
+                except (IOError, OSError):
+                    continue
+                if stale:
+                    os.remove(entry.path)
+
+
+cache = None
+
+
+def fetch(session, attachment, timeout=None):
+    """
+    Returns the content of a Redmine attachment, from the cache if possible.
+    Parameters:
+        session (obj): requests.Session object, authenticated on the Redmine server.
+        attachment (obj): Redmine attachment (Resource object).
+        timeout (float): Timeout of the download request.
+    Returns:
+        A file-like object with the content, positioned at the beginning.
+    """
+    if cache is None:
+        return download(session, attachment.content_url, timeout)
+    key = cache.key(attachment)
+    with cache.key_lock(key):
+        content = cache.open(key)
+        if content is None and cache.read_only:
+            raise IOError("Attachment {} is not in the cache {}".format(attachment.filename, cache.path))
+        if content is None:
+            content = cache.download(key, session, attachment.content_url, timeout)
+        return content
+
+
+def transfer(session, attachments, upload, timeout=None):
+    """
+    Transfers attachments in parallel, within the byte budget.
+    Parameters:
+        session (obj): requests.Session object, authenticated on the Redmine server.
+        attachments (list): Redmine attachments (Resource objects).
+        upload (function): Called with an attachment and the file-like object of its content.
+        timeout (float): Timeout of the download requests.
+    Returns:
+        Yields an (attachment, error) tuple for each attachment, error is None if successful.
+    """
+    def transfer_one(attachment):
+        size = getattr(attachment, 'filesize', 0) or 0
+        budget.acquire(size)
+        try:
+            content = fetch(session, attachment, timeout)
+            try:
+                return upload(attachment, content)
+            finally:
+                content.close()
+        finally:
+            budget.release(size)
+
+    for attachment, _, error in workers.run_concurrently(transfer_one, attachments, max_workers):
+        yield attachment, error
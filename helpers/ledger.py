@@ -0,0 +1,239 @@
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    redmine_id INTEGER NOT NULL,
+    jira_project TEXT NOT NULL,
+    jira_key TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (redmine_id, jira_project)
+);
+CREATE TABLE IF NOT EXISTS wiki_pages (
+    redmine_project TEXT NOT NULL,
+    title TEXT NOT NULL,
+    confluence_space TEXT NOT NULL,
+    confluence_id TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (redmine_project, title, confluence_space)
+);
+CREATE TABLE IF NOT EXISTS wiki_authors (
+    redmine_project TEXT NOT NULL,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    PRIMARY KEY (redmine_project, title)
+);
+CREATE TABLE IF NOT EXISTS attachments (
+    destination TEXT NOT NULL,
+    attachment_id INTEGER NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (destination, attachment_id)
+);
+"""
+
+IMPORTED = 'imported'
+# The Confluence page is created, some of its attachments are not transferred yet.
+CREATED = 'created'
+FAILED = 'failed'
+
+
+class MigrationLedger(object):
+    """
+    Local SQLite record of the migrated Redmine issues and Wiki pages, with their Jira keys and
+    Confluence page IDs. The ledger is kept between the runs, so that checking whether an issue or a
+    page is already migrated does not need any request to the servers.
+    Records are scoped by Jira project, Redmine project and Confluence space, a migration to another
+    project/space starts from scratch.
+    """
+
+    def __init__(self, path, jira_project, redmine_project, confluence_space):
+        """
+        Parameters:
+            path (str): SQLite database file, created if missing.
+            jira_project (str): Key of the Jira project the issues are migrated to.
+            redmine_project (str): Redmine project the Wiki pages are migrated from.
+            confluence_space (str): Confluence space the Wiki pages are migrated to.
+        """
+        self.path = path
+        self.jira_project = jira_project
+        self.redmine_project = str(redmine_project)
+        self.confluence_space = confluence_space
+        self._lock = threading.Lock()
+        # The connection is shared by the workers, the lock serializes its use.
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+
+    def jira_key(self, issue_id):
+        """
+        Retrieves the Jira key of a migrated Redmine issue.
+        Parameters:
+            issue_id (int): Issue ID in Redmine.
+        Returns:
+            Returns the Jira key, if the issue is migrated. Otherwise None will be returned.
+        """
+        return self.jira_keys([issue_id]).get(int(issue_id))
+
+    def jira_keys(self, issue_ids):
+        """
+        Retrieves the Jira keys of the migrated Redmine issues among the given ones.
+        Parameters:
+            issue_ids (list): Issue IDs in Redmine.
+        Returns:
+            A dictionary of Redmine issue ID - Jira key.
+        """
+        issue_ids = [int(issue_id) for issue_id in issue_ids if issue_id]
+        if not issue_ids:
+            return dict()
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT redmine_id, jira_key FROM issues WHERE jira_project = ? AND status = ? '
+                'AND redmine_id IN ({})'.format(', '.join('?' * len(issue_ids))),
+                [self.jira_project, IMPORTED] + issue_ids).fetchall()
+        return dict(rows)
+
+    def record_issue(self, issue_id, jira_key, status=IMPORTED, error=None):
+        """
+        Records the migration of a Redmine issue.
+        Parameters:
+            issue_id (int): Issue ID in Redmine.
+            jira_key (str): Key of the Jira issue, None if the migration failed.
+            status (str): IMPORTED or FAILED.
+            error (str): Reason of the failure.
+        Returns:
+            None.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT INTO issues (redmine_id, jira_project, jira_key, status, error, created, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (redmine_id, jira_project) DO UPDATE SET '
+                'jira_key = COALESCE(excluded.jira_key, jira_key), status = excluded.status, '
+                'error = excluded.error, updated = excluded.updated',
+                (int(issue_id), self.jira_project, jira_key, status, error, now, now))
+
+    def confluence_page_id(self, title):
+        """
+        Retrieves the Confluence page ID of a migrated Redmine Wiki page.
+        Parameters:
+            title (str): Title of the Redmine Wiki page.
+        Returns:
+            Returns the Confluence page ID, if the page is migrated. Otherwise None will be returned.
+        """
+        status, page_id, _ = self.wiki_page_status(title)
+        return page_id if status in (IMPORTED, CREATED) else None
+
+    def wiki_page_status(self, title):
+        """
+        Retrieves the migration status of a Redmine Wiki page.
+        Parameters:
+            title (str): Title of the Redmine Wiki page.
+        Returns:
+            A (status, Confluence page ID, error) tuple, all None if the page is not recorded.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT status, confluence_id, error FROM wiki_pages WHERE redmine_project = ? AND title = ? '
+                'AND confluence_space = ?',
+                (self.redmine_project, title, self.confluence_space)).fetchone()
+        return row if row else (None, None, None)
+
+    def wiki_pages(self, status=IMPORTED):
+        """
+        Lists the Redmine Wiki pages recorded with a given status.
+        Parameters:
+            status (str): IMPORTED, CREATED or FAILED.
+        Returns:
+            A dictionary of Redmine Wiki page title - (Confluence page ID, error).
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT title, confluence_id, error FROM wiki_pages WHERE redmine_project = ? '
+                'AND confluence_space = ? AND status = ?',
+                (self.redmine_project, self.confluence_space, status)).fetchall()
+        return {title: (page_id, error) for title, page_id, error in rows}
+
+    def record_wiki_page(self, title, page_id, status=IMPORTED, error=None):
+        """
+        Records the migration of a Redmine Wiki page.
+        Parameters:
+            title (str): Title of the Redmine Wiki page.
+            page_id (str): ID of the Confluence page, None if the migration failed.
+            status (str): IMPORTED, CREATED or FAILED.
+            error (str): Reason of the failure.
+        Returns:
+            None.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT INTO wiki_pages (redmine_project, title, confluence_space, confluence_id, status, error, '
+                'created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (redmine_project, title, confluence_space) DO UPDATE SET '
+                'confluence_id = COALESCE(excluded.confluence_id, confluence_id), status = excluded.status, '
+                'error = excluded.error, updated = excluded.updated',
+                (self.redmine_project, title, self.confluence_space, page_id and str(page_id), status, error,
+                 now, now))
+
+    def original_author(self, title):
+        """
+        Retrieves the original author (author of the first version) of a Redmine Wiki page.
+        Parameters:
+            title (str): Title of the Redmine Wiki page.
+        Returns:
+            Returns the name of the author, if recorded. Otherwise None will be returned.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT author FROM wiki_authors WHERE redmine_project = ? AND title = ?',
+                (self.redmine_project, title)).fetchone()
+        return row[0] if row else None
+
+    def record_original_author(self, title, author):
+        """
+        Records the original author (author of the first version) of a Redmine Wiki page.
+        Parameters:
+            title (str): Title of the Redmine Wiki page.
+            author (str): Name of the author.
+        Returns:
+            None.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO wiki_authors (redmine_project, title, author) '
+                                     'VALUES (?, ?, ?)', (self.redmine_project, title, author))
+
+    def transferred_attachments(self, destination):
+        """
+        Lists the Redmine attachments already transferred to a Jira issue/Confluence page.
+        Parameters:
+            destination (str): Jira issue key or Confluence page ID.
+        Returns:
+            A set of Redmine attachment IDs.
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT attachment_id FROM attachments WHERE destination = ?',
+                                            (str(destination),)).fetchall()
+        return set(row[0] for row in rows)
+
+    def record_attachment(self, destination, attachment_id):
+        """
+        Records the transfer of a Redmine attachment to a Jira issue/Confluence page.
+        Parameters:
+            destination (str): Jira issue key or Confluence page ID.
+            attachment_id (int): Attachment ID in Redmine.
+        Returns:
+            None.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR IGNORE INTO attachments (destination, attachment_id, created) '
+                                     'VALUES (?, ?, ?)', (str(destination), int(attachment_id), time.time()))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,100 @@
+import json
+import os
+import re
+import threading
+
+# Confluence wiki markup which is not listed as a macro, but must not be escaped.
+BUILTIN_MACROS = {'code', 'noformat', 'color', 'quote', 'panel', 'anchor', 'toc', 'children', 'info', 'note',
+                  'tip', 'warning', 'expand', 'section', 'column', 'excerpt', 'status'}
+
+# Code blocks (not parsed by Confluence), monospace text, and the macro names.
+_MACRO_RE = re.compile(r"(?P<code>\{(?P<block>code|noformat)(?:[:][^}]*)?\}.*?\{(?P=block)\})"
+                       r"|(?P<monospace>\{\{.*?\}\})"
+                       r"|(?<!\\)\{(?P<name>[A-Za-z][\w.-]*)(?=[}:])",
+                       re.DOTALL | re.IGNORECASE)
+_NAME_RE = re.compile(r"^[A-Za-z][\w.-]*$")
+
+
+class MacroRegistry(object):
+    """
+    Macros known by the target Confluence, used to escape the unknown {macro} occurrences of a page
+    in a single pass before creating it.
+    The macros are fetched from Confluence once, when first needed. The unknown macros reported by
+    Confluence are learned and optionally kept in a local file for the next runs.
+    """
+
+    def __init__(self, get_known_macros, cache_file=None):
+        """
+        Parameters:
+            get_known_macros (function): Returns the names of the macros known by Confluence.
+            cache_file (str): Optional, file used to keep the learned unknown macros between runs.
+        """
+        self._get_known_macros = get_known_macros
+        self.cache_file = cache_file
+        self._known = None
+        self._unknown = self._read_cache()
+        self._lock = threading.Lock()
+
+    def escape(self, wiki_content):
+        """
+        Escapes the unknown macros of a page.
+        Parameters:
+            wiki_content (str): Content of the page in the Confluence wiki markup.
+        Returns:
+            The content with the unknown macros escaped.
+        """
+        with self._lock:
+            if self._known is None:
+                try:
+                    self._known = set(name.lower() for name in self._get_known_macros())
+                except Exception as e:
+                    print("Could not fetch the Confluence macros, only the learned ones are escaped: {}".format(e))
+                    self._known = set()
+            known, unknown = self._known, set(self._unknown)
+
+        def replace(match):
+            name = match.group('name')
+            if name is None:
+                return match.group(0)
+            name = name.lower()
+            if name in unknown or (known and name not in known and name not in BUILTIN_MACROS):
+                return '\\' + match.group(0)
+            return match.group(0)
+
+        return _MACRO_RE.sub(replace, wiki_content)
+
+    def learn(self, name):
+        """
+        Records an unknown macro reported by Confluence.
+        Parameters:
+            name (str): Name of the macro.
+        Returns:
+            None.
+        """
+        name = name.strip().lower()
+        if not _NAME_RE.match(name):
+            return
+        with self._lock:
+            if name in self._unknown:
+                return
+            self._unknown.add(name)
+            self._write_cache()
+
+    def _read_cache(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return set()
+        try:
+            with open(self.cache_file) as file_handle:
+                return set(json.load(file_handle).get('unknown', []))
+        except Exception as e:
+            print("Could not read the Confluence macros cache {}: {}".format(self.cache_file, e))
+            return set()
+
+    def _write_cache(self):
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, 'w') as file_handle:
+                json.dump({'unknown': sorted(self._unknown)}, file_handle)
+        except Exception as e:
+            print("Could not write the Confluence macros cache {}: {}".format(self.cache_file, e))
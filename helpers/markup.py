@@ -0,0 +1,190 @@
+"""
+Single pass translation of Redmine Textile markup to Jira/Confluence wiki markup.
+"""
+
+import re
+
+# Markup translated in Jira issues as well as in Confluence pages. Block openers come first, the
+# content of a code block is copied as it is, without any further substitution.
+_COMMON_TOKENS = [
+    r'(?P<pre_code><pre><code class="(?P<pre_code_lang>[^"\n]*)">)',
+    r'(?P<code_class><code class="(?P<code_class_lang>[^"\n]*)">)',
+    r'(?P<pre><pre>)',
+    r'(?P<code><code>)',
+    r'(?P<macro>\{(?P<macro_name>code|noformat)(?::[^}\n]*)?\})',
+    r'(?P<pre_code_end></code></pre>)',
+    r'(?P<pre_end></pre>)',
+    r'(?P<code_end></code>)',
+    r'(?P<inline>@(?P<inline_text>[^@\n]*)@)',
+    r'(?P<ready>\*READY FOR MIGRATION TO JIRA\*)',
+    r'(?P<issue>#(?P<issue_id>\d+))',
+]
+
+# Markup translated in Confluence pages only.
+_WIKI_TOKENS = [
+    r'(?P<toc>\{\{>toc\}\})',
+    r'(?P<child_pages>\{\{child_pages\(depth=(?P<child_pages_depth>[^\n]*?)\)\}\})',
+    r'(?P<cell>\|\||\|_<?\.|\|[\^><~=]\.)',
+    r'(?P<notextile></?notextile>)',
+    r'(?P<background>\{background:[^}\n]*\})',
+    r'(?P<percent>%(?P<percent_text>[^%\n]*)%)',
+    r'(?P<link>\[\[(?P<link_text>(?:[^\]\n]|\](?!\]))*)\]\])',
+    r'(?P<square>\[(?P<square_text>[^\]\n]*)\])',
+]
+
+# The lookahead on the first character lets the regex engine skip plain text quickly.
+_ISSUE_PATTERN = re.compile(r'(?=[<{@*#])(?:' + '|'.join(_COMMON_TOKENS) + ')')
+_WIKI_PATTERN = re.compile(r'(?=[<{@*#|%\[])(?:' + '|'.join(_COMMON_TOKENS + _WIKI_TOKENS) + ')')
+
+# Closing tag of each code block.
+_BLOCK_ENDS = {
+    'pre_code': '</code>',
+    'code_class': '</code>',
+    'pre': '</pre>',
+    'code': '</code>',
+}
+
+
+def translate(text, redmine_server, wiki=False, resolve_link=None):
+    """
+    Translates Redmine markup to Jira (wiki=False) or Confluence (wiki=True) markup. The text is
+    scanned once, substitutions are skipped inside {code}/{noformat} blocks.
+    Parameters:
+        text (str): Description from the Redmine issue/comment/Wiki page.
+        redmine_server (str): Redmine server URL, used for the links to the Redmine issues.
+        wiki (bool): True for a Confluence page, False for a Jira issue.
+        resolve_link (function): Called with the content of a [[...]] link, returns the
+            Confluence markup for the link. Each distinct link is resolved only once.
+    Returns:
+        Returns a formatted string.
+    """
+    translator = _Translator(text, redmine_server, wiki, resolve_link)
+    return translator.translate()
+
+
+class _Translator(object):
+
+    def __init__(self, text, redmine_server, wiki, resolve_link):
+        self.text = text
+        self.redmine_server = redmine_server
+        self.wiki = wiki
+        self.pattern = _WIKI_PATTERN if wiki else _ISSUE_PATTERN
+        self.resolve_link = resolve_link
+        self.links = dict()
+        # Block closers which are known not to be present after a given offset.
+        self.missing_ends = dict()
+
+    def translate(self):
+        text = self.text
+        result = []
+        pos = 0
+        search = self.pattern.search
+        match = search(text, pos)
+        while match:
+            start, end = match.span()
+            if start > pos:
+                result.append(text[pos:start])
+            token = match.lastgroup
+            if token in _BLOCK_ENDS or token == 'macro':
+                end = self.copy_block(match, result)
+            else:
+                result.append(self.substitute(match, token))
+            pos = end
+            match = search(text, pos)
+        result.append(text[pos:])
+        return ''.join(result)
+
+    def find_end(self, closer, pos):
+        if self.missing_ends.get(closer, len(self.text) + 1) <= pos:
+            return -1
+        index = self.text.find(closer, pos)
+        if index == -1:
+            self.missing_ends[closer] = pos
+        return index
+
+    def copy_block(self, match, result):
+        """
+        Copies a code block with its translated delimiters, returns the offset after the block.
+        If the block is not closed, only the opening delimiter is translated.
+        """
+        token = match.lastgroup
+        if token == 'macro':
+            opener = closer = match.group()
+            end_tag = '{' + match.group('macro_name') + '}'
+        else:
+            opener, closer = self.block_delimiters(match, token)
+            end_tag = _BLOCK_ENDS[token]
+
+        block_end = self.find_end(end_tag, match.end())
+        result.append(opener)
+        if block_end == -1:
+            return match.end()
+        result.append(self.text[match.end():block_end])
+        result.append(closer)
+        block_end += len(end_tag)
+        if token == 'pre_code' and self.text.startswith('</pre>', block_end):
+            block_end += len('</pre>')
+        return block_end
+
+    def block_delimiters(self, match, token):
+        if token in ('pre_code', 'code_class'):
+            language = match.group(token + '_lang')
+            if self.wiki:
+                return '{{code:language={}}}'.format(language), '{code}'
+            return '<code class="{}">'.format(language), '</code>'
+        if token == 'pre':
+            return '{noformat}', '{noformat}'
+        if self.wiki:
+            return '{code}', '{code}'
+        return '<code>', '</code>'
+
+    def substitute(self, match, token):
+        if token == 'pre_code_end' or token == 'code_end':
+            return '{code}' if self.wiki else '</code>'
+        if token == 'pre_end':
+            return '{noformat}'
+        if token == 'inline':
+            return '{{' + match.group('inline_text') + '}}'
+        if token == 'ready':
+            return ''
+        if token == 'issue':
+            issue_id = match.group('issue_id')
+            issue_link = '[#{}|{}/issues/{}]'.format(issue_id, self.redmine_server, issue_id)
+            # Single square brackets are doubled in the Confluence pages, the same applies to the
+            # issue links.
+            return '[' + issue_link + ']' if self.wiki else issue_link
+        if token == 'toc':
+            return '{toc}'
+        if token == 'child_pages':
+            return '{{children:sort=creation|depth={}}}'.format(match.group('child_pages_depth'))
+        if token == 'cell':
+            cell = match.group()
+            if cell == '||':
+                # Render an empty cell of the table in Confluence
+                return '| | '
+            return '||' if cell.startswith('|_') else '|'
+        if token == 'notextile' or token == 'background':
+            return ''
+        if token == 'percent':
+            return '*' + self.translate_inner(match.group('percent_text')) + '*'
+        if token == 'link':
+            return self.link(match.group('link_text'))
+        if token == 'square':
+            square_text = match.group('square_text')
+            if square_text.startswith('['):
+                return '[' + self.translate_inner(square_text) + ']'
+            return '[[' + self.translate_inner(square_text) + ']]'
+        return match.group()
+
+    def translate_inner(self, text):
+        inner = _Translator(text, self.redmine_server, self.wiki, self.resolve_link)
+        inner.links = self.links
+        return inner.translate()
+
+    def link(self, link_text):
+        if link_text not in self.links:
+            if self.resolve_link:
+                self.links[link_text] = self.resolve_link(link_text)
+            else:
+                self.links[link_text] = '[{}]'.format(link_text)
+        return self.links[link_text]
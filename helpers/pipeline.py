@@ -0,0 +1,251 @@
+import collections
+import contextvars
+import helpers.tracing as tracing
+import queue
+import threading
+import time
+
+# Time (in seconds) after which a blocked worker checks whether the pipeline is stopped.
+POLL_INTERVAL = 0.1
+
+_STOP = object()
+
+
+class Stage(object):
+    """
+    Stage of a pipeline: a function run by its own workers on the items of its input queue.
+    """
+
+    def __init__(self, name, func, workers):
+        """
+        Parameters:
+            name (str): Name of the stage, e.g. 'extract'.
+            func (function): Called with the value of an item, returns the value passed to the next stage.
+                The item leaves the pipeline if it returns None (skipped).
+            workers (int): Number of threads of the stage.
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(workers, 1)
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        # Time spent in the function, waiting for an item and waiting for room in the next queue.
+        self.busy_seconds = 0.0
+        self.idle_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.queue = None
+        self._lock = threading.Lock()
+
+    def record(self, busy, idle, blocked, outcome):
+        with self._lock:
+            self.busy_seconds += busy
+            self.idle_seconds += idle
+            self.blocked_seconds += blocked
+            if outcome is None:
+                return
+            elif outcome == 'failed':
+                self.failed += 1
+            elif outcome == 'skipped':
+                self.skipped += 1
+            else:
+                self.processed += 1
+
+
+class Pipeline(object):
+    """
+    Stages (e.g. extract from Redmine, transform the markup, load into Jira, write back to Redmine) connected by
+    bounded queues, so that the stages overlap. A stage waits when the queue of the next stage is full
+    (backpressure), the number of items in progress is bounded.
+    """
+
+    def __init__(self, name, stages, queue_size, key=None):
+        """
+        Parameters:
+            name (str): Name of the pipeline, used as the name of the tracing spans.
+            stages (list): Stage objects, in order.
+            queue_size (int): Maximum number of items waiting in front of each stage.
+            key (function): Optional, returns the ID of an item for the tracing spans.
+        """
+        self.name = name
+        self.stages = stages
+        self.queue_size = max(queue_size, 1)
+        self._key = key or str
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._started = None
+        self._elapsed = 0.0
+
+    def run(self, items, follow_up=None):
+        """
+        Runs the items through the stages.
+        Parameters:
+            items (iterable): Items to process, consumed lazily.
+            follow_up (function): Optional, called with an item and its result once the item left the pipeline.
+                The returned items are processed as well.
+        Returns:
+            Yields an (item, result, error) tuple for each item leaving the pipeline, error is None if successful.
+            The result is None if a stage skipped the item.
+        """
+        for stage in self.stages:
+            stage.queue = queue.Queue(self.queue_size)
+        output = queue.Queue()
+        scheduled = collections.deque()
+        # Items fed into the pipeline which did not leave it yet.
+        in_flight = [0]
+        condition = threading.Condition()
+        self._stopped.clear()
+        self._started = time.time()
+
+        def feed():
+            items_iterator = iter(items)
+            exhausted = False
+            while not self._stopped.is_set():
+                with condition:
+                    while not scheduled and exhausted and in_flight[0]:
+                        condition.wait(POLL_INTERVAL)
+                        if self._stopped.is_set():
+                            return
+                    if scheduled:
+                        item = scheduled.popleft()
+                    elif exhausted:
+                        break
+                    else:
+                        item = None
+                if item is None:
+                    try:
+                        item = next(items_iterator)
+                    except StopIteration:
+                        exhausted = True
+                        continue
+                    except Exception as error:
+                        output.put((None, None, error))
+                        exhausted = True
+                        continue
+                with condition:
+                    in_flight[0] += 1
+                if not self._put(self.stages[0].queue, (item, item)):
+                    return
+            for _ in range(self.stages[0].workers):
+                self._put(self.stages[0].queue, _STOP)
+
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(feed,),
+                                    name='{}-feed'.format(self.name), daemon=True)]
+        remaining = [stage.workers for stage in self.stages]
+        for index, stage in enumerate(self.stages):
+            for number in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(self._work, index, output, remaining),
+                    name='{}-{}-{}'.format(self.name, stage.name, number), daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                with condition:
+                    if not in_flight[0] and not threads[0].is_alive() and output.empty():
+                        break
+                try:
+                    entry = output.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                item, result, error = entry
+                if item is not None and follow_up is not None and error is None and result is not None:
+                    children = follow_up(item, result) or []
+                    with condition:
+                        scheduled.extend(children)
+                with condition:
+                    if item is not None:
+                        in_flight[0] -= 1
+                    condition.notify_all()
+                if item is None:
+                    # The items could not be listed.
+                    raise error
+                yield entry
+        finally:
+            # The items in progress are completed by the current stage, the next ones are dropped.
+            self._stopped.set()
+            for thread in threads:
+                thread.join()
+            self._elapsed = time.time() - self._started
+
+    def _put(self, target, entry):
+        while not self._stopped.is_set():
+            try:
+                target.put(entry, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _work(self, index, output, remaining):
+        stage = self.stages[index]
+        next_queue = self.stages[index + 1].queue if index + 1 < len(self.stages) else None
+        while True:
+            waiting = time.time()
+            entry = None
+            while not self._stopped.is_set():
+                try:
+                    entry = stage.queue.get(timeout=POLL_INTERVAL)
+                    break
+                except queue.Empty:
+                    continue
+            if entry is None or entry is _STOP:
+                stage.record(0.0, time.time() - waiting, 0.0, None)
+                break
+            item, value = entry
+            started = time.time()
+            try:
+                with tracing.span(self.name, stage=stage.name, id=self._key(item)):
+                    result = stage.func(value)
+            except (Exception, SystemExit) as error:
+                stage.record(time.time() - started, started - waiting, 0.0, 'failed')
+                output.put((item, None, error))
+                continue
+            finished = time.time()
+            if result is None:
+                stage.record(finished - started, started - waiting, 0.0, 'skipped')
+                output.put((item, None, None))
+            elif next_queue is None:
+                stage.record(finished - started, started - waiting, 0.0, 'processed')
+                output.put((item, result, None))
+            else:
+                self._put(next_queue, (item, result))
+                stage.record(finished - started, started - waiting, time.time() - finished, 'processed')
+
+        # The last worker of a stage stops the workers of the next stage.
+        with self._lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last and next_queue is not None:
+            for _ in range(self.stages[index + 1].workers):
+                self._put(next_queue, _STOP)
+
+    def stats(self):
+        """
+        Returns the statistics of the stages: processed, skipped and failed items, items per second and the
+        share of the time the workers are busy, waiting for an item (idle) or waiting for the next stage
+        (blocked). The bottleneck is the stage whose workers are the busiest.
+        """
+        elapsed = self._elapsed or (time.time() - self._started if self._started else 0.0)
+        stats = []
+        for stage in self.stages:
+            capacity = stage.workers * elapsed or 1.0
+            stats.append({'stage': stage.name, 'workers': stage.workers, 'processed': stage.processed,
+                          'skipped': stage.skipped, 'failed': stage.failed,
+                          'rate': stage.processed / elapsed if elapsed else 0.0,
+                          'busy': stage.busy_seconds / capacity, 'idle': stage.idle_seconds / capacity,
+                          'blocked': stage.blocked_seconds / capacity})
+        return stats
+
+    def summary(self):
+        """
+        Returns the lines of the summary of the stages.
+        """
+        lines = ['{:<12} {:>7} {:>9} {:>7} {:>6} {:>8} {:>6} {:>6} {:>8}'.format(
+            'stage', 'workers', 'processed', 'skipped', 'failed', 'items/s', 'busy', 'idle', 'blocked')]
+        for stage in self.stats():
+            lines.append('{stage:<12} {workers:>7} {processed:>9} {skipped:>7} {failed:>6} {rate:>8.2f} '
+                         '{busy:>6.0%} {idle:>6.0%} {blocked:>8.0%}'.format(**stage))
+        return lines
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import helpers.tracing as tracing
+import threading
+
+
+class IssueBundle(object):
+    """
+    Redmine issue along with everything read from Redmine to migrate it.
+    """
+    __slots__ = ('issue', 'relations', 'checklists', 'subtasks')
+
+    def __init__(self, issue, relations, checklists, subtasks):
+        """
+        Parameters:
+            issue (obj): Redmine issue (Resource object), with its journals, attachments, relations and children.
+            relations (list): Relations of the issue.
+            checklists (list): Checklist items of the issue.
+            subtasks (list): Sub-tasks of the issue (Resource objects), with their journals, attachments and
+                relations.
+        """
+        self.issue = issue
+        self.relations = relations
+        self.checklists = checklists
+        self.subtasks = subtasks
+
+
+class IssuePrefetcher(object):
+    """
+    Fetches the bundles of the Redmine issues on an asyncio event loop running in the background.
+    The issue is read with a single request, including its journals, attachments, relations and children. The
+    checklists are read along, then the sub-tasks at once (the blocking clients run in a thread pool), so an
+    issue is read in about the time of two requests.
+    """
+
+    def __init__(self, get_issue, get_checklists, workers):
+        """
+        Parameters:
+            get_issue (function): Returns a Redmine issue with its journals, attachments, relations and
+                children, by ID.
+            get_checklists (function): Returns the checklist items of an issue, by ID.
+            workers (int): Maximum number of concurrent requests.
+        """
+        self._get_issue = get_issue
+        self._get_checklists = get_checklists
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1))
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='prefetch', daemon=True)
+        self._thread.start()
+        self._pending = dict()
+        self._lock = threading.Lock()
+
+    def _run(self, func, *args):
+        # Run in a copy of the context of the coroutine, e.g. to keep the current tracing span.
+        return self._loop.run_in_executor(self._executor, contextvars.copy_context().run, func, *args)
+
+    async def _fetch(self, issue_id, issue=None):
+        with tracing.span('prefetch', id=issue_id):
+            if issue is None:
+                issue, checklists = await asyncio.gather(self._run(self._get_issue, issue_id),
+                                                         self._run(self._get_checklists, issue_id))
+            else:
+                checklists = await self._run(self._get_checklists, issue_id)
+            raw = issue.raw()
+            # The children are left out of the response when the issue has no sub-tasks.
+            child_ids = sorted(child['id'] for child in raw.get('children') or [])
+            subtasks = await asyncio.gather(*[self._run(self._get_issue, child_id) for child_id in child_ids])
+        return IssueBundle(issue, raw.get('relations') or [], checklists, list(subtasks))
+
+    def _submit(self, issue_id, issue=None):
+        with self._lock:
+            if issue_id not in self._pending:
+                self._pending[issue_id] = asyncio.run_coroutine_threadsafe(self._fetch(issue_id, issue),
+                                                                           self._loop)
+            return self._pending[issue_id]
+
+    def bundle(self, issue_id, issue=None):
+        """
+        Returns the bundle of an issue, waits for it if it is being fetched, fetches it otherwise.
+        Parameters:
+            issue_id (int): Issue ID in Redmine.
+            issue (obj): Optional, the issue already read with get_issue, it is not read again.
+        Returns:
+            IssueBundle object.
+        """
+        future = self._submit(issue_id, issue)
+        try:
+            return future.result()
+        finally:
+            with self._lock:
+                self._pending.pop(issue_id, None)
+
+    def close(self):
+        """
+        Stops the event loop and the thread pool, the pending bundles are discarded.
+        """
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._executor.shutdown(wait=False)
+        self._loop.close()
@@ -1,26 +1,120 @@
+from jira import JIRAError
+from requests_toolbelt import MultipartEncoder
+import collections
+import helpers.attachments as attachments
+import helpers.ledger as ledger
+import helpers.pipeline as pipeline
 import helpers.settings as settings
-import os
+import helpers.snapshot as snapshot
+import helpers.tracing as tracing
+import helpers.transport as transport
+import helpers.wiki_tree as wiki_tree
+import helpers.workers as workers
 import re
+import threading
+
+# Number of issues requested from Redmine at once while streaming a batch of issues.
+ISSUES_PAGE_SIZE = 100
+# Number of users requested from Redmine at once while listing the users.
+USERS_PAGE_SIZE = 100
+# Number of sub-tasks created in Jira at once (limit of the bulk create).
+SUBTASKS_PAGE_SIZE = 50
+# Number of concurrent reads of the Redmine issues.
+PREFETCH_WORKERS = 8
+# Data read along with a Redmine issue.
+ISSUE_INCLUDES = ['journals', 'attachments', 'relations', 'children']
+# Stages of the migration pipeline, and default number of workers of the transform and write back stages
+# (the extract and load stages are sized for the number of threads).
+PIPELINE_STAGES = ('extract', 'transform', 'load', 'write_back')
+TRANSFORM_WORKERS = 2
+WRITE_BACK_WORKERS = 2
+# Number of pages requested from Confluence at once while listing the pages of a space.
+CONFLUENCE_PAGE_SIZE = 500
+
+# Names of the Jira fields, used in the messages.
+FIELD_LABELS = {
+    'reporter': 'the reporter',
+    'assignee': 'the assignee',
+    'customfield_11706': 'R&D Work Type',
+    'customfield_10002': 'Story Points',
+    'customfield_13504': 'Live Demo',
+    'customfield_12802': 'Team',
+    'customfield_10005': 'Epic link',
+}
+
+# Fields of the Jira create screen, per issue type.
+_creatable_fields = dict()
+_createmeta_lock = threading.Lock()
 
 
 def get_login(user_id):
     """
-    Retrieves the username of a given user.
+    Retrieves the username of a given user from the Redmine user directory.
     Parameters:
         user_id (int): User ID in Redmine.
     Returns:
         Returns the username, if found. Otherwise None will be returned.
     """
+    return settings.user_directory.login(user_id)
+
+
+def get_user(user_id):
+    """
+    Retrieves a given user from Redmine.
+    Parameters:
+        user_id (int): User ID in Redmine.
+    Returns:
+        Returns a dictionary with the user details, if found. Otherwise None will be returned.
+    """
+    if settings.redmine_snapshot is not None:
+        return settings.redmine_snapshot.user(user_id)
     url = "{}/users/{}.json".format(settings.yaml_vars['redmine_server'], user_id)
     json_data = settings.request_redmine(url)
     if json_data:
-        user = json_data.get('user')
-        if user.get('login'):
-            return user.get('login')
+        return json_data.get('user')
     else:
         return None
 
 
+def get_users():
+    """
+    Retrieves all the Redmine users (active, registered and locked), page by page.
+    Returns:
+        Yields a dictionary with the details of each user.
+    """
+    if settings.redmine_snapshot is not None:
+        for user in settings.redmine_snapshot.users:
+            yield user
+        return
+    offset = 0
+    while True:
+        url = "{}/users.json?status=&limit={}&offset={}".format(settings.yaml_vars['redmine_server'],
+                                                                 USERS_PAGE_SIZE, offset)
+        json_data = settings.request_redmine(url)
+        if json_data is None:
+            raise Exception("Could not list the users of {}".format(settings.yaml_vars['redmine_server']))
+        for user in json_data['users']:
+            yield user
+        offset += len(json_data['users'])
+        if not json_data['users'] or offset >= json_data.get('total_count', 0):
+            break
+
+
+def find_user_id(name):
+    """
+    Searches a Redmine user by name.
+    Parameters:
+        name (str): Name of the user (login, firstname, lastname).
+    Returns:
+        Returns the ID of the first matching user, if found. Otherwise None will be returned.
+    """
+    if settings.redmine_snapshot is not None:
+        users = settings.redmine_snapshot.find_users(name)
+        return users[0]['id'] if users else None
+    users = settings.redmine.user.filter(name=name)
+    return users[0].id if users else None
+
+
 def get_relations(issue_id):
     """
     Retrieves the relations of a Redmine issue.
@@ -29,23 +123,109 @@ def get_relations(issue_id):
     Returns:
         Returns a dictionary with all the relations.
     """
+    if settings.redmine_snapshot is not None:
+        return settings.redmine_snapshot.issue(issue_id).get('relations') or []
     url = "{}/issues/{}/relations.json".format(settings.yaml_vars['redmine_server'], issue_id)
     json_data = settings.request_redmine(url)
     return json_data["relations"]
 
 
-def get_pages_info():
+def get_issue_subjects(issue_ids):
+    """
+    Retrieves the subjects of the given Redmine issues, with one request per hundred issues.
+    Parameters:
+        issue_ids (list): Issue IDs in Redmine.
+    Returns:
+        Returns a dictionary with the issue ID - subject.
+    """
+    subjects = dict()
+    issue_ids = sorted(set(issue_ids))
+    if settings.redmine_snapshot is not None:
+        for issue_id in issue_ids:
+            if settings.redmine_snapshot.subject(issue_id) is not None:
+                subjects[issue_id] = settings.redmine_snapshot.subject(issue_id)
+        return subjects
+    for index in range(0, len(issue_ids), ISSUES_PAGE_SIZE):
+        chunk = issue_ids[index:index + ISSUES_PAGE_SIZE]
+        for issue in settings.redmine.issue.filter(issue_id=','.join(str(issue_id) for issue_id in chunk),
+                                                   status_id='*', limit=ISSUES_PAGE_SIZE):
+            subjects[issue.id] = issue.subject
+    return subjects
+
+
+def get_pages_info(project_id=None):
     """
     Retrieves the Redmine Wiki pages title - parent information.
+    Parameters:
+        project_id (int/str): Redmine project, the migrated project by default.
     Returns:
         Returns a dictionary with all the relations.
     """
-    url = "{}/projects/{}/wiki/index.json".format(settings.yaml_vars['redmine_server'],
-                                                  settings.yaml_vars['redmine_project_id'])
+    if project_id is None:
+        project_id = settings.yaml_vars['redmine_project_id']
+    if settings.redmine_snapshot is not None:
+        if not settings.redmine_snapshot.is_project(project_id):
+            raise snapshot.SnapshotError("The Wiki of the project {} is not in the snapshot".format(project_id))
+        return settings.redmine_snapshot.wiki_index
+    url = "{}/projects/{}/wiki/index.json".format(settings.yaml_vars['redmine_server'], project_id)
     json_data = settings.request_redmine(url)
     return json_data["wiki_pages"]
 
 
+def get_confluence_pages():
+    """
+    Retrieves all the pages of the Confluence space, page by page.
+    Returns:
+        Returns a dictionary with the title - ID of the Confluence pages.
+    """
+    pages = dict()
+    start = 0
+    while True:
+        results = settings.confluence.get_all_pages_from_space(settings.yaml_vars['confluence_space'],
+                                                               start=start, limit=CONFLUENCE_PAGE_SIZE)
+        if not results:
+            break
+        for page in results:
+            pages[page['title']] = page['id']
+        start += len(results)
+    return pages
+
+
+def get_confluence_macros():
+    """
+    Retrieves the macros known by Confluence, as listed in the macro browser.
+    Returns:
+        Returns a list with the names of the macros (including their alternate names).
+    """
+    url = '{}/rest/tinymce/1/macro/browse-macros.json'.format(settings.confluence.url.rstrip('/'))
+    response = settings.confluence._session.get(url, timeout=transport.timeout)
+    response.raise_for_status()
+    names = []
+    for macro in response.json().get('macros', []):
+        names.append(macro.get('macroName') or macro.get('name'))
+        names.extend(macro.get('alternateNames') or [])
+    return [name for name in names if name]
+
+
+def get_wiki_page(title, project_id=None):
+    """
+    Retrieves a Redmine Wiki page.
+    Parameters:
+        title (str): Title of the Redmine Wiki page.
+        project_id (int/str): Redmine project, the migrated project by default.
+    Returns:
+        Redmine Wiki page (Resource object).
+    """
+    if project_id is None:
+        project_id = settings.yaml_vars['redmine_project_id']
+    if settings.redmine_snapshot is not None:
+        if not settings.redmine_snapshot.is_project(project_id):
+            raise snapshot.SnapshotError("The Wiki of the project {} is not in the snapshot".format(project_id))
+        return settings.redmine.wiki_page.new_manager('wiki_page', project_id=project_id).to_resource(
+            settings.redmine_snapshot.wiki_page(title))
+    return settings.redmine.wiki_page.get(title, project_id=project_id)
+
+
 def get_checklists(issue_id):
     """
     Retrieves the checklist defined in a Redmine issue.
@@ -54,10 +234,34 @@ def get_checklists(issue_id):
     Returns:
         Returns a formatted string with the checklist.
     """
+    return format_checklists(fetch_checklists(issue_id))
+
+
+def fetch_checklists(issue_id):
+    """
+    Retrieves the checklist items of a Redmine issue.
+    Parameters:
+        issue_id (int): Issue ID in Redmine.
+    Returns:
+        Returns a list of dictionaries with the checklist items.
+    """
+    if settings.redmine_snapshot is not None:
+        return settings.redmine_snapshot.checklists(issue_id)
     url = "{}/issues/{}/checklists.json".format(settings.yaml_vars['redmine_server'], issue_id)
     json_data = settings.request_redmine(url)
+    return json_data['checklists']
+
+
+def format_checklists(checklist_items):
+    """
+    Formats the checklist items of a Redmine issue.
+    Parameters:
+        checklist_items (list): Checklist items, as returned by fetch_checklists.
+    Returns:
+        Returns a formatted string with the checklist.
+    """
     checklists = [(checklist.get('subject'), checklist.get('is_done'))
-                  for checklist in json_data['checklists']]
+                  for checklist in checklist_items]
     result = ''
     if checklists:
         result = '\n\n*Checklist:*\n'
@@ -69,6 +273,111 @@ def get_checklists(issue_id):
     return result
 
 
+def parse_pbis(pbis):
+    """
+    Parses a comma separated list of PBI numbers and/or ranges.
+    Parameters:
+        pbis (str): PBI numbers, e.g. '101,105,110-150'.
+    Returns:
+        Yields the PBI numbers (int) in the given order.
+    """
+    for pbi in pbis.split(','):
+        pbi = pbi.strip()
+        if not pbi:
+            continue
+        if '-' in pbi:
+            first, last = pbi.split('-', 1)
+            for issue_id in range(int(first), int(last) + 1):
+                yield issue_id
+        else:
+            yield int(pbi)
+
+
+def get_issues():
+    """
+    Streams the Redmine issues selected in the command line, either by a saved query or by a
+    list/range of PBI numbers. Issues are requested page by page, so only one page is held in memory.
+    Returns:
+        Yields the Redmine issues (Resource objects).
+    """
+    if settings.redmine_snapshot is not None:
+        # The saved query was run when the snapshot was exported.
+        if settings.arg_vars.query:
+            if settings.redmine_snapshot.manifest.get('query') != settings.arg_vars.query:
+                print("The snapshot was exported for the saved query {}".format(
+                    settings.redmine_snapshot.manifest.get('query')))
+            issue_ids = settings.redmine_snapshot.selected_issue_ids()
+        else:
+            issue_ids = parse_pbis(settings.arg_vars.pbi)
+        for issue_id in issue_ids:
+            if settings.redmine_snapshot.has_issue(issue_id):
+                yield fetch_issue(issue_id)
+            else:
+                print("Redmine issue {} not found in the snapshot".format(issue_id))
+    elif settings.arg_vars.query:
+        offset = 0
+        while True:
+            issues = list(settings.redmine.issue.filter(project_id=settings.yaml_vars['redmine_project_id'],
+                                                        query_id=settings.arg_vars.query,
+                                                        offset=offset, limit=ISSUES_PAGE_SIZE))
+            for redmine_issue in issues:
+                yield redmine_issue
+            if len(issues) < ISSUES_PAGE_SIZE:
+                break
+            offset += ISSUES_PAGE_SIZE
+    else:
+        pbis = parse_pbis(settings.arg_vars.pbi)
+        while True:
+            chunk = [str(pbi) for _, pbi in zip(range(ISSUES_PAGE_SIZE), pbis)]
+            if not chunk:
+                break
+            issues = {redmine_issue.id: redmine_issue for redmine_issue in settings.redmine.issue.filter(
+                issue_id=','.join(chunk), status_id='*', limit=ISSUES_PAGE_SIZE)}
+            for pbi in chunk:
+                if int(pbi) in issues:
+                    yield issues[int(pbi)]
+                else:
+                    print("Redmine issue {} not found".format(pbi))
+
+
+def fetch_issue(issue_id):
+    """
+    Retrieves a Redmine issue along with its journals, attachments, relations and children, with a single
+    request.
+    Parameters:
+        issue_id (int): Issue ID in Redmine.
+    Returns:
+        Redmine issue (Resource object).
+    """
+    if settings.redmine_snapshot is not None:
+        return settings.redmine.issue.to_resource(settings.redmine_snapshot.issue(issue_id))
+    return settings.redmine.issue.get(issue_id, include=ISSUE_INCLUDES)
+
+
+def is_fetched(redmine_issue):
+    """
+    Checks whether a Redmine issue was retrieved by fetch_issue, along with its journals, attachments and
+    relations (the children are left out when the issue has no sub-tasks).
+    Parameters:
+        redmine_issue (obj): Redmine issue (Resource object).
+    Returns:
+        True, if the issue is complete. Otherwise False will be returned.
+    """
+    raw = redmine_issue.raw()
+    return all(raw.get(name) is not None for name in ('journals', 'attachments', 'relations'))
+
+
+def is_migrated(redmine_issue):
+    """
+    Checks whether a Redmine issue is already migrated, either recorded in the migration ledger or tagged.
+    Parameters:
+        redmine_issue (obj): Redmine issue (Resource object).
+    Returns:
+        True, if the issue is already migrated. Otherwise False will be returned.
+    """
+    return bool(settings.migration_ledger.jira_key(redmine_issue.id) or settings.is_imported(redmine_issue.subject))
+
+
 def validate_issue(redmine_issue):
     """
     Check if a given Redmine issue is either in Finished or Cancelled state.
@@ -84,6 +393,148 @@ def validate_issue(redmine_issue):
     return True
 
 
+def import_issue(redmine_issue):
+    """
+    Imports a Redmine issue in Jira and adds a reference to the Jira issue in the Redmine issue.
+    The stages of the migration pipeline are run one after the other.
+    Parameters:
+        redmine_issue (obj): Redmine issue (Resource object).
+    Returns:
+        Key of the newly created Jira issue, None if the Redmine issue is skipped.
+    """
+    # The requests sent while importing the issue are traced in its span.
+    with tracing.span('issue', id=redmine_issue.id):
+        issue_bundle = extract_issue(redmine_issue)
+        if issue_bundle is None:
+            return None
+        return write_back_issue(load_issue(transform_issue(issue_bundle)))
+
+
+def extract_issue(redmine_issue):
+    """
+    Extract stage: reads everything needed to migrate a Redmine issue.
+    Parameters:
+        redmine_issue (obj): Redmine issue (Resource object).
+    Returns:
+        IssueBundle object, None if the issue is skipped.
+    """
+    if not validate_issue(redmine_issue):
+        return None
+    if is_migrated(redmine_issue):
+        print("PBI {} is already imported in Jira".format(redmine_issue.id))
+        return None
+    return settings.issue_prefetcher.bundle(redmine_issue.id, redmine_issue if is_fetched(redmine_issue) else None)
+
+
+def transform_issue(issue_bundle):
+    """
+    Transform stage: prepares the Jira fields and the comments of a Redmine issue.
+    Parameters:
+        issue_bundle (obj): IssueBundle object.
+    Returns:
+        Draft of the Jira issue (dict), see prepare_jira_issue.
+    """
+    return prepare_jira_issue(issue_bundle.issue, issue_bundle)
+
+
+def load_issue(draft):
+    """
+    Load stage: creates the Jira issue (along with its links, attachments, comments and sub-tasks).
+    Parameters:
+        draft (dict): Draft of the Jira issue.
+    Returns:
+        The given draft, with the created Jira issue.
+    """
+    draft['jira_issue'] = load_jira_issue(draft['issue'], draft)
+    return draft
+
+
+def write_back_issue(draft):
+    """
+    Write back stage: adds a reference to the Jira issue in the Redmine issue.
+    Parameters:
+        draft (dict): Draft of the Jira issue, with the created Jira issue.
+    Returns:
+        Key of the Jira issue.
+    """
+    # The Redmine issues are left untouched when migrating from a snapshot.
+    if settings.redmine_snapshot is None:
+        update_redmine_issue(draft['jira_issue'].key, draft['issue'])
+    return draft['jira_issue'].key
+
+
+def get_stage_workers():
+    """
+    Returns the number of workers of each stage of the migration pipeline, the extract and load stages are
+    sized for the number of threads given in the command line.
+    """
+    stage_workers = {'extract': settings.arg_vars.threads, 'transform': TRANSFORM_WORKERS,
+                     'load': settings.arg_vars.threads, 'write_back': WRITE_BACK_WORKERS}
+    stage_workers.update(settings.yaml_vars.get('pipeline_workers') or {})
+    return stage_workers
+
+
+def create_pipeline(name, stage_functions, key=None):
+    """
+    Creates the migration pipeline (extract, transform, load and write back stages).
+    Parameters:
+        name (str): Name of the pipeline.
+        stage_functions (list): Functions of the extract, transform, load and write back stages.
+        key (function): Optional, returns the ID of an item.
+    Returns:
+        Pipeline object.
+    """
+    stage_workers = get_stage_workers()
+    stages = [pipeline.Stage(stage_name, func, stage_workers[stage_name])
+              for stage_name, func in zip(PIPELINE_STAGES, stage_functions)]
+    queue_size = settings.yaml_vars.get('pipeline_queue_size') or 2 * settings.arg_vars.threads
+    return pipeline.Pipeline(name, stages, queue_size, key=key)
+
+
+def print_pipeline_summary(migration_pipeline):
+    """
+    Prints the throughput of the stages of a migration pipeline.
+    """
+    print("\nStages (share of the time the workers are busy, waiting for an item and waiting for the next stage):")
+    for line in migration_pipeline.summary():
+        print("  " + line)
+
+
+def import_issues(redmine_issues):
+    """
+    Imports the given Redmine issues in Jira. The issues go through the stages of the migration pipeline
+    (extract from Redmine, transform, load into Jira and write back to Redmine), the stages run in parallel.
+    A failing issue does not stop the others, a summary of the imported, skipped and failed issues is
+    printed at the end.
+    Parameters:
+        redmine_issues (iterable): Redmine issues (Resource objects).
+    Returns:
+        A dictionary with the lists of imported, skipped and failed issues.
+    """
+    summary = {'imported': [], 'skipped': [], 'failed': []}
+    issue_pipeline = create_pipeline('issue', [extract_issue, transform_issue, load_issue, write_back_issue],
+                                     key=lambda redmine_issue: redmine_issue.id)
+    for redmine_issue, jira_key, error in issue_pipeline.run(redmine_issues):
+        if error is not None:
+            print("Failed while importing the Redmine issue {}: {}".format(redmine_issue.id, error))
+            summary['failed'].append((redmine_issue.id, error))
+        elif jira_key:
+            summary['imported'].append((redmine_issue.id, jira_key))
+        else:
+            summary['skipped'].append(redmine_issue.id)
+
+    print("\nImported {} PBIs, skipped {}, failed {}".format(
+        len(summary['imported']), len(summary['skipped']), len(summary['failed'])))
+    for issue_id, jira_key in summary['imported']:
+        print("  #{} -> {}".format(issue_id, jira_key))
+    for issue_id in summary['skipped']:
+        print("  #{} skipped".format(issue_id))
+    for issue_id, error in summary['failed']:
+        print("  #{} failed: {}".format(issue_id, error))
+    print_pipeline_summary(issue_pipeline)
+    return summary
+
+
 def is_migration_successful(confluence_page):
     """
     Checks whether the Confluence page is successfully created.
@@ -97,75 +548,183 @@ def is_migration_successful(confluence_page):
     return True
 
 
-def import_confluence_wiki(wiki_page_title):
+def extract_wiki_page(wiki_page_title):
     """
-    Imports Redmine Wiki page in Confluence.
+    Extract stage: reads a Redmine Wiki page, unless it is already migrated.
+    Pages recorded in the migration ledger are not fetched again, unless the link to the Confluence page
+    may still have to be added to them (-r).
     Parameters:
         wiki_page_title (str): Title of the Redmine Wiki page to migrate.
     Returns:
-        Function calls itself until all the pages are imported and returns 0, if successful.
-    """
-    wiki_page = settings.redmine.wiki_page.get(wiki_page_title,
-                                               project_id=settings.yaml_vars['redmine_project_id'])
-    if not settings.is_imported(wiki_page.text) and wiki_page.title not in settings.wiki_pages_imported:
-        confluence_page = create_confluence_wiki(wiki_page)
-        # Update the original Wiki page and add a link to the Confluence Page, if requested.
-        if settings.arg_vars.remove:
-            update_redmine_wiki(confluence_page, wiki_page)
-
-    # Import child pages, if they are present.
-    if wiki_page_title in settings.wiki_pages_rel:
-        child_pages = settings.wiki_pages_rel[wiki_page_title].split(', ')
-        for child_page in child_pages:
-            if child_page:
-                import_confluence_wiki(child_page)
+        Draft of the Confluence page (dict), None if the page and its child pages are skipped.
+    """
+    status, page_id, error = settings.migration_ledger.wiki_page_status(wiki_page_title)
+    if status == ledger.FAILED and not settings.arg_vars.resume:
+        print("{}: Skipped, failed in a previous run ({}). Use --resume to retry".format(wiki_page_title, error))
+        return None
+    draft = {'title': wiki_page_title, 'status': status, 'page_id': page_id, 'wiki_page': None,
+             'content': None, 'confluence_page': None}
+    if status in (ledger.CREATED, ledger.IMPORTED):
+        draft['confluence_page'] = get_confluence_page_reference(page_id, wiki_page_title)
+    if status == ledger.CREATED:
+        # The page was created in a previous run, only its attachments are pending.
+        draft['wiki_page'] = get_wiki_page(wiki_page_title)
+    elif status == ledger.IMPORTED:
+        if settings.arg_vars.remove and settings.redmine_snapshot is None:
+            # The previous run may have stopped before adding the link to the Confluence page.
+            draft['wiki_page'] = get_wiki_page(wiki_page_title)
     else:
-        return 0
+        wiki_page = get_wiki_page(wiki_page_title)
+        if not settings.is_imported(wiki_page.text) and \
+                settings.migration_ledger.confluence_page_id(wiki_page.title) is None:
+            draft['wiki_page'] = wiki_page
+    return draft
+
+
+def transform_wiki_page(draft):
+    """
+    Transform stage: translates the content of a Redmine Wiki page to the Confluence wiki markup.
+    Parameters:
+        draft (dict): Draft of the Confluence page.
+    Returns:
+        The given draft, with the content of the page.
+    """
+    if draft['wiki_page'] is not None and draft['status'] not in (ledger.CREATED, ledger.IMPORTED):
+        draft['content'] = prepare_confluence_content(draft['wiki_page'])
+    return draft
 
 
-def create_confluence_wiki(wiki_page):
+def load_wiki_page(draft):
+    """
+    Load stage: creates the Confluence page along with its attachments, or completes its attachments.
+    Parameters:
+        draft (dict): Draft of the Confluence page.
+    Returns:
+        The given draft, with the created Confluence page.
+    """
+    wiki_page = draft['wiki_page']
+    if wiki_page is None or draft['status'] == ledger.IMPORTED:
+        return draft
+    if draft['status'] == ledger.CREATED:
+        if not add_attachments(wiki_page, draft['confluence_page']):
+            settings.migration_ledger.record_wiki_page(wiki_page.title, draft['page_id'])
+    else:
+        draft['confluence_page'] = create_confluence_wiki(wiki_page, draft['content'])
+    return draft
+
+
+def write_back_wiki_page(draft):
+    """
+    Write back stage: replaces the content of the Redmine Wiki page with a link to the Confluence page,
+    if requested.
+    Parameters:
+        draft (dict): Draft of the Confluence page, with the created Confluence page.
+    Returns:
+        List of the child page titles, which can be imported once this page is imported.
+    """
+    if draft['confluence_page'] is not None and draft['wiki_page'] is not None and settings.arg_vars.remove \
+            and settings.redmine_snapshot is None and not settings.is_imported(draft['wiki_page'].text):
+        update_redmine_wiki(draft['confluence_page'], draft['wiki_page'])
+    return settings.wiki_tree.children(draft['title'])
+
+
+def import_confluence_wikis(wiki_page_titles):
+    """
+    Imports the given Redmine Wiki pages and all their child pages in Confluence.
+    The pages go through the stages of the migration pipeline (extract from Redmine, transform, load into
+    Confluence and write back to Redmine), the stages run in parallel. A child page is scheduled as soon
+    as its parent page is created in Confluence.
+    The progress is recorded in the migration ledger as the pages are imported, a failed page is
+    recorded as well. With --keep-going, the other pages are imported (but the child pages of a failed
+    page), otherwise the import stops.
+    Parameters:
+        wiki_page_titles (list): Titles of the Redmine Wiki pages to migrate.
+    Returns:
+        List of the (title, error) of the failed pages.
+    """
+    failed = []
+    page_pipeline = create_pipeline('page', [extract_wiki_page, transform_wiki_page, load_wiki_page,
+                                             write_back_wiki_page])
+    results = page_pipeline.run(wiki_page_titles, follow_up=lambda wiki_page_title, child_pages: child_pages)
+    try:
+        for wiki_page_title, _, error in results:
+            if error is not None:
+                print("Failed while importing the Redmine Wiki - {} : {}".format(wiki_page_title, error))
+                # A page created in Confluence before the failure is kept, it is not created again.
+                if settings.migration_ledger.confluence_page_id(wiki_page_title) is None:
+                    settings.migration_ledger.record_wiki_page(wiki_page_title, None, ledger.FAILED, str(error))
+                failed.append((wiki_page_title, error))
+                if not settings.arg_vars.keep_going:
+                    # Stop scheduling new pages, the pages in progress are completed by their current stage.
+                    raise error
+    finally:
+        results.close()
+        print_pipeline_summary(page_pipeline)
+
+    if failed:
+        print("\n{} pages could not be migrated, use --resume to retry them:".format(len(failed)))
+        for wiki_page_title, error in failed:
+            print("  {}: {}".format(wiki_page_title, error))
+    return failed
+
+
+def prepare_confluence_content(wiki_page):
+    """
+    Translates the content of a Redmine Wiki page to the Confluence wiki markup.
+    Parameters:
+        wiki_page (obj): Redmine Wiki page to migrate.
+    Returns:
+        Content of the Confluence page (str).
+    """
+    wiki_content = settings.update_formatting(wiki_page.text.split('{{fnlist}}', 1)[0],
+                                              current_page=wiki_page.title)
+    # Add author and the last update details
+    wiki_content += "\n----\n??Migrated from Redmine Wiki [{}|{}/projects/{}/wiki/{}]. " \
+                    "Originally created on {} by {}. Last update on Redmine was on {} by {}??".format(
+        wiki_page.title, settings.yaml_vars['redmine_server'],
+        settings.yaml_vars['redmine_wiki_project'], wiki_page.title,
+        wiki_page.created_on, get_original_author(wiki_page), wiki_page.updated_on, wiki_page.author.name)
+
+    # Escape the macros unknown by Confluence, so that the page is accepted at the first attempt.
+    return settings.macro_registry.escape(wiki_content)
+
+
+def create_confluence_wiki(wiki_page, wiki_content=None):
     """
     Creates a Confluence page from the given Redmine Wiki page.
     Parameters:
         wiki_page (obj): Redmine Wiki page to migrate.
+        wiki_content (str): Content of the page in the Confluence wiki markup, translated if not given.
     Returns:
         Confluence page (obj), if successful. Otherwise, it returns -1.
     """
     # Create a page in Confluence.
     new_title = wiki_page.title.replace('_', ' ')
-    settings.current_page = wiki_page.title
     print("Creating a Confluence page: {}".format(new_title))
     try:
-        wiki_content = settings.update_formatting(wiki_page.text.split('{{fnlist}}', 1)[0])
-        wiki_page_first_version = settings.redmine.wiki_page.get(wiki_page.title,
-                                                                 project_id=settings.yaml_vars['redmine_project_id'],
-                                                                 version=1)
-        # Add author and the last update details
-        wiki_content += "\n----\n??Migrated from Redmine Wiki [{}|{}/projects/{}/wiki/{}]. " \
-                        "Originally created on {} by {}. Last update on Redmine was on {} by {}??".format(
-            wiki_page.title, settings.yaml_vars['redmine_server'],
-            settings.yaml_vars['redmine_wiki_project'], wiki_page.title,
-            wiki_page.created_on, wiki_page_first_version.author.name, wiki_page.updated_on, wiki_page.author.name)
+        if wiki_content is None:
+            wiki_content = prepare_confluence_content(wiki_page)
 
         # Get the parent, if present
         confluence_parent_id = None
         # Check if parent attribute is present in the wiki_page
         if hasattr(wiki_page, 'parent'):
             wiki_parent = wiki_page.parent.title
-            # check if the parent page is migrated to Confluence
-            parent_wiki_page = settings.redmine.wiki_page.get(
-                wiki_parent, project_id=settings.yaml_vars['redmine_project_id'])
-            # check if page title is present in Confluence
-            is_present = settings.confluence.page_exists(settings.yaml_vars['confluence_space'],
-                                                         parent_wiki_page.title.replace('_', ' '))
-            if is_present or parent_wiki_page.title in settings.wiki_pages_imported:
-                confluence_parent_id = settings.confluence.get_page_id(settings.yaml_vars['confluence_space'],
-                                                                       parent_wiki_page.title.replace('_', ' '))
-            elif settings.is_imported(parent_wiki_page.text):
-                parent_confluence_page = settings.get_confluence_page(parent_wiki_page.text)
-                confluence_parent_id = parent_confluence_page['id']
-                print("{}: Parent page found in Confluence: {}".format(
-                    new_title, parent_confluence_page['title']))
+            # Resolve the parent from the migration ledger, then from the index of the Confluence space.
+            confluence_parent_id = settings.migration_ledger.confluence_page_id(wiki_parent)
+            if confluence_parent_id is None:
+                confluence_parent_id = settings.link_index.confluence_page_id(wiki_parent.replace('_', ' '))
+                if confluence_parent_id is None:
+                    # The parent page may have been migrated under another title, see its reference.
+                    parent_wiki_page = get_wiki_page(wiki_parent)
+                    if settings.is_imported(parent_wiki_page.text):
+                        parent_confluence_page = settings.get_confluence_page(parent_wiki_page.text)
+                        if parent_confluence_page is not None:
+                            confluence_parent_id = parent_confluence_page['id']
+                            print("{}: Parent page found in Confluence: {}".format(
+                                new_title, parent_confluence_page['title']))
+                if confluence_parent_id is not None:
+                    settings.migration_ledger.record_wiki_page(wiki_parent, confluence_parent_id)
         confluence_page = settings.confluence.create_page(
             space=settings.yaml_vars['confluence_space'],
             parent_id=confluence_parent_id,
@@ -181,6 +740,7 @@ def create_confluence_wiki(wiki_page):
                   " macro : " + unknown_macro[0])
 
             if unknown_macro:
+                settings.macro_registry.learn(unknown_macro[0])
                 search_unknown_macro = re.findall('{' + unknown_macro[0], wiki_content, re.IGNORECASE)
                 for searched_macro in set(search_unknown_macro):
                     wiki_content = wiki_content.replace(searched_macro, '\\' + searched_macro)
@@ -225,32 +785,119 @@ def create_confluence_wiki(wiki_page):
                                                  confluence_page['reason'])
         print("Created a new confluence page: {}".format(wiki_page.title))
         settings.wiki_pages_imported.add(wiki_page.title)
+        settings.migration_ledger.record_wiki_page(wiki_page.title, confluence_page['id'], ledger.CREATED)
+        settings.link_index.add_confluence_page(new_title, confluence_page['id'])
 
-        # Add attachments
-        add_attachments(wiki_page, confluence_page)
+        # Add attachments, the page is complete once all of them are transferred.
+        if not add_attachments(wiki_page, confluence_page):
+            settings.migration_ledger.record_wiki_page(wiki_page.title, confluence_page['id'])
 
         # Add comments [NOT POSSIBLE TO FETCH THIS DATA FROM REDMINE VIA REST]
         # add_comments(wiki_page, confluence_page)
 
     except settings.ConfluenceImportError as error:
         print('Failed to create a confluence page {}: {}'.format(wiki_page.title, error))
-        exit(-1)
+        # The caller records the failure and stops the import unless --keep-going is given.
+        raise
 
     return confluence_page
 
 
-def create_jira_issue(redmine_issue):
+def get_original_author(wiki_page):
+    """
+    Retrieves the original author (author of the first version) of a Redmine Wiki page. The first
+    version is only fetched if the page has several versions and its author is not recorded yet.
+    Parameters:
+        wiki_page (obj): Redmine Wiki page.
+    Returns:
+        Name of the original author.
+    """
+    if getattr(wiki_page, 'version', None) == 1:
+        return wiki_page.author.name
+    author = settings.migration_ledger.original_author(wiki_page.title)
+    if author is None:
+        author = fetch_original_author(wiki_page.title)
+    return author
+
+
+def fetch_original_author(title):
+    """
+    Fetches the first version of a Redmine Wiki page and records its author in the migration ledger.
+    Parameters:
+        title (str): Title of the Redmine Wiki page.
+    Returns:
+        Name of the original author.
+    """
+    if settings.redmine_snapshot is not None:
+        author = settings.redmine_snapshot.original_author(title)
+    else:
+        author = read_original_author(title)
+    settings.migration_ledger.record_original_author(title, author)
+    return author
+
+
+def read_original_author(title):
+    """
+    Reads the author of the first version of a Redmine Wiki page.
+    Parameters:
+        title (str): Title of the Redmine Wiki page.
+    Returns:
+        Name of the original author.
+    """
+    first_version = settings.redmine.wiki_page.get(title, project_id=settings.yaml_vars['redmine_project_id'],
+                                                   version=1)
+    return first_version.author.name
+
+
+def prefetch_original_authors(wiki_pages):
+    """
+    Fetches in parallel the original authors of the Wiki pages which are going to be migrated.
+    Pages with a single version, already migrated pages and already recorded authors are skipped.
+    Parameters:
+        wiki_pages (list): Wiki pages info (dictionaries), as returned by get_pages_info.
+    Returns:
+        None.
+    """
+    titles = [page['title'] for page in wiki_pages
+              if page.get('version', 0) > 1
+              and settings.migration_ledger.confluence_page_id(page['title']) is None
+              and settings.migration_ledger.original_author(page['title']) is None]
+    for title, _, error in workers.run_concurrently(fetch_original_author, titles, settings.arg_vars.threads):
+        if error is not None:
+            print("{}: Could not fetch the original author: {}".format(title, error))
+
+
+def create_jira_issue(redmine_issue, issue_bundle=None):
     """
     Create a new Jira issue from the given Redmine issue.
     Parameters:
         redmine_issue (obj): Redmine issue (Resource object).
+        issue_bundle (obj): Relations, checklists and sub-tasks of the Redmine issue (IssueBundle object),
+            fetched if not given.
     Returns:
         Returns a newly created Jira issue (Resource object).
     """
+    return load_jira_issue(redmine_issue, prepare_jira_issue(redmine_issue, issue_bundle))
+
+
+def prepare_jira_issue(redmine_issue, issue_bundle=None):
+    """
+    Prepares the Jira fields and the comments of the given Redmine issue, without sending anything to Jira.
+    Parameters:
+        redmine_issue (obj): Redmine issue (Resource object).
+        issue_bundle (obj): Relations, checklists and sub-tasks of the Redmine issue (IssueBundle object),
+            fetched if not given.
+    Returns:
+        Draft of the Jira issue: a dictionary with the Redmine issue, its type, relations and sub-tasks, the
+        Jira fields, the fields sent along with the creation if possible, and the formatted comments.
+    """
     issue_type, redmine_work_type = get_issue_work_type(redmine_issue)
-    issue_description, subject = update_subject_description(redmine_issue)
+    # Relations are used both in the description and to link the issues in Jira.
+    issue_relations = issue_bundle.relations if issue_bundle else get_relations(redmine_issue.id)
+    issue_description, subject = update_subject_description(
+        redmine_issue, issue_relations, issue_bundle.checklists if issue_bundle else None)
 
-    issue_dict = {'project': settings.yaml_vars['jira_project'],
+    issue_dict = {'project': {'key': settings.yaml_vars['jira_project']},
                   'summary': subject,
                   'description': issue_description,
                   'issuetype': {'name': settings.yaml_vars['issue_types'][issue_type]}
@@ -314,59 +961,25 @@ def create_jira_issue(redmine_issue):
     if issue_fixed_version:
         issue_dict['fixVersions'] = [{'name': issue_fixed_version}]
 
-    try:
-        # Create a Jira issue
-        new_issue = settings.jira.create_issue(fields=issue_dict)
-        print("Created a new issue : {}".format(new_issue.key))
-    except Exception as e:
-        print("Failed to create a Jira issue: {}".format(e.text))
-        exit(-1)
-
-    # Update the reporter
-    author_id = redmine_issue.author.id
-    update_reporter(author_id, new_issue)
-
-    # Update Work Type
-    if issue_type != 'EPIC':
-        work_type = settings.yaml_vars['work_type'][redmine_work_type]
-        new_issue.update(fields={'customfield_11706': {'value': work_type}})
-        print("{}: Updated R&D Work Type to {}".format(new_issue.key, work_type))
-
-    # Update Time Spent
-    if redmine_issue.spent_hours:
-        time_spent = str(redmine_issue.spent_hours) + 'h'
-        settings.jira.add_worklog(new_issue, timeSpent=time_spent)
-        print("{}: Added the time spent to {}".format(new_issue.key, time_spent))
-
-    # Update relations
-    relate_issues(new_issue, redmine_issue)
+    # Fields which used to be updated after the creation of the issue, they are sent along with
+    # the creation when the create screen allows it.
+    optional_fields = get_reporter_fields(redmine_issue.author.id)
 
-    # Update Story Points
     if issue_type != 'EPIC':
-        records = reversed(list(item for item in redmine_issue.journals if hasattr(item, 'details')))
-        for record in records:
-            for detail in record.details:
-                # Update story points
-                if detail.get('property', '') == 'attr' and \
-                        detail.get('name', '') == 'story_points' and \
-                        detail.get('new_value') is not None:
-                    new_issue.update(customfield_10002=int(detail.get('new_value')))
-                    print("{}: Updated Story Points to {}".format(new_issue.key,
-                                                                  detail.get('new_value')))
-                    break
-            else:
-                continue
-            break
-
-    # Update Live Demo and fetch the PO role, ready status and the reviewed status.
+        # Work Type
+        optional_fields['customfield_11706'] = {'value': settings.yaml_vars['work_type'][redmine_work_type]}
+        # Story Points
+        story_points = get_story_points(redmine_issue)
+        if story_points is not None:
+            optional_fields['customfield_10002'] = story_points
+
+    # Live Demo and fetch the PO role, ready status and the reviewed status.
     is_ready = 'no'
     is_reviewed = 'no'
     po_role = None
     for field in redmine_issue.custom_fields:
         if field.name == 'Live Demo':
-            live_demo = field.value.capitalize()
-            new_issue.update(fields={'customfield_13504': {'value': live_demo}})
-            print("{}: Updated Live Demo to {}".format(new_issue.key, live_demo))
+            optional_fields['customfield_13504'] = {'value': field.value.capitalize()}
         if field.name == 'Is Ready':
             is_ready = field.value.lower()
         if field.name == 'Is Reviewed':
@@ -374,18 +987,58 @@ def create_jira_issue(redmine_issue):
         if field.name == 'PO Role':
             po_role = field.value.lower()
 
-    # Update the Assignee
+    # Assignee
     if po_role:
-        po_user = settings.redmine.user.filter(name=po_role)
-        if po_user:
-            po_username = get_login(po_user[0].id)
-            update_assignee(new_issue, redmine_issue, po_username)
+        po_user_id = settings.user_directory.user_id(po_role)
+        if po_user_id:
+            optional_fields.update(get_assignee_fields(redmine_issue, get_login(po_user_id)))
     else:
-        update_assignee(new_issue, redmine_issue)
+        optional_fields.update(get_assignee_fields(redmine_issue))
+
+    # Jira Epic link, if provided in the command line.
+    if settings.arg_vars.epic:
+        optional_fields['customfield_10005'] = settings.arg_vars.epic
+
+    subtasks = issue_bundle.subtasks if issue_bundle else None
+    return {'issue': redmine_issue, 'issue_type': issue_type, 'relations': issue_relations, 'subtasks': subtasks,
+            'fields': issue_dict, 'optional_fields': optional_fields, 'is_ready': is_ready,
+            'is_reviewed': is_reviewed, 'comments': format_comments(redmine_issue),
+            'subtask_comments': {subtask.id: format_comments(subtask) for subtask in subtasks or []}}
+
+
+def load_jira_issue(redmine_issue, draft):
+    """
+    Creates a Jira issue from a draft, along with its time spent, links, status, attachments, comments and
+    sub-tasks.
+    Parameters:
+        redmine_issue (obj): Redmine issue (Resource object).
+        draft (dict): Draft of the Jira issue, see prepare_jira_issue.
+    Returns:
+        Returns a newly created Jira issue (Resource object).
+    """
+    issue_type = draft['issue_type']
+    try:
+        # Create a Jira issue
+        new_issue = create_issue(draft['fields'], draft['optional_fields'])
+        print("Created a new issue : {}".format(new_issue.key))
+        settings.migration_ledger.record_issue(redmine_issue.id, new_issue.key)
+    except Exception as e:
+        print("Failed to create a Jira issue: {}".format(getattr(e, 'text', e)))
+        # The batch records the failure and goes on with the other issues.
+        raise
+
+    # Update Time Spent
+    if redmine_issue.spent_hours:
+        time_spent = str(redmine_issue.spent_hours) + 'h'
+        settings.jira.add_worklog(new_issue, timeSpent=time_spent)
+        print("{}: Added the time spent to {}".format(new_issue.key, time_spent))
+
+    # Update relations
+    relate_issues(new_issue, redmine_issue, draft['relations'])
 
     # Update Issue status
     # If the issue is reviewed, ready and in New state change the status to 'Ready' in Jira.
-    if redmine_issue.status.name.lower() == 'new' and is_ready == 'yes' and is_reviewed == 'yes':
+    if redmine_issue.status.name.lower() == 'new' and draft['is_ready'] == 'yes' and draft['is_reviewed'] == 'yes':
         update_status(new_issue, 'to do', 'issue')
     else:
         update_status(new_issue, redmine_issue.status.name.lower(), 'issue')
@@ -394,24 +1047,37 @@ def create_jira_issue(redmine_issue):
     add_attachments(redmine_issue, new_issue)
 
     # Add comments.
-    add_comments(redmine_issue, new_issue)
+    add_comments(redmine_issue, new_issue, draft['comments'])
 
     # Add sub-tasks (along with their attachments and comments).
     if issue_type != 'EPIC':
-        add_subtasks(redmine_issue, new_issue)
+        add_subtasks(redmine_issue, new_issue, draft['subtasks'], draft['subtask_comments'])
     else:
         print("Sub-tasks (child backlog items) of the epic stories are not imported. But you can "
               "link the PBI to this epic while importing from Redmine.\n"
               "You just have to use -e {} in the command line.".format(new_issue.key))
 
-    # Update Jira Epic link, if provided in the command line.
-    if settings.arg_vars.epic:
-        new_issue.update(fields={'customfield_10005': settings.arg_vars.epic})
-        print("{}: Updated Epic link to {}".format(new_issue.key, settings.arg_vars.epic))
-
     return new_issue
 
 
+def get_story_points(redmine_issue):
+    """
+    Get the story points of a Redmine issue, from the most recent change in its history.
+    Parameters:
+        redmine_issue (obj): Redmine issue (Resource object).
+    Returns:
+        Story points (int), None if the story points were never set.
+    """
+    records = reversed(list(item for item in redmine_issue.journals if hasattr(item, 'details')))
+    for record in records:
+        for detail in record.details:
+            if detail.get('property', '') == 'attr' and \
+                    detail.get('name', '') == 'story_points' and \
+                    detail.get('new_value') is not None:
+                return int(detail.get('new_value'))
+    return None
+
+
 def get_issue_work_type(redmine_issue):
     """
     Get the issue and work type for the given Redmine issue.
@@ -450,12 +1116,14 @@ def get_issue_work_type(redmine_issue):
     return issue_type, redmine_work_type
 
 
-def update_subject_description(redmine_issue):
+def update_subject_description(redmine_issue, issue_relations=None, checklist_items=None):
     """
     Removes all the tags in the issue subject, add them at the bottom.
     Add Redmine issue relations and a link to the Redmine issue in the description.
     Parameters:
         redmine_issue (obj): Redmine issue (Resource object).
+        issue_relations (list): Relations of the Redmine issue, fetched if not given.
+        checklist_items (list): Checklist items of the Redmine issue, fetched if not given.
     Returns:
         issue_description (str):  Issue description.
         subject (str):  Issue subject.
@@ -466,15 +1134,18 @@ def update_subject_description(redmine_issue):
         if not subject:
             subject = redmine_issue.subject
     tags = redmine_issue.subject.rpartition(']')[0].strip()
-    issue_relations = get_relations(redmine_issue.id)
+    if issue_relations is None:
+        issue_relations = get_relations(redmine_issue.id)
     relation_description = '' if not issue_relations else '\n\n*Redmine issue relations:*\n'
     for relation in issue_relations:
         relation_description += '\n* #{} {} #{}'.format(relation.get('issue_id'),
                                                         relation.get('relation_type'),
                                                         relation.get('issue_to_id'))
 
+    if checklist_items is None:
+        checklist_items = fetch_checklists(redmine_issue.id)
     issue_description = '{} {} {} \n\n*Migrated from Redmine #{}* \n'.format(
-        redmine_issue.description, get_checklists(redmine_issue.id),
+        redmine_issue.description, format_checklists(checklist_items),
         relation_description, redmine_issue.id)
     issue_description = settings.update_formatting(issue_description)
     if tags:
@@ -546,27 +1217,38 @@ def update_redmine_wiki(confluence_page, wiki_page):
     print("{}: Added reference to the Confluence page".format(wiki_page.title))
 
 
-def relate_issues(jira_issue, redmine_issue):
+def relate_issues(jira_issue, redmine_issue, issue_relations=None):
     """
     Read each related Redmine issue to see if it has already been migrated. If so, add the relation
     link, otherwise it ignore the relation as it will be set when the related PBI is migrated.
+    All the related issues are fetched at once.
     Parameters:
         jira_issue (obj): Jira issue (Resource object).
         redmine_issue (obj): Redmine issue (Resource object).
+        issue_relations (list): Relations of the Redmine issue, fetched if not given.
     Returns:
         None.
     """
     try:
-        issue_relations = get_relations(redmine_issue.id)
+        if issue_relations is None:
+            issue_relations = get_relations(redmine_issue.id)
+        related_issue_ids = [relation.get('issue_to_id') if relation.get('issue_id') == redmine_issue.id
+                             else relation.get('issue_id') for relation in issue_relations]
+        # The related issues missing in the migration ledger are fetched at once, they may have been
+        # migrated before the ledger was used.
+        related_jira_ids = settings.migration_ledger.jira_keys(related_issue_ids)
+        related_subjects = get_issue_subjects([related_issue_id for related_issue_id in related_issue_ids
+                                               if related_issue_id not in related_jira_ids])
+        for related_issue_id, related_subject in related_subjects.items():
+            if settings.is_imported(related_subject) and settings.get_jira_key(related_subject):
+                related_jira_ids[related_issue_id] = settings.get_jira_key(related_subject)
+                settings.migration_ledger.record_issue(related_issue_id, related_jira_ids[related_issue_id])
         # Iterate through each relation.
-        for relation in issue_relations:
-            related_issue_id = relation.get('issue_to_id') \
-                if relation.get('issue_id') == redmine_issue.id else relation.get('issue_id')
-            related_issue = settings.redmine.issue.get(related_issue_id)
+        for relation, related_issue_id in zip(issue_relations, related_issue_ids):
+            related_jira_id = related_jira_ids.get(related_issue_id)
             # Check if the related issue is imported in Jira.
-            if settings.is_imported(related_issue.subject) \
+            if related_jira_id \
                     and relation.get('relation_type') in list(settings.yaml_vars['issue_relations'].keys()):
-                related_jira_id = re.search(r"\[JIRA-([A-Za-z0-9-]+)\]", related_issue.subject).group(1)
                 link_type = settings.yaml_vars['issue_relations'].get(relation.get('relation_type'))
                 if relation.get('issue_id') == redmine_issue.id:
                     inward_issue, outward_issue = jira_issue.key, related_jira_id
@@ -584,6 +1266,18 @@ def relate_issues(jira_issue, redmine_issue):
         print('{}: Could not relate issues : {}'.format(jira_issue.key, e))
 
 
+def get_reporter_fields(author_id):
+    """
+    Get the Jira fields for the reporter of an issue.
+    Parameters:
+        author_id (int): Redmine User ID of the author.
+    Returns:
+        A dictionary with the Jira fields, empty if the author login is not found.
+    """
+    author_username = get_login(author_id)
+    return {'reporter': {'name': author_username}} if author_username else {}
+
+
 def update_reporter(author_id, jira_issue):
     """
     Updates the reporter of the Jira issue.
@@ -593,13 +1287,45 @@ def update_reporter(author_id, jira_issue):
     Returns:
         None.
     """
-    try:
-        author_username = get_login(author_id)
-        if author_username:
-            jira_issue.update(reporter={'name': author_username})
-            print("{}: Updated the reporter to {}".format(jira_issue.key, author_username))
-    except Exception as e:
-        print('{}: Could not update the reporter : {}'.format(jira_issue.key, e.text))
+    update_fields(jira_issue, get_reporter_fields(author_id))
+
+
+def get_assignee_fields(redmine_issue, po_username=None):
+    """
+    Get the Jira fields for the assignee (and the team) of an issue.
+    Parameters:
+        redmine_issue (obj): Redmine issue (Resource object).
+        po_username (str): PO username.
+    Returns:
+        A dictionary with the Jira fields.
+    """
+    fields = dict()
+    # Check if the assigned_to field exists.
+    if hasattr(redmine_issue, 'assigned_to'):
+        # Check if the assignee is a team or a PO.
+        if redmine_issue.assigned_to.name in list(settings.yaml_vars['teams'].keys()):
+            assigned_team = settings.yaml_vars['teams'][redmine_issue.assigned_to.name]
+            fields['customfield_12802'] = [{'value': assigned_team}]
+        if redmine_issue.assigned_to.name in list(settings.yaml_vars['assignee'].keys()):
+            # Assign it to the PO of the team.
+            assigned_po = settings.yaml_vars['assignee'][redmine_issue.assigned_to.name]
+            po_user_id = settings.user_directory.user_id(assigned_po)
+            if po_user_id:
+                po_userlogin = get_login(po_user_id)
+                if po_userlogin:
+                    fields['assignee'] = {'name': po_userlogin}
+                else:
+                    print("Assignee login for {} does not exists.".format(redmine_issue.assigned_to.name))
+        elif not po_username:
+            # Assign it to the individual team member.
+            author_username = get_login(redmine_issue.assigned_to.id)
+            if author_username:
+                fields['assignee'] = {'name': author_username}
+            else:
+                print("Assignee login for {} does not exists.".format(redmine_issue.assigned_to.name))
+    if po_username:
+        fields['assignee'] = {'name': po_username}
+    return fields
 
 
 def update_assignee(jira_issue, redmine_issue, po_username=None):
@@ -612,117 +1338,282 @@ def update_assignee(jira_issue, redmine_issue, po_username=None):
     Returns:
         None.
     """
+    update_fields(jira_issue, get_assignee_fields(redmine_issue, po_username))
+
+
+def update_fields(jira_issue, fields):
+    """
+    Updates the given fields of the Jira issue with a single request. If Jira rejects the update,
+    the fields are updated one by one, so that an invalid value does not discard the others.
+    Parameters:
+        jira_issue (obj): Jira issue (Resource object).
+        fields (dict): Jira fields.
+    Returns:
+        None.
+    """
+    if not fields:
+        return
     try:
-        # Check if the assigned_to field exists.
-        if hasattr(redmine_issue, 'assigned_to'):
-            # Check if the assignee is a team or a PO.
-            if redmine_issue.assigned_to.name in list(settings.yaml_vars['teams'].keys()):
-                assigned_team = settings.yaml_vars['teams'][redmine_issue.assigned_to.name]
-                jira_issue.update(fields={'customfield_12802': [{'value': assigned_team}]})
-                print("{}: Updated Team to {}".format(jira_issue.key, assigned_team))
-            if redmine_issue.assigned_to.name in list(settings.yaml_vars['assignee'].keys()):
-                # Assign it to the PO of the team.
-                assigned_po = settings.yaml_vars['assignee'][redmine_issue.assigned_to.name]
-                po_user = settings.redmine.user.filter(name=assigned_po)
-                if po_user:
-                    po_userlogin = get_login(po_user[0].id)
-                    if po_userlogin:
-                        jira_issue.update(assignee={'name': po_userlogin})
-                        print("{}: Updated the assignee to {}".format(jira_issue.key, po_userlogin))
-                    else:
-                        print(
-                            "Assignee login for {} does not exists.".format(redmine_issue.assigned_to.name))
-            elif not po_username:
-                # Assign it to the individual team member.
-                author_username = get_login(redmine_issue.assigned_to.id)
-                if author_username:
-                    jira_issue.update(assignee={'name': author_username})
-                    print("{}: Updated the assignee to {}".format(jira_issue.key, author_username))
-                else:
-                    print("Assignee login for {} does not exists.".format(redmine_issue.assigned_to.name))
-        if po_username:
-            jira_issue.update(assignee={'name': po_username})
-            print("{}: Updated the assignee to {}".format(jira_issue.key, po_username))
-    except Exception as e:
-        print('{}: Could not update the assignee : {}'.format(jira_issue.key, e.text))
+        jira_issue.update(fields=fields)
+        print_fields(jira_issue, fields)
+    except Exception:
+        for name, value in fields.items():
+            try:
+                jira_issue.update(fields={name: value})
+                print_fields(jira_issue, {name: value})
+            except Exception as e:
+                print('{}: Could not update the {} : {}'.format(jira_issue.key, FIELD_LABELS.get(name, name),
+                                                                getattr(e, 'text', e)))
+
+
+def print_fields(jira_issue, fields):
+    """
+    Prints the fields set on a Jira issue.
+    """
+    for name, value in fields.items():
+        if isinstance(value, list):
+            value = value[0] if value else ''
+        if isinstance(value, dict):
+            value = value.get('name', value.get('value'))
+        print("{}: Updated {} to {}".format(jira_issue.key, FIELD_LABELS.get(name, name), value))
+
+
+def get_creatable_fields(issue_type_name):
+    """
+    Get the fields which can be set while creating a Jira issue of the given type (create screen),
+    the create metadata is fetched once per issue type.
+    Parameters:
+        issue_type_name (str): Jira issue type.
+    Returns:
+        A set of field IDs, None if the create metadata is not available.
+    """
+    with _createmeta_lock:
+        if issue_type_name not in _creatable_fields:
+            try:
+                createmeta = settings.jira.createmeta(projectKeys=settings.yaml_vars['jira_project'],
+                                                      issuetypeNames=issue_type_name,
+                                                      expand='projects.issuetypes.fields')
+                issue_types = createmeta['projects'][0]['issuetypes']
+                _creatable_fields[issue_type_name] = set(issue_types[0]['fields']) if issue_types else None
+            except Exception as e:
+                print("Could not fetch the create metadata of {}: {}".format(issue_type_name, e))
+                _creatable_fields[issue_type_name] = None
+        return _creatable_fields[issue_type_name]
+
+
+def create_issue(fields, optional_fields):
+    """
+    Creates a Jira issue. The optional fields are sent along with the creation when the create
+    screen allows it, the others (and the ones rejected by Jira) are set with a single update afterwards.
+    Parameters:
+        fields (dict): Jira fields required to create the issue.
+        optional_fields (dict): Jira fields which can be set after the creation.
+    Returns:
+        Returns a newly created Jira issue (Resource object).
+    """
+    creatable = get_creatable_fields(fields['issuetype']['name'])
+    deferred = {name: value for name, value in optional_fields.items()
+                if creatable is not None and name not in creatable}
+    create_fields = dict(fields)
+    create_fields.update({name: value for name, value in optional_fields.items() if name not in deferred})
+    try:
+        new_issue = settings.jira.create_issue(fields=create_fields, prefetch=False)
+    except JIRAError as e:
+        try:
+            rejected = set(e.response.json().get('errors', {})) & set(optional_fields)
+        except Exception:
+            rejected = set()
+        if not rejected:
+            raise
+        deferred.update({name: optional_fields[name] for name in rejected})
+        new_issue = settings.jira.create_issue(fields={name: value for name, value in create_fields.items()
+                                                       if name not in rejected}, prefetch=False)
+    print_fields(new_issue, {name: value for name, value in optional_fields.items() if name not in deferred})
+    update_fields(new_issue, deferred)
+    return new_issue
 
 
 def add_attachments(source, destination):
     """
     Get all the attachments from a given Redmine issue and add them them to the Jira issue.
+    Attachments are transferred in parallel, without intermediate files. The transferred attachments
+    are recorded in the migration ledger and skipped when the transfer is resumed.
     Parameters:
         source (obj): Redmine issue (Resource object).
         destination (obj): Jira issue (Resource object).
     Returns:
-        None.
+        List of the attachments which could not be transferred.
     """
+    destination_name = destination['title'] if settings.arg_vars.wiki else destination.key
+    destination_id = 'confluence:{}'.format(destination['id']) if settings.arg_vars.wiki \
+        else 'jira:{}'.format(destination.key)
+
+    def upload(item, content):
+        if not settings.arg_vars.wiki:
+            settings.jira.add_attachment(issue=destination, attachment=content, filename=item.filename)
+            print("{}: Added attachment: {}".format(destination.key, item.filename))
+        else:
+            upload_confluence_attachment(destination, item.filename, content,
+                                         getattr(item, 'content_type', None))
+            print("{}: Added attachment: {}".format(source.title, item.filename))
+        settings.migration_ledger.record_attachment(destination_id, item.id)
+
+    failed = []
     try:
-        for item in source.attachments:
-            attachment = settings.redmine.attachment.get(item.id)
-            file_path = attachment.download(savepath='.', filename=item.filename)
-            if settings.arg_vars.pbi:
-                settings.jira.add_attachment(issue=destination, attachment=file_path, filename=item.filename)
-                print("{}: Added attachment: {}".format(destination.key, item.filename))
-            elif settings.arg_vars.wiki:
-                status = settings.confluence.attach_file(filename=file_path,
-                                                         name=item.filename,
-                                                         page_id=destination['id'],
-                                                         title=destination['title'],
-                                                         space=settings.yaml_vars['confluence_space'])
-                if status is None:
-                    print("{}: Failed to add attachment: {}".format(source.title, item.filename))
-                elif not is_migration_successful(status):
-                    raise settings.ConfluenceImportError(status['statusCode'], status['message'],
-                                                         status['reason'])
-                else:
-                    print("{}: Added attachment: {}".format(source.title, item.filename))
-            os.remove(file_path)
-    except settings.ConfluenceImportError as error:
-        print('Failed to add an attachmentConfluenceImportError to a confluence page: {}'.
-              format(error))
+        transferred = settings.migration_ledger.transferred_attachments(destination_id)
+        pending = [item for item in source.attachments if item.id not in transferred]
+        for item, error in attachments.transfer(settings.redmine.engine.session, pending, upload,
+                                                transport.timeout):
+            if isinstance(error, settings.ConfluenceImportError):
+                print('Failed to add an attachment {} to a confluence page: {}'.format(item.filename, error))
+            elif error is not None:
+                print('{}: Could not add attachment {}: {}'.format(destination_name, item.filename, error))
+            if error is not None:
+                failed.append(item)
     except Exception as e:
-        if settings.arg_vars.pbi:
-            print('{}: Could not add attachment: {}', destination.key, e)
-        elif settings.arg_vars.wiki:
-            print('{}: Could not add attachment: {}', destination, e)
+        print('{}: Could not add attachments: {}'.format(destination_name, e))
+        failed.append(None)
+    return failed
+
+
+def get_confluence_page_reference(page_id, title):
+    """
+    Returns a reference to a Confluence page recorded in the migration ledger, in the form of the pages
+    returned by Confluence (ID, title and links).
+    Parameters:
+        page_id (str): ID of the Confluence page.
+        title (str): Title of the Redmine Wiki page.
+    Returns:
+        Confluence page (dict).
+    """
+    return {'id': page_id, 'title': title.replace('_', ' '),
+            '_links': {'base': settings.confluence.url.rstrip('/'),
+                       'webui': '/pages/viewpage.action?pageId={}'.format(page_id)}}
+
+
+def upload_confluence_attachment(confluence_page, filename, content, content_type=None):
+    """
+    Uploads an attachment to a Confluence page, the content is streamed from the given file-like object.
+    If the page already has an attachment with the same name (e.g. uploaded by a run interrupted before
+    it was recorded), a new version of that attachment is uploaded instead.
+    Parameters:
+        confluence_page (dict): Confluence page.
+        filename (str): Name of the attachment.
+        content (obj): File-like object with the content of the attachment.
+        content_type (str): MIME type of the attachment.
+    Returns:
+        None.
+    """
+    url = '{}/rest/api/content/{}/child/attachment'.format(settings.confluence.url.rstrip('/'),
+                                                         confluence_page['id'])
+    response = post_confluence_attachment(url, filename, content, content_type)
+    if response.status_code == 400:
+        # Confluence rejects a new attachment with the name of an existing one.
+        attachment_id = find_confluence_attachment(url, filename)
+        if attachment_id is not None:
+            content.seek(0)
+            response = post_confluence_attachment('{}/{}/data'.format(url, attachment_id), filename, content,
+                                                  content_type)
+    if not response.ok:
+        try:
+            message = response.json().get('message')
+        except ValueError:
+            message = response.text
+        raise settings.ConfluenceImportError(response.status_code, message, response.reason)
+
+
+def post_confluence_attachment(url, filename, content, content_type=None):
+    """
+    Posts the content of an attachment to Confluence as a multipart form, streamed from the file-like object.
+    Returns:
+        The response (requests.Response object).
+    """
+    encoder = MultipartEncoder(fields={'file': (filename, content, content_type or 'application/octet-stream')})
+    return settings.confluence._session.post(url, data=encoder, timeout=transport.timeout,
+                                             headers={'Content-Type': encoder.content_type,
+                                                      'X-Atlassian-Token': 'nocheck'})
+
+
+def find_confluence_attachment(url, filename):
+    """
+    Searches an attachment of a Confluence page by name.
+    Parameters:
+        url (str): URL of the attachments of the page.
+        filename (str): Name of the attachment.
+    Returns:
+        ID of the attachment, if found. Otherwise None will be returned.
+    """
+    response = settings.confluence._session.get(url, params={'filename': filename}, timeout=transport.timeout)
+    if not response.ok:
+        return None
+    results = response.json().get('results') or []
+    return results[0]['id'] if results else None
 
 
-def add_comments(source, destination):
+def format_comments(source):
+    """
+    Formats the notes of a given Redmine issue up front, before any comment is posted.
+    Parameters:
+        source (obj): Redmine issue (Resource object).
+    Returns:
+        A list with a (journal, formatted note, error) tuple for each note, in chronological order.
+    """
+    formatted = []
+    for record in source.journals:
+        if not hasattr(record, 'notes') or not record.notes.strip():
+            continue
+        try:
+            formatted.append((record, settings.update_formatting(record.notes), None))
+        except Exception as e:
+            formatted.append((record, None, e))
+    return formatted
+
+
+def add_comments(source, destination, comments=None):
     """
     Get all the comments from a given Redmine issue and add them them to the Jira issue.
     As the author of the comment cannot be modified, the author name is added in the comment
     description.
+    The notes are formatted up front, the comments are posted one after the other so that they keep
+    the chronological order of the Redmine issue (the creation date of a comment is set by the server).
     Parameters:
         source (obj): Redmine issue (Resource object).
         destination (obj): Jira issue (Resource object).
+        comments (list): Formatted notes of the Redmine issue (see format_comments), formatted if not given.
     Returns:
         None.
     """
-    for record in source.journals:
-        if hasattr(record, 'notes') and record.notes.strip():
-            comment_author = record.user.name
-            comment = settings.update_formatting(record.notes)
-            if comment.strip():
-                comment_description = "Commented by: {}\n{}".format(comment_author, comment)
-                if settings.arg_vars.pbi:
-                    settings.jira.add_comment(destination, comment_description)
-                    print("{}: Added Comment: {}...".format(destination.key, record.notes[:15]))
-                elif settings.arg_vars.wiki:
-                    settings.confluence.add_comment(destination['id'], comment_description)
-                    print("{}: Added Comment: {}...".format(destination['id'], record.notes[:15]))
+    formatted = comments if comments is not None else format_comments(source)
+    for record, comment, error in formatted:
+        if error is not None:
+            print("Failed to format the comment {}...: {}".format(record.notes[:15], error))
+            continue
+        if comment.strip():
+            comment_description = "Commented by: {}\n{}".format(record.user.name, comment)
+            if not settings.arg_vars.wiki:
+                settings.jira.add_comment(destination, comment_description)
+                print("{}: Added Comment: {}...".format(destination.key, record.notes[:15]))
+            elif settings.arg_vars.wiki:
+                settings.confluence.add_comment(destination['id'], comment_description)
+                print("{}: Added Comment: {}...".format(destination['id'], record.notes[:15]))
 
 
-def add_subtasks(redmine_issue, jira_issue):
+def add_subtasks(redmine_issue, jira_issue, subtasks=None, comments=None):
     """
     Get all the sub-tasks from a given Redmine issue and add them them to the Jira issue.
+    Sub-tasks are fetched from Redmine at once and created in Jira in bulk, a sub-task which cannot
+    be created does not stop the others.
     Parameters:
         redmine_issue (obj): Redmine issue (Resource object).
         jira_issue (obj): Jira issue (Resource object).
+        subtasks (list): Sub-tasks of the Redmine issue (Resource objects), fetched if not given.
+        comments (dict): Formatted notes of the sub-tasks per Redmine ID (see format_comments), formatted if
+            not given.
     Returns:
         None.
     """
-    for child in redmine_issue.children:
-        subtask = settings.redmine.issue.get(child.id)
+    entries = []
+    for subtask in (subtasks if subtasks is not None else get_subtasks(redmine_issue.id)):
         subtask_dict = {
             'project': {'key': settings.yaml_vars['jira_project']},
             'summary': subtask.subject,
@@ -736,12 +1627,218 @@ def add_subtasks(redmine_issue, jira_issue):
             if subtask.assigned_to.name in list(settings.yaml_vars['teams'].keys()):
                 assigned_team = settings.yaml_vars['teams'][subtask.assigned_to.name]
                 subtask_dict['customfield_12802'] = [{'value': assigned_team}]
+        entries.append((subtask, subtask_dict, get_assignee_fields(subtask)))
 
-        child = settings.jira.create_issue(fields=subtask_dict)
-        print("{}: Created sub-task {} ".format(jira_issue.key, child.key))
-        update_assignee(child, subtask)
-        update_status(child, subtask.status.name.lower(), 'subtask')
-        add_comments(subtask, child)
-        add_attachments(subtask, child)
+    for index in range(0, len(entries), SUBTASKS_PAGE_SIZE):
+        for subtask, child, error in create_subtasks(entries[index:index + SUBTASKS_PAGE_SIZE]):
+            if error is not None:
+                print("{}: Failed to create the sub-task for #{}: {}".format(jira_issue.key, subtask.id, error))
+                continue
+            print("{}: Created sub-task {} ".format(jira_issue.key, child.key))
+            settings.migration_ledger.record_issue(subtask.id, child.key)
+            update_status(child, subtask.status.name.lower(), 'subtask')
+            add_comments(subtask, child, comments.get(subtask.id) if comments else None)
+            add_attachments(subtask, child)
 
 
+def get_subtasks(issue_id):
+    """
+    Retrieves the sub-tasks (child issues) of a Redmine issue, with one request per hundred sub-tasks.
+    Parameters:
+        issue_id (int): Issue ID in Redmine.
+    Returns:
+        Returns a list of Redmine issues (Resource objects).
+    """
+    if settings.redmine_snapshot is not None:
+        children = settings.redmine_snapshot.issue(issue_id).get('children') or []
+        return [fetch_issue(child_id) for child_id in sorted(child['id'] for child in children)]
+    subtasks = []
+    offset = 0
+    while True:
+        issues = list(settings.redmine.issue.filter(parent_id=issue_id, status_id='*', sort='id',
+                                                    offset=offset, limit=ISSUES_PAGE_SIZE))
+        subtasks.extend(issues)
+        if len(issues) < ISSUES_PAGE_SIZE:
+            return subtasks
+        offset += ISSUES_PAGE_SIZE
+
+
+def create_subtasks(entries):
+    """
+    Creates Jira sub-tasks with a single bulk request. The optional fields are sent along with the
+    creation when the create screen allows it, otherwise they are set afterwards. A sub-task rejected
+    because of an optional field is created again on its own, without that field.
+    Parameters:
+        entries (list): (Redmine issue, Jira fields, optional Jira fields) of each sub-task.
+    Returns:
+        A list of (Redmine issue, Jira issue, error) of each sub-task, error is None if successful.
+    """
+    creatable = get_creatable_fields('Sub-task')
+    field_list = []
+    for _, fields, optional_fields in entries:
+        create_fields = dict(fields)
+        create_fields.update({name: value for name, value in optional_fields.items()
+                              if creatable is None or name in creatable})
+        field_list.append(create_fields)
+    try:
+        results = settings.jira.create_issues(field_list=field_list, prefetch=False)
+    except JIRAError as e:
+        results = [{'status': 'Error', 'error': getattr(e, 'text', e), 'issue': None} for _ in field_list]
+
+    created = []
+    for (subtask, fields, optional_fields), create_fields, result in zip(entries, field_list, results):
+        if result['status'] == 'Success':
+            child = result['issue']
+            update_fields(child, {name: value for name, value in optional_fields.items()
+                                  if name not in create_fields})
+            created.append((subtask, child, None))
+        elif not isinstance(result['error'], dict) or set(result['error']) & set(optional_fields):
+            try:
+                created.append((subtask, create_issue(fields, optional_fields), None))
+            except Exception as e:
+                created.append((subtask, None, getattr(e, 'text', e)))
+        else:
+            created.append((subtask, None, result['error']))
+    return created
+
+
+def export_snapshot(path):
+    """
+    Exports the Redmine issues or Wiki pages selected in the command line to an offline snapshot, along with
+    the users, the checklists and sub-tasks of the issues, the Wiki index and the attachments. The migration
+    can then be run from the snapshot (--snapshot) without contacting Redmine.
+    Parameters:
+        path (str): Directory of the snapshot.
+    Returns:
+        A dictionary with the number of exported records per type.
+    """
+    writer = snapshot.SnapshotWriter(path)
+    # The attachments are downloaded once, to the content addressed store of the snapshot.
+    attachments.cache = snapshot.attachment_store(path)
+    manifest = {'project': settings.yaml_vars['redmine_wiki_project'],
+                'project_id': settings.yaml_vars['redmine_project_id'],
+                'redmine_server': settings.yaml_vars['redmine_server']}
+    user_ids = set()
+    try:
+        for user in get_users():
+            writer.write('users', user)
+            user_ids.add(user['id'])
+    except Exception as e:
+        print("Could not list the Redmine users, only the reporters and assignees are exported: {}".format(e))
+    if settings.arg_vars.wiki:
+        manifest['wiki_pages'] = export_wiki_pages(writer)
+    else:
+        manifest['query'] = settings.arg_vars.query
+        manifest['issues'] = export_issues(writer, user_ids)
+    writer.close(manifest)
+    print("Exported to the snapshot {}: {}".format(path, ', '.join(
+        '{} {}'.format(count, record_type) for record_type, count in sorted(writer.counts.items()))))
+    return writer.counts
+
+
+def export_issues(writer, user_ids):
+    """
+    Exports the selected Redmine issues, along with their checklists, sub-tasks and attachments, the subjects
+    of their related issues and the users they refer to. The issues are read in parallel.
+    Parameters:
+        writer (obj): SnapshotWriter object.
+        user_ids (set): IDs of the users already exported.
+    Returns:
+        List of the IDs of the exported issues, in the order of the selection.
+    """
+    def export_issue(redmine_issue):
+        issue_bundle = settings.issue_prefetcher.bundle(redmine_issue.id,
+                                                        redmine_issue if is_fetched(redmine_issue) else None)
+        writer.write('issues', {'issue': issue_bundle.issue.raw(), 'checklists': issue_bundle.checklists})
+        for subtask in issue_bundle.subtasks:
+            writer.write('issues', {'issue': subtask.raw(), 'checklists': None})
+        for item in export_attachments([issue_bundle.issue] + issue_bundle.subtasks):
+            print("#{}: Could not export the attachment {}".format(redmine_issue.id, item.filename))
+        return issue_bundle
+
+    exported = []
+    related_issue_ids = set()
+    referred_user_ids = set()
+    for redmine_issue, issue_bundle, error in workers.map_ordered(export_issue, get_issues(),
+                                                                  settings.arg_vars.threads):
+        if error is not None:
+            print("Failed while exporting the Redmine issue {}: {}".format(redmine_issue.id, error))
+            continue
+        print("#{}: Exported with {} sub-tasks".format(redmine_issue.id, len(issue_bundle.subtasks)))
+        exported.append(redmine_issue.id)
+        for relation in issue_bundle.relations:
+            related_issue_ids.update([relation.get('issue_id'), relation.get('issue_to_id')])
+        for raw in [issue_bundle.issue.raw()] + [subtask.raw() for subtask in issue_bundle.subtasks]:
+            referred_user_ids.update(raw[name]['id'] for name in ('author', 'assigned_to') if name in raw)
+
+    # The subjects of the related issues tell whether they are already migrated.
+    exported_ids = set(exported)
+    for issue_id, subject in get_issue_subjects([issue_id for issue_id in related_issue_ids
+                                                 if issue_id and issue_id not in exported_ids]).items():
+        writer.write('subjects', {'id': issue_id, 'subject': subject})
+    # Users which could not be listed (e.g. without administrator rights) are read one by one.
+    for _, user, error in workers.run_concurrently(get_user, referred_user_ids - user_ids, settings.arg_vars.threads):
+        if error is None and user is not None:
+            writer.write('users', user)
+    return exported
+
+
+def export_wiki_pages(writer):
+    """
+    Exports the Wiki index and the selected Redmine Wiki pages (a page, a section with -m or the whole Wiki
+    with -a), along with their parent page, original author and attachments. The pages are read in parallel.
+    Parameters:
+        writer (obj): SnapshotWriter object.
+    Returns:
+        List of the titles of the exported pages.
+    """
+    pages_info = get_pages_info()
+    for page in pages_info:
+        writer.write('wiki_index', page)
+    tree = wiki_tree.WikiTree(pages_info)
+    if settings.arg_vars.all:
+        titles = [node.title for node in tree.walk()]
+    elif settings.arg_vars.multiple and settings.arg_vars.wiki in tree:
+        titles = tree.subtree(settings.arg_vars.wiki)
+    else:
+        titles = [settings.arg_vars.wiki]
+    # The parent page is read while creating a page, unless the parent is already migrated.
+    titles += [tree.node(title).parent.title for title in titles
+               if tree.node(title) is not None and tree.node(title).parent is not None
+               and tree.node(title).parent.title not in titles]
+    titles = list(collections.OrderedDict.fromkeys(titles))
+
+    def export_wiki_page(title):
+        wiki_page = settings.redmine.wiki_page.get(title, project_id=settings.yaml_vars['redmine_project_id'],
+                                                   include=['attachments'])
+        record = {'page': wiki_page.raw()}
+        if getattr(wiki_page, 'version', 0) > 1:
+            record['original_author'] = read_original_author(wiki_page.title)
+        writer.write('wiki_pages', record)
+        for item in export_attachments([wiki_page]):
+            print("{}: Could not export the attachment {}".format(title, item.filename))
+        return wiki_page.title
+
+    exported = []
+    for title, exported_title, error in workers.run_concurrently(export_wiki_page, titles,
+                                                                 settings.arg_vars.threads):
+        if error is not None:
+            print("Failed while exporting the Redmine Wiki - {} : {}".format(title, error))
+        else:
+            exported.append(exported_title)
+    return exported
+
+
+def export_attachments(sources):
+    """
+    Downloads the attachments of Redmine issues/pages to the attachment store of the snapshot, in parallel.
+    Attachments already in the store are not downloaded again.
+    Parameters:
+        sources (list): Redmine issues/pages (Resource objects), read along with their attachments.
+    Returns:
+        List of the attachments which could not be downloaded.
+    """
+    items = [item for source in sources for item in source.attachments]
+    return [item for item, error in attachments.transfer(settings.redmine.engine.session, items,
+                                                         lambda item, content: None, transport.timeout)
+            if error is not None]
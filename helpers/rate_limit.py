@@ -0,0 +1,156 @@
+import collections
+import email.utils
+import threading
+import time
+
+# Statuses of the requests rejected by a busy or rate limited server, the requests are sent again once the
+# server is ready.
+THROTTLE_STATUSES = (429, 503)
+# Number of times a throttled request is sent again before giving up.
+THROTTLE_RETRIES = 5
+# Backoff (in seconds) when the server does not send a Retry-After header, doubled on each retry.
+THROTTLE_BACKOFF = 1.0
+MAX_BACKOFF = 120.0
+# Window (in seconds) of the measured request rate.
+RATE_WINDOW = 10.0
+
+_lock = threading.Lock()
+_hosts = dict()
+
+
+class HostLimiter(object):
+    """
+    Adaptive limit of the concurrent requests to a server (AIMD).
+    The limit is halved, and the server is left alone for the Retry-After delay, when a request is throttled
+    (429/503). It grows back by one request per round trip of healthy responses, up to the size of the
+    connection pools.
+    """
+
+    def __init__(self, host, max_concurrency):
+        """
+        Parameters:
+            host (str): Host (and port) of the server.
+            max_concurrency (int): Maximum number of concurrent requests.
+        """
+        self.host = host
+        self.max_concurrency = max(max_concurrency, 1)
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.backoff_seconds = 0.0
+        self.min_limit = self.limit
+        self._responses = collections.deque()
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Waits until a request can be sent to the server.
+        """
+        with self._condition:
+            while True:
+                now = time.time()
+                if now < self.blocked_until:
+                    self._condition.wait(self.blocked_until - now)
+                elif self.in_flight >= int(self.limit):
+                    self._condition.wait()
+                else:
+                    self.in_flight += 1
+                    return
+
+    def release(self, status, retry_after=None, attempt=0):
+        """
+        Records the response of a request sent to the server.
+        Parameters:
+            status (int): HTTP status of the response, None on connection errors.
+            retry_after (float): Delay (in seconds) requested by the server, if any.
+            attempt (int): Number of times the request was already throttled.
+        Returns:
+            The delay (in seconds) before sending a throttled request again, None if the request is not throttled.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            now = time.time()
+            self.requests += 1
+            self._responses.append(now)
+            while self._responses and self._responses[0] < now - RATE_WINDOW:
+                self._responses.popleft()
+            delay = None
+            if status in THROTTLE_STATUSES:
+                self.throttled += 1
+                # The requests in flight when the server starts throttling reduce the limit only once.
+                if now >= self.blocked_until:
+                    self.limit = max(1.0, self.limit / 2)
+                    self.min_limit = min(self.min_limit, self.limit)
+                delay = retry_after if retry_after is not None else THROTTLE_BACKOFF * 2 ** attempt
+                delay = min(delay, MAX_BACKOFF)
+                if now + delay > self.blocked_until:
+                    self.backoff_seconds += now + delay - max(self.blocked_until, now)
+                    self.blocked_until = now + delay
+            elif status is not None:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+            return delay
+
+    def rate(self):
+        """
+        Returns the number of responses per second over the last seconds.
+        """
+        with self._condition:
+            now = time.time()
+            recent = [timestamp for timestamp in self._responses if timestamp >= now - RATE_WINDOW]
+            if not recent:
+                return 0.0
+            return len(recent) / max(min(RATE_WINDOW, now - recent[0]), 1.0)
+
+    def stats(self):
+        """
+        Returns a dictionary with the current limit, rate and the backoff statistics of the server.
+        """
+        rate = self.rate()
+        with self._condition:
+            return {'host': self.host, 'requests': self.requests, 'throttled': self.throttled,
+                    'backoff_seconds': self.backoff_seconds, 'limit': int(self.limit),
+                    'min_limit': int(self.min_limit), 'max_limit': self.max_concurrency,
+                    'in_flight': self.in_flight, 'rate': rate}
+
+
+def limiter(host, max_concurrency):
+    """
+    Returns the limiter of a server, shared by all the sessions sending requests to it.
+    Parameters:
+        host (str): Host (and port) of the server.
+        max_concurrency (int): Maximum number of concurrent requests, used when the limiter is created.
+    Returns:
+        HostLimiter object.
+    """
+    with _lock:
+        if host not in _hosts:
+            _hosts[host] = HostLimiter(host, max_concurrency)
+        return _hosts[host]
+
+
+def parse_retry_after(value):
+    """
+    Returns the delay (in seconds) of a Retry-After header, given in seconds or as an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def stats():
+    """
+    Returns the statistics of the servers (see HostLimiter.stats).
+    """
+    with _lock:
+        limiters = list(_hosts.values())
+    return [host_limiter.stats() for host_limiter in limiters]
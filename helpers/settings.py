@@ -3,6 +3,11 @@ from jira import JIRA
 from redminelib import Redmine
 import argparse
 import base64
+import helpers.attachments as attachments
+import helpers.markup as markup
+import helpers.snapshot as snapshot
+import helpers.tracing as tracing
+import helpers.transport as transport
 import json
 import os
 import re
@@ -32,7 +37,8 @@ def init():
     Returns:
         None.
     """
-    global yaml_vars, arg_vars, redmine, jira, confluence, wiki_pages_rel, wiki_pages_imported, current_page
+    global yaml_vars, arg_vars, redmine, jira, confluence, wiki_tree, wiki_pages_imported, link_index, \
+        user_directory, migration_ledger, macro_registry, issue_prefetcher, redmine_snapshot
     dir_path = os.path.dirname(os.path.realpath(__file__))
     arg_vars = get_args()
 
@@ -52,20 +58,49 @@ def init():
         yaml_vars['jira_project'] = arg_vars.jiraproject
     if arg_vars.confluencespace:
         yaml_vars['confluence_space'] = arg_vars.confluencespace
+    # Record the requests sent to the servers, if requested.
+    tracing.init(arg_vars.trace or yaml_vars.get('trace_file'))
+    tracing.register_server('redmine', yaml_vars['redmine_server'])
+    tracing.register_server('jira', yaml_vars['jira_server'])
+    tracing.register_server('confluence', yaml_vars['confluence_server'])
+    # Size the connection pools for the number of workers.
+    transport.init(arg_vars.threads, yaml_vars.get('http_timeout'))
+    attachments.init(yaml_vars.get('attachment_workers'),
+                     yaml_vars['attachment_budget_mb'] * 1024 * 1024 if yaml_vars.get('attachment_budget_mb') else None,
+                     yaml_vars.get('attachment_cache_dir'),
+                     yaml_vars['attachment_cache_mb'] * 1024 * 1024 if yaml_vars.get('attachment_cache_mb') else None)
     # Initialize the redmine instance.
     redmine = Redmine(yaml_vars['redmine_server'], key=yaml_vars['redmine_apikey'],
-                      requests={'timeout': 10})
-    redmine_project = redmine.project.get(yaml_vars['redmine_wiki_project'])
-    yaml_vars['redmine_project_id'] = redmine_project.id
+                      engine=transport.RedmineEngine, requests={'timeout': transport.timeout})
+    redmine_snapshot = None
+    if arg_vars.snapshot:
+        # Read the Redmine project from an offline snapshot, Redmine is not contacted.
+        redmine_snapshot = snapshot.Snapshot(arg_vars.snapshot)
+        if redmine_snapshot.manifest['project'] != yaml_vars['redmine_wiki_project']:
+            print("The snapshot {} is a snapshot of the Redmine project {}".format(
+                arg_vars.snapshot, redmine_snapshot.manifest['project']))
+        yaml_vars['redmine_project_id'] = redmine_snapshot.manifest['project_id']
+        # The attachments are read from the snapshot as well.
+        attachments.cache = snapshot.attachment_store(arg_vars.snapshot, read_only=True)
+    else:
+        redmine_project = redmine.project.get(yaml_vars['redmine_wiki_project'])
+        yaml_vars['redmine_project_id'] = redmine_project.id
+    if arg_vars.export_snapshot:
+        # Only Redmine is read while exporting a snapshot.
+        return
     # Suppress the InsecureRequestWarnings.
     urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
     # Initialize the jira instance.
     jira = JIRA({'server': yaml_vars['jira_server'], 'verify': False},
                 basic_auth=(yaml_vars['jira_user'],
-                            base64.b64decode(yaml_vars['jira_password']).decode("utf-8")))
+                            base64.b64decode(yaml_vars['jira_password']).decode("utf-8")),
+                timeout=transport.timeout)
+    transport.configure_session(jira._session)
     confluence = Confluence(url=yaml_vars['confluence_server'],
                             username=yaml_vars['confluence_user'],
-                            password=base64.b64decode(yaml_vars['confluence_password']).decode("utf-8"))
+                            password=base64.b64decode(yaml_vars['confluence_password']).decode("utf-8"),
+                            timeout=transport.timeout)
+    transport.configure_session(confluence._session)
 
 
 def get_config_data(file_path):
@@ -90,14 +125,22 @@ def get_args():
     """
     parser = argparse.ArgumentParser(description='Process arguments for exporting issue/Wiki to Jira/Confluence')
     required_named = parser.add_mutually_exclusive_group(required=True)
-    required_named.add_argument('-i', '--pbi', action='store',
-                                help='Remine PBI number to migrate to the Jira')
+    required_named.add_argument('-i', '--pbi', action='store', type=pbi_list,
+                                help='Remine PBI number to migrate to the Jira, multiple PBIs can be given as a '
+                                     'comma separated list and/or ranges (e.g. 101,105,110-150)')
+    required_named.add_argument('-q', '--query', action='store',
+                                help='ID of a Redmine saved query, all the matching PBIs are migrated to the Jira')
     required_named.add_argument('-w', '--wiki', action='store',
                                 help='Title of the Redmine wiki page to migrate to Confluence')
     parser.add_argument('-m', '--multiple', action='store_true',
                         help='Import a section (parent with all the child pages) to Confluence')
     parser.add_argument('-a', '--all', action='store_true',
                         help='Import all the pages from a given Redmine project to Confluence')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume an interrupted migration, the pages which failed in the previous runs are '
+                             'retried')
+    parser.add_argument('-k', '--keep-going', action='store_true',
+                        help='Record the pages which cannot be migrated and continue with the other pages')
     parser.add_argument('-r', '--remove', action='store_true',
                         help='Remove the original Redmine Wiki content and add a link to the Confluence page')
     parser.add_argument('-e', '--epic', action='store', help='Related Epic no. in Jira, if any')
@@ -111,10 +154,46 @@ def get_args():
                         help='Confluence Space used for importing the Wiki pages')
     parser.add_argument('-yml', '--yaml', action='store',
                         help='YAML file to use, it should be present in the helpers directory')
+    parser.add_argument('-t', '--threads', action='store', type=int, default=4,
+                        help='Number of PBIs/Wiki pages migrated in parallel (default: 4)')
+    parser.add_argument('--trace', action='store',
+                        help='JSONL file recording the requests sent to the servers, a summary is printed at the end')
+    snapshot_mode = parser.add_mutually_exclusive_group()
+    snapshot_mode.add_argument('--export-snapshot', action='store',
+                               help='Export the selected PBIs/Wiki pages (with their attachments) to an offline '
+                                    'snapshot of the Redmine project, nothing is migrated')
+    snapshot_mode.add_argument('--snapshot', action='store',
+                               help='Migrate the selected PBIs/Wiki pages from an offline snapshot instead of '
+                                    'Redmine, the Redmine issues/pages are not updated')
     args = parser.parse_args()
     return args
 
 
+def pbi_list(value):
+    """
+    Validates the PBI numbers given in the command line, a comma separated list of PBI numbers and/or ranges.
+    Parameters:
+        value (str): PBI numbers, e.g. '101,105,110-150'.
+    Returns:
+        The PBI numbers, with the bounds of the reversed ranges swapped (e.g. '150-110' becomes '110-150').
+    """
+    pbis = []
+    for pbi in value.split(','):
+        pbi = pbi.strip()
+        if not pbi:
+            continue
+        bounds = [bound.strip() for bound in pbi.split('-')]
+        if len(bounds) > 2 or not all(bound.isdigit() for bound in bounds):
+            raise argparse.ArgumentTypeError("invalid PBI number or range '{}', expected e.g. 101 or 110-150"
+                                             .format(pbi))
+        if len(bounds) == 2 and int(bounds[0]) > int(bounds[1]):
+            bounds.reverse()
+        pbis.append('-'.join(bounds))
+    if not pbis:
+        raise argparse.ArgumentTypeError("no PBI number given")
+    return ','.join(pbis)
+
+
 def get_headers():
     """
     Return headers used in the REST call to the Redmine server.
@@ -135,13 +214,15 @@ def request_redmine(url):
         A dictionary with the response values.
     """
     try:
-        resp = requests.get(url, headers=get_headers())
+        # Reuse the keep-alive connections of the Redmine client.
+        resp = redmine.engine.session.get(url, headers=get_headers(), timeout=transport.timeout)
         resp.raise_for_status()  # Raises a HTTPError if the status is 4xx, 5xxx
     except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
         print("Connection error while contacting the Redmine server.")
         return None
     except requests.exceptions.HTTPError:
-        print("Internal Server error")
+        # The throttled requests are already sent again by the transport, until the server accepts them.
+        print("Redmine server error {} for {}".format(resp.status_code, url.split('?')[0]))
         return None
     else:
         json_data = json.loads(resp.text)
@@ -156,7 +237,7 @@ def is_imported(subject):
     Returns:
         Returns True if a given Redmine issue is already imported in Jira, otherwise False.
     """
-    if arg_vars.pbi and '[JIRA-{}-'.format(yaml_vars['jira_project']) in subject:
+    if not arg_vars.wiki and '[JIRA-{}-'.format(yaml_vars['jira_project']) in subject:
         return True
     elif arg_vars.wiki and '*Migrated to Confluence "' in subject:
         return True
@@ -164,144 +245,81 @@ def is_imported(subject):
         return False
 
 
+def get_jira_key(subject):
+    """
+    Retrieves the key of the Jira issue from the tag in the subject of a migrated Redmine issue.
+    Parameters:
+        subject (str): Subject of a Redmine issue.
+    Returns:
+        Returns the Jira key, if found. Otherwise None will be returned.
+    """
+    match = re.search(r"\[JIRA-([A-Za-z0-9-]+)\]", subject)
+    return match.group(1) if match else None
+
+
 def get_confluence_page(description):
     """
-    Retrieves the Confluence page object from it's reference in the original Redmine Wiki page.
+    Retrieves the Confluence page from it's reference in the original Redmine Wiki page, using the
+    index of the Confluence space.
     Parameters:
         description (str): Redmine Wiki page description.
     Returns:
-        Returns the Confluence page object, if found. Otherwise None will be returned.
+        Returns the ID and title of the Confluence page (dict), if found. Otherwise None will be returned.
     """
     if arg_vars.wiki and '*Migrated to Confluence "' in description:
         match_patterns = re.findall(r"\*Migrated to Confluence \"(.*?)\"", description)
         for match_pattern in match_patterns:
-            confluence_page = confluence.get_page_by_title(yaml_vars['confluence_space'], match_pattern)
-            if confluence_page is not None:
-                return confluence_page
+            page_id = link_index.confluence_page_id(match_pattern)
+            if page_id is not None:
+                return {'id': page_id, 'title': match_pattern}
     else:
         return None
 
 
-def update_formatting(description):
+def update_formatting(description, current_page=None):
     """
     Updates formatting of the issue and comment description before importing in Jira.
     Parameters:
         description (str): Description from the Redmine issue/comment.
+        current_page (str): Title of the Redmine Wiki page being migrated, if any.
     Returns:
         Returns a formatted string.
     """
-    formatted_description = description.replace('<pre><code class', '<code class')
-    formatted_description = formatted_description.replace('</code></pre>', '</code>')
-    formatted_description = formatted_description.replace('<pre>', '{noformat}')
-    formatted_description = formatted_description.replace('</pre>', '{noformat}')
-    match_inline_codes = re.findall(r"\@(.*?)\@", formatted_description)
-    for matched_inline_code in set(match_inline_codes):
-        formatted_description = formatted_description.replace(
-            '@{}@'.format(matched_inline_code), '{{' + matched_inline_code + '}}')
-    formatted_description = formatted_description.replace('*READY FOR MIGRATION TO JIRA*', '')
-    match_pbis = re.findall('#(\d+)', formatted_description)
-    for matched_pbi in set(match_pbis):
-        formatted_description = formatted_description.replace(
-            '#{}'.format(matched_pbi), '[#{}|{}/issues/{}]'.format(
-                matched_pbi, yaml_vars['redmine_server'], matched_pbi))
-
-    if arg_vars.wiki:
-        formatted_description = formatted_description.replace('{{>toc}}', '{toc}')
-        # Replace || with | | to render an empty cell of the table in Confluence
-        formatted_description = formatted_description.replace('||', '| | ')
-        formatted_description = formatted_description.replace('|_.', '||')
-        formatted_description = formatted_description.replace('|^.', '|')
-        formatted_description = formatted_description.replace('|>.', '|')
-        formatted_description = formatted_description.replace('|<.', '|')
-        formatted_description = formatted_description.replace('|~.', '|')
-        formatted_description = formatted_description.replace('|=.', '|')
-        formatted_description = formatted_description.replace('|_<.', '||')
-        formatted_description = formatted_description.replace('<notextile>', '')
-        formatted_description = formatted_description.replace('</notextile>', '')
-        formatted_description = formatted_description.replace('<code>', '{code}')
-        formatted_description = formatted_description.replace('</code>', '{code}')
-        match_source_code = re.findall(r"<code class=\"(.*?)\">", formatted_description)
-        match_child_macro = re.findall(r"{{child_pages\(depth=(.*?)\)}}", formatted_description)
-        # Need to redesign the following replace as [] can occur in the code or within {nofomat}
-        # or {code} macros
-        match_single_square_markup = re.findall(r"\[(.*?)\]", formatted_description)
-        match_double_square_markup = re.findall(r"\[\[(.*?)\]\]", formatted_description)
-        match_pc_markup = re.findall(r"%(.*?)%", formatted_description)
-        match_bg_markup = re.findall(r"{background:(.*?)}", formatted_description)
-        try:
-
-            for matched_code in set(match_pc_markup):
-                formatted_description = formatted_description.replace(
-                    '%{}%'.format(matched_code),
-                    '*{}*'.format(matched_code))
-
-            for matched_code in set(match_bg_markup):
-                formatted_description = formatted_description.replace(
-                    '{{background:{}}}'.format(matched_code), '')
+    return markup.translate(description, yaml_vars['redmine_server'], wiki=bool(arg_vars.wiki),
+                            resolve_link=lambda link_markup: resolve_wiki_link(link_markup, current_page))
 
-            for matched_code in set(match_source_code):
-                formatted_description = formatted_description.replace(
-                    '<code class="{}">'.format(matched_code),
-                    '{{code:language={}}}'.format(matched_code))
-            for matched_macro in set(match_child_macro):
-                formatted_description = formatted_description.replace(
-                    '{{child_pages(depth={0})}}'.format(matched_macro),
-                    'children:sort=creation|depth={0}'.format(matched_macro))
-            for matched_square_markup in set(match_single_square_markup):
-                if not matched_square_markup.startswith('[') and \
-                        matched_square_markup[1:] not in set(match_double_square_markup):
-                    formatted_description = formatted_description.replace(
-                        '[{0}]'.format(matched_square_markup),
-                        '[[{0}]]'.format(matched_square_markup))
-            for matched_square_markup in set(match_double_square_markup):
-                link = matched_square_markup.split('|')[0].split('#')[0]
-                try:
-                    correct_title = link.replace(' ', '_').replace('.', '')
-                    if ':' in correct_title:
-                        redmine_project = correct_title.split(':')[0]
-                        correct_title = correct_title.split(':')[1]
-                    else:
-                        redmine_project = yaml_vars['redmine_project_id']
-                    wiki_page = redmine.wiki_page.get(correct_title, project_id=redmine_project)
-                except Exception as e:
-                    wiki_page = None
-                    print("Could not find a Redmine Wiki page with title - {}".format(link))
-                if wiki_page:
-                    if arg_vars.all:
-                        if redmine_project == yaml_vars['redmine_project_id']:
-                            formatted_description = formatted_description.replace(
-                                '[[{0}]]'.format(matched_square_markup),
-                                '[{0}]'.format(wiki_page.title.replace('_', ' ')))
-                        else:
-                            # If the page is on another Wiki project, add link to the the original Redmine Wiki page.
-                            formatted_description = formatted_description.replace(
-                                '[[{0}]]'.format(matched_square_markup),
-                                "[{}|{}/projects/{}/wiki/{}]".format(link, yaml_vars['redmine_server'],
-                                                                     redmine_project,
-                                                                     wiki_page.title.replace('_', ' ')))
-                    else:
-                        is_present = confluence.page_exists(yaml_vars['confluence_space'],
-                                                            wiki_page.title.replace('_', ' '))
-                        if is_present:
-                            formatted_description = formatted_description.replace(
-                                '[[{0}]]'.format(matched_square_markup),
-                                '[{0}]'.format(wiki_page.title.replace('_', ' ')))
-                        elif wiki_page.title == current_page:
-                            formatted_description = formatted_description.replace(
-                                '[[{0}]]'.format(matched_square_markup),
-                                '[{0}]'.format(matched_square_markup.split('|')[0].replace('_', ' ')))
-                        else:
-                            # If the page is not present in Confluence, add link to the the original Redmine Wiki page.
-                            formatted_description = formatted_description.replace(
-                                '[[{0}]]'.format(matched_square_markup),
-                                "[{}|{}/projects/{}/wiki/{}]".format(link, yaml_vars['redmine_server'],
-                                                                     redmine_project,
-                                                                     wiki_page.title.replace('_', ' ')))
-                formatted_description = formatted_description.replace(
-                    '[[{0}]]'.format(matched_square_markup),
-                    '[{0}]'.format(matched_square_markup))
-        except Exception as e:
-            print(e)
 
-    return formatted_description
+def resolve_wiki_link(link_markup, current_page=None):
+    """
+    Translates a [[...]] link of a Redmine Wiki page to a Confluence link. Titles are resolved with
+    the link index (link_index), without contacting Redmine or Confluence for every link.
+    Parameters:
+        link_markup (str): Content of the link, e.g. 'Project:Page#Section|Label'.
+        current_page (str): Title of the Redmine Wiki page being migrated, if any.
+    Returns:
+        Returns the link in Confluence markup. If the page is not migrated to Confluence, the link
+        points to the original Redmine Wiki page.
+    """
+    link = link_markup.split('|')[0].split('#')[0]
+    correct_title = link.replace(' ', '_').replace('.', '')
+    if ':' in correct_title:
+        redmine_project = correct_title.split(':')[0]
+        correct_title = correct_title.split(':')[1]
+    else:
+        redmine_project = yaml_vars['redmine_project_id']
+    wiki_title = link_index.redmine_title(correct_title, redmine_project)
+    if not wiki_title:
+        print("Could not find a Redmine Wiki page with title - {}".format(link))
+        return '[{0}]'.format(link_markup)
 
+    if arg_vars.all and redmine_project == yaml_vars['redmine_project_id']:
+        return '[{0}]'.format(wiki_title.replace('_', ' '))
+    elif not arg_vars.all:
+        if link_index.confluence_page_id(wiki_title.replace('_', ' ')):
+            return '[{0}]'.format(wiki_title.replace('_', ' '))
+        elif wiki_title == current_page:
+            return '[{0}]'.format(link_markup.split('|')[0].replace('_', ' '))
+    # If the page is on another Wiki project or not present in Confluence, add link to the the
+    # original Redmine Wiki page.
+    return "[{}|{}/projects/{}/wiki/{}]".format(link, yaml_vars['redmine_server'], redmine_project,
+                                                wiki_title.replace('_', ' '))
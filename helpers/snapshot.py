@@ -0,0 +1,207 @@
+"""
+Offline snapshot of a Redmine project, so that a migration can be rehearsed without contacting Redmine.
+The snapshot is a directory with a manifest and one compressed JSONL file per type of record (users, issues,
+checklists, subjects of the related issues, Wiki index and Wiki pages), as received from the Redmine REST API.
+The attachments are kept in a content addressed store (see helpers/attachments.py), each content is stored once.
+"""
+
+import gzip
+import helpers.attachments as attachments
+import json
+import os
+import threading
+import time
+
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+ATTACHMENTS_DIR = 'attachments'
+# Types of records stored in the snapshot, one file each.
+RECORD_TYPES = ('users', 'issues', 'subjects', 'wiki_index', 'wiki_pages')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def record_file(path, record_type):
+    return os.path.join(path, '{}.jsonl.gz'.format(record_type))
+
+
+def attachment_store(path, read_only=False):
+    """
+    Returns the attachment store of a snapshot, attachments are never evicted from it.
+    Parameters:
+        path (str): Directory of the snapshot.
+        read_only (bool): Missing attachments are not downloaded, if True.
+    Returns:
+        AttachmentCache object.
+    """
+    return attachments.AttachmentCache(os.path.join(path, ATTACHMENTS_DIR), float('inf'), read_only=read_only)
+
+
+class SnapshotWriter(object):
+    """
+    Writes the records of a snapshot, the records can be written by several threads.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+            path (str): Directory of the snapshot, created if needed. An existing snapshot is replaced, but
+                the attachments already stored are kept.
+        """
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        # The previous snapshot is incomplete as soon as its records are replaced.
+        if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            os.remove(os.path.join(path, MANIFEST_FILE))
+        self.counts = dict.fromkeys(RECORD_TYPES, 0)
+        self._files = {record_type: gzip.open(record_file(path, record_type), 'wt', encoding='utf-8')
+                       for record_type in RECORD_TYPES}
+        self._lock = threading.Lock()
+
+    def write(self, record_type, record):
+        """
+        Writes a record of a given type (see RECORD_TYPES).
+        """
+        line = json.dumps(record, separators=(',', ':'))
+        with self._lock:
+            self._files[record_type].write(line + '\n')
+            self.counts[record_type] += 1
+
+    def close(self, manifest):
+        """
+        Closes the record files and writes the manifest, the snapshot is complete once the manifest exists.
+        Parameters:
+            manifest (dict): Description of the snapshot (project, server, selection).
+        Returns:
+            None.
+        """
+        with self._lock:
+            for file_handle in self._files.values():
+                file_handle.close()
+        manifest = dict(manifest, version=SNAPSHOT_VERSION, created_on=time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                                                                     time.gmtime()),
+                        counts=self.counts)
+        # The manifest is written at once, an interrupted export leaves no manifest.
+        temp_path = os.path.join(self.path, '.{}.tmp'.format(MANIFEST_FILE))
+        with open(temp_path, 'w') as file_handle:
+            json.dump(manifest, file_handle, indent=2)
+            file_handle.flush()
+            os.fsync(file_handle.fileno())
+        os.replace(temp_path, os.path.join(self.path, MANIFEST_FILE))
+
+
+class Snapshot(object):
+    """
+    Reads a snapshot, the records are loaded in memory once.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+            path (str): Directory of the snapshot.
+        """
+        self.path = path
+        try:
+            with open(os.path.join(path, MANIFEST_FILE)) as file_handle:
+                self.manifest = json.load(file_handle)
+        except (IOError, OSError, ValueError) as e:
+            raise SnapshotError("{} is not a complete snapshot: {}".format(path, e))
+        if self.manifest.get('version') != SNAPSHOT_VERSION:
+            raise SnapshotError("Unsupported version of the snapshot {}: {}".format(path,
+                                                                                    self.manifest.get('version')))
+        self.users = list(self._read('users'))
+        self._users = {user['id']: user for user in self.users}
+        self._issues = dict()
+        self._checklists = dict()
+        for record in self._read('issues'):
+            self._issues[record['issue']['id']] = record['issue']
+            if record.get('checklists') is not None:
+                self._checklists[record['issue']['id']] = record['checklists']
+        self._subjects = {record['id']: record['subject'] for record in self._read('subjects')}
+        self.wiki_index = list(self._read('wiki_index'))
+        self._wiki_pages = dict()
+        self._original_authors = dict()
+        for record in self._read('wiki_pages'):
+            self._wiki_pages[record['page']['title'].lower()] = record['page']
+            if record.get('original_author'):
+                self._original_authors[record['page']['title']] = record['original_author']
+
+    def _read(self, record_type):
+        with gzip.open(record_file(self.path, record_type), 'rt', encoding='utf-8') as file_handle:
+            for line in file_handle:
+                if line.strip():
+                    yield json.loads(line)
+
+    def is_project(self, project_id):
+        """
+        Checks whether a given Redmine project (ID or identifier) is the project of the snapshot.
+        """
+        return project_id in (self.manifest['project_id'], self.manifest['project'])
+
+    def selected_issue_ids(self):
+        """
+        Returns the IDs of the issues selected when the snapshot was exported, in order.
+        """
+        return list(self.manifest.get('issues') or [])
+
+    def user(self, user_id):
+        """
+        Returns the details of a user (dict), None if the user is not in the snapshot.
+        """
+        return self._users.get(int(user_id))
+
+    def find_users(self, name):
+        """
+        Returns the users whose login, first name or last name contains a given name, as searched by Redmine.
+        """
+        name = name.lower()
+        return [user for user in self.users
+                if any(name in (user.get(field) or '').lower() for field in ('login', 'firstname', 'lastname'))]
+
+    def issue(self, issue_id):
+        """
+        Returns the raw Redmine issue (dict), with its journals, attachments, relations and children.
+        """
+        try:
+            return self._issues[int(issue_id)]
+        except KeyError:
+            raise SnapshotError("Redmine issue {} is not in the snapshot".format(issue_id))
+
+    def has_issue(self, issue_id):
+        return int(issue_id) in self._issues
+
+    def checklists(self, issue_id):
+        """
+        Returns the checklist items of an issue, an issue exported without its checklists has none.
+        """
+        return self._checklists.get(int(issue_id), [])
+
+    def subject(self, issue_id):
+        """
+        Returns the subject of an issue, None if it is unknown.
+        """
+        if int(issue_id) in self._issues:
+            return self._issues[int(issue_id)]['subject']
+        return self._subjects.get(int(issue_id))
+
+    def wiki_page(self, title):
+        """
+        Returns the raw Redmine Wiki page (dict) of a given title (case insensitive), with its attachments.
+        """
+        try:
+            return self._wiki_pages[title.lower()]
+        except KeyError:
+            raise SnapshotError("Redmine Wiki page {} is not in the snapshot".format(title))
+
+    def original_author(self, title):
+        """
+        Returns the author of the first version of a Wiki page.
+        """
+        try:
+            return self._original_authors[title]
+        except KeyError:
+            raise SnapshotError("The original author of the Redmine Wiki page {} is not in the snapshot".format(
+                title))
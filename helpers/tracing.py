@@ -0,0 +1,165 @@
+"""
+Tracing of the requests sent to the Redmine, Jira and Confluence servers.
+Each HTTP call is recorded (server, method, endpoint, status, latency and bytes) in a JSONL file, nested in the
+span of the issue/page being migrated. A summary of the time spent per type of call is printed at the end of the run.
+"""
+
+import collections
+import contextlib
+import contextvars
+import itertools
+import json
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Identifier of the current span, propagated to the worker threads (see helpers/workers.py).
+_current_span = contextvars.ContextVar('span', default=None)
+_span_ids = itertools.count(1)
+_lock = threading.Lock()
+_file = None
+_servers = dict()
+# Type of call - list of latencies in seconds.
+_latencies = collections.defaultdict(list)
+
+_JIRA_KEY_RE = re.compile(r'^[A-Z][A-Z0-9_]*-\d+$')
+
+
+def init(path):
+    """
+    Enables the tracing.
+    Parameters:
+        path (str): JSONL file receiving the spans and calls, tracing is disabled if None.
+    Returns:
+        None.
+    """
+    global _file
+    if path:
+        _file = open(path, 'a')
+
+
+def enabled():
+    return _file is not None
+
+
+def register_server(name, url):
+    """
+    Names a server, its calls are recorded as '<name> <method> <endpoint>'.
+    """
+    _servers[urlsplit(url).netloc] = (name, urlsplit(url).path.rstrip('/'))
+
+
+def instrument(session):
+    """
+    Records the calls of a given requests.Session, if the tracing is enabled.
+    """
+    if enabled():
+        session.hooks['response'].append(_record_call)
+    return session
+
+
+def endpoint(path):
+    """
+    Returns the endpoint of a URL path, with the IDs, keys and titles replaced by placeholders.
+    """
+    segments = path.strip('/').split('/')
+    for index, segment in enumerate(segments):
+        name, dot, extension = segment.partition('.')
+        previous = segments[index - 1] if index else ''
+        if name.isdigit() and previous not in ('api', 'tinymce'):
+            name = '{id}'
+        elif _JIRA_KEY_RE.match(name):
+            name = '{key}'
+        elif previous == 'projects':
+            name = '{project}'
+        elif previous == 'wiki' and name != 'index':
+            name = '{title}'
+        elif index >= 2 and segments[index - 2] == 'download':
+            name, dot, extension = '{filename}', '', ''
+        segments[index] = name + dot + extension
+    return '/' + '/'.join(segments)
+
+
+def _write(record):
+    line = json.dumps(record)
+    with _lock:
+        _file.write(line + '\n')
+        _file.flush()
+
+
+def _record_call(response, *args, **kwargs):
+    # Only the path is recorded, the query string may contain the Redmine API key.
+    url = urlsplit(response.request.url)
+    server, base_path = _servers.get(url.netloc, (url.netloc, ''))
+    path = url.path[len(base_path):] if base_path and url.path.startswith(base_path) else url.path
+    call = '{} {} {}'.format(server, response.request.method, endpoint(path))
+    latency = response.elapsed.total_seconds()
+    body = response.request.body
+    bytes_out = len(body) if isinstance(body, (bytes, str)) else getattr(body, 'len', 0)
+    with _lock:
+        _latencies[call].append(latency)
+    _write({'type': 'call', 'span': _current_span.get(), 'time': time.time(), 'call': call,
+            'server': server, 'method': response.request.method, 'path': url.path,
+            'status': response.status_code, 'latency': latency, 'bytes_in': int(response.headers.get(
+                'Content-Length') or 0), 'bytes_out': bytes_out or 0})
+    return response
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Records a span (e.g. the migration of an issue or a page), the calls made within it are nested in it.
+    Parameters:
+        name (str): Name of the span.
+        attributes: Attributes of the span, e.g. the issue ID.
+    """
+    if not enabled():
+        yield
+        return
+    span_id = next(_span_ids)
+    parent = _current_span.get()
+    token = _current_span.set(span_id)
+    start = time.time()
+    status = 'ok'
+    try:
+        yield
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        _current_span.reset(token)
+        _write({'type': 'span', 'id': span_id, 'parent': parent, 'name': name, 'attributes': attributes,
+                'start': start, 'duration': time.time() - start, 'status': status})
+
+
+def percentile(values, ratio):
+    """
+    Returns the given percentile (nearest rank) of sorted values.
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(ratio * len(values))) - 1))]
+
+
+def summary():
+    """
+    Returns the lines of the summary of the calls: count, total time and p50/p95/p99 latencies per type of call,
+    the most time consuming first.
+    """
+    with _lock:
+        latencies = {call: sorted(values) for call, values in _latencies.items()}
+    lines = ['{:<64} {:>7} {:>10} {:>8} {:>8} {:>8}'.format('call', 'count', 'total (s)', 'p50', 'p95', 'p99')]
+    for call, values in sorted(latencies.items(), key=lambda item: -sum(item[1])):
+        lines.append('{:<64} {:>7} {:>10.2f} {:>8.3f} {:>8.3f} {:>8.3f}'.format(
+            call[:64], len(values), sum(values), percentile(values, 0.5), percentile(values, 0.95),
+            percentile(values, 0.99)))
+    return lines
+
+
+def close():
+    global _file
+    if _file is not None:
+        with _lock:
+            _file.close()
+            _file = None
@@ -0,0 +1,108 @@
+"""
+Shared HTTP transport of the Redmine, Jira and Confluence clients: keep-alive connection pools sized
+for the number of workers, a single timeout, retries with backoff for the idempotent requests and an
+adaptive limit of the concurrent requests per server (see helpers/rate_limit.py).
+"""
+
+from redminelib.engines.sync import SyncEngine
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from urllib3.util.retry import Retry
+import helpers.rate_limit as rate_limit
+import helpers.tracing as tracing
+import requests
+
+# Default timeout (in seconds) of the requests, can be changed with http_timeout in the YAML file.
+DEFAULT_TIMEOUT = 30
+# Number of retries of the idempotent requests, on connection errors and on the following statuses.
+# The throttled requests (429/503) are sent again by the ThrottledAdapter, whatever their method.
+RETRIES = 3
+RETRY_STATUSES = (502, 504)
+RETRY_BACKOFF = 0.5
+
+pool_size = 10
+timeout = DEFAULT_TIMEOUT
+
+
+def init(workers, request_timeout=None):
+    """
+    Configures the transport used by the sessions created afterwards.
+    Parameters:
+        workers (int): Number of workers, the connection pools are sized accordingly.
+        request_timeout (float): Timeout (in seconds) of the requests.
+    Returns:
+        None.
+    """
+    global pool_size, timeout
+    # Each worker may use a couple of connections at once to the same server, e.g. while
+    # downloading an attachment from Redmine.
+    pool_size = max(2 * workers, 10)
+    timeout = request_timeout or DEFAULT_TIMEOUT
+
+
+def configure_session(session):
+    """
+    Mounts a pooled, retrying and throttled HTTP adapter on a given session, and records its requests if the
+    tracing is enabled.
+    Parameters:
+        session (obj): requests.Session object.
+    Returns:
+        The given session.
+    """
+    retry = Retry(total=RETRIES, connect=RETRIES, read=RETRIES, status=RETRIES,
+                  backoff_factor=RETRY_BACKOFF, status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']), raise_on_status=False,
+                  respect_retry_after_header=False)
+    adapter = ThrottledAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return tracing.instrument(session)
+
+
+class ThrottledAdapter(HTTPAdapter):
+    """
+    HTTP adapter waiting for the limiter of the server before sending a request. A request throttled by the
+    server (429/503) is sent again once the server is ready (Retry-After), up to rate_limit.THROTTLE_RETRIES times.
+    """
+
+    def send(self, request, **kwargs):
+        host_limiter = rate_limit.limiter(urlsplit(request.url).netloc, pool_size)
+        # Streamed bodies (e.g. the uploaded attachments) cannot be sent twice.
+        replayable = request.body is None or isinstance(request.body, (bytes, str))
+        attempt = 0
+        while True:
+            host_limiter.acquire()
+            try:
+                response = super(ThrottledAdapter, self).send(request, **kwargs)
+            except Exception:
+                host_limiter.release(None)
+                raise
+            delay = host_limiter.release(response.status_code,
+                                         rate_limit.parse_retry_after(response.headers.get('Retry-After')), attempt)
+            if delay is None or not replayable or attempt >= rate_limit.THROTTLE_RETRIES:
+                return response
+            # The limiter holds the next requests to the server until the delay is over.
+            response.close()
+            attempt += 1
+
+
+def create_session():
+    """
+    Creates a new keep-alive session with the shared transport configuration.
+    Returns:
+        requests.Session object.
+    """
+    return configure_session(requests.Session())
+
+
+class RedmineEngine(SyncEngine):
+    """
+    python-redmine engine using a session with the shared transport configuration.
+    """
+
+    @staticmethod
+    def create_session(**params):
+        session = create_session()
+        for param in params:
+            setattr(session, param, params[param])
+        return session
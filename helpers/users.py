@@ -0,0 +1,148 @@
+from concurrent.futures import Future
+import json
+import os
+import threading
+import time
+
+
+class UserDirectory(object):
+    """
+    In-memory directory of the Redmine users, indexed by ID and by name.
+    All the users are fetched once, when first needed, and optionally kept in a local file for
+    the next runs. Users missing in the directory are fetched one by one and kept as well.
+    """
+
+    def __init__(self, get_users, get_user, find_user_id, cache_file=None, ttl_hours=None):
+        """
+        Parameters:
+            get_users (function): Returns all the Redmine users (list of dictionaries).
+            get_user (function): Returns a Redmine user (dictionary) of a given user ID.
+            find_user_id (function): Returns the ID of a Redmine user matching a given name.
+            cache_file (str): Optional, file used to keep the users between runs.
+            ttl_hours (float): Validity of the cache file in hours, it never expires by default.
+        """
+        self._get_users = get_users
+        self._get_user = get_user
+        self._find_user_id = find_user_id
+        self.cache_file = cache_file
+        self.ttl_hours = ttl_hours
+        self._by_id = dict()
+        self._by_name = dict()
+        self._loaded = False
+        # Key - future of the value being fetched, the Redmine requests are sent outside the lock and once per
+        # key: ('users',) for the list of all the users, ('user', ID) and ('name', lower case name).
+        self._futures = dict()
+        self._lock = threading.Lock()
+
+    def _fetch(self, key, fetch):
+        """
+        Returns the value of a key, fetched by the first caller while the others wait for it. A failed fetch
+        is not kept, it is tried again by the next caller.
+        """
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+        if owner:
+            try:
+                future.set_result(fetch())
+            except BaseException as e:
+                with self._lock:
+                    del self._futures[key]
+                future.set_exception(e)
+        return future.result()
+
+    def login(self, user_id):
+        """
+        Retrieves the username of a given user.
+        Parameters:
+            user_id (int): User ID in Redmine.
+        Returns:
+            Returns the username, if found. Otherwise None will be returned.
+        """
+        self._load()
+        with self._lock:
+            found = user_id in self._by_id
+            user = self._by_id.get(user_id)
+        if not found:
+            user = self._fetch(('user', user_id), lambda: self._get_user(user_id))
+            with self._lock:
+                if user_id not in self._by_id:
+                    self._by_id[user_id] = user
+                    if user:
+                        self._add(user)
+                user = self._by_id[user_id]
+        return user.get('login') if user else None
+
+    def user_id(self, name):
+        """
+        Retrieves the ID of a user from the name (firstname lastname, lastname firstname or login).
+        Parameters:
+            name (str): Name of the user, case insensitive.
+        Returns:
+            Returns the user ID, if found. Otherwise None will be returned.
+        """
+        self._load()
+        key = name.strip().lower()
+        with self._lock:
+            if key in self._by_name:
+                return self._by_name[key]
+        found_id = self._fetch(('name', key), lambda: self._find_user_id(name))
+        with self._lock:
+            return self._by_name.setdefault(key, found_id)
+
+    def _load(self):
+        if self._loaded:
+            return
+        users = self._fetch(('users',), self._list_users)
+        with self._lock:
+            if self._loaded:
+                return
+            for user in users or []:
+                self._by_id.setdefault(user['id'], user)
+                self._add(user)
+            self._loaded = True
+
+    def _list_users(self):
+        users = self._read_cache()
+        if users is None:
+            try:
+                users = list(self._get_users())
+            except Exception as e:
+                print("Could not fetch the list of Redmine users, they are fetched one by one: {}".format(e))
+                return None
+            self._write_cache(users)
+        return users
+
+    def _add(self, user):
+        names = [user.get('login'),
+                 '{} {}'.format(user.get('firstname', ''), user.get('lastname', '')),
+                 '{} {}'.format(user.get('lastname', ''), user.get('firstname', ''))]
+        for name in names:
+            if name and name.strip():
+                self._by_name.setdefault(name.strip().lower(), user['id'])
+
+    def _read_cache(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file) as file_handle:
+                cache = json.load(file_handle)
+        except Exception as e:
+            print("Could not read the Redmine users cache {}: {}".format(self.cache_file, e))
+            return None
+        if self.ttl_hours and time.time() - cache.get('created', 0) > self.ttl_hours * 3600:
+            return None
+        return cache.get('users')
+
+    def _write_cache(self, users):
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, 'w') as file_handle:
+                json.dump({'created': time.time(),
+                           'users': [{key: user.get(key) for key in ('id', 'login', 'firstname', 'lastname')}
+                                     for user in users]}, file_handle)
+        except Exception as e:
+            print("Could not write the Redmine users cache {}: {}".format(self.cache_file, e))
@@ -0,0 +1,127 @@
+from concurrent.futures import Future
+import threading
+
+
+class WikiLinkIndex(object):
+    """
+    In-memory index of the Redmine Wiki page titles and of the Confluence page titles, used to
+    resolve the [[...]] links and the parent pages without contacting the servers for every page.
+    The Wiki index of a Redmine project and the Confluence space are fetched once, when first needed.
+    """
+
+    def __init__(self, project_id, get_pages_info, get_confluence_pages, get_wiki_page=None):
+        """
+        Parameters:
+            project_id (int): ID of the Redmine project being migrated.
+            get_pages_info (function): Returns the Wiki pages info of a given Redmine project.
+            get_confluence_pages (function): Returns a dictionary of title - ID of the Confluence pages.
+            get_wiki_page (function): Optional, returns the Redmine Wiki page of a given title and
+                project. Used for the titles missing in the Wiki index of another project (e.g. renamed
+                pages), the titles of the migrated project are resolved from its Wiki index only.
+        """
+        self.project_id = project_id
+        self._get_pages_info = get_pages_info
+        self._get_confluence_pages = get_confluence_pages
+        self._get_wiki_page = get_wiki_page
+        # Key - future of the fetched value: ('index', Redmine project) - {lower case title: title},
+        # ('redirect', Redmine project, lower case title) - title for the titles missing in the Wiki index of
+        # another project,
+        # ('confluence',) - {title: page ID}. The values are fetched outside the lock, once per key.
+        self._futures = dict()
+        # Confluence title - page ID, for the pages created during this run.
+        self._created_pages = dict()
+        self._lock = threading.Lock()
+
+    def _fetch(self, key, fetch):
+        """
+        Returns the value of a key, fetched by the first caller while the others wait for it.
+        """
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+        if owner:
+            try:
+                future.set_result(fetch())
+            except BaseException as e:
+                future.set_exception(e)
+        return future.result()
+
+    def _fetch_redmine_titles(self, project_id):
+        try:
+            pages = self._get_pages_info(project_id)
+        except Exception as e:
+            print("Could not fetch the Redmine Wiki index of the project {}: {}".format(project_id, e))
+            pages = []
+        return {page['title'].lower(): page['title'] for page in pages}
+
+    def _fetch_redirect(self, title, project_id):
+        try:
+            return self._get_wiki_page(title, project_id).title
+        except Exception:
+            return None
+
+    def _fetch_confluence_pages(self):
+        try:
+            return self._get_confluence_pages()
+        except Exception as e:
+            print("Could not fetch the pages of the Confluence space: {}".format(e))
+            return dict()
+
+    def add_redmine_pages(self, pages_info, project_id=None):
+        """
+        Seeds the index with the Wiki index of a Redmine project already fetched, so it is not fetched again.
+        Parameters:
+            pages_info (list): Wiki pages info (dictionaries), as returned by the Redmine Wiki index.
+            project_id (int/str): Redmine project, the migrated project by default.
+        Returns:
+            None.
+        """
+        project_id = self.project_id if project_id is None else project_id
+        future = Future()
+        future.set_result({page['title'].lower(): page['title'] for page in pages_info})
+        with self._lock:
+            self._futures.setdefault(('index', project_id), future)
+
+    def redmine_title(self, title, project_id=None):
+        """
+        Looks up a Redmine Wiki page title, Redmine titles are case insensitive.
+        Parameters:
+            title (str): Title of the Wiki page (spaces replaced with underscores).
+            project_id (int/str): Redmine project, the migrated project by default.
+        Returns:
+            Returns the title of the Wiki page, if found. Otherwise None will be returned.
+        """
+        project_id = self.project_id if project_id is None else project_id
+        titles = self._fetch(('index', project_id), lambda: self._fetch_redmine_titles(project_id))
+        found_title = titles.get(title.lower())
+        # The Wiki index of the migrated project is complete, a missing title is a missing page.
+        if found_title or not self._get_wiki_page or project_id == self.project_id:
+            return found_title
+        return self._fetch(('redirect', project_id, title.lower()), lambda: self._fetch_redirect(title, project_id))
+
+    def confluence_page_id(self, title):
+        """
+        Looks up a page in the Confluence space.
+        Parameters:
+            title (str): Title of the Confluence page.
+        Returns:
+            Returns the ID of the Confluence page, if found. Otherwise None will be returned.
+        """
+        with self._lock:
+            if title in self._created_pages:
+                return self._created_pages[title]
+        return self._fetch(('confluence',), self._fetch_confluence_pages).get(title)
+
+    def add_confluence_page(self, title, page_id):
+        """
+        Adds a page created in Confluence during this run.
+        Parameters:
+            title (str): Title of the Confluence page.
+            page_id (str): ID of the Confluence page.
+        Returns:
+            None.
+        """
+        with self._lock:
+            self._created_pages[title] = page_id
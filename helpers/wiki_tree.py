@@ -0,0 +1,85 @@
+import collections
+
+
+class WikiNode(object):
+    """
+    Redmine Wiki page in the hierarchy of the Wiki.
+    """
+    __slots__ = ('title', 'parent', 'children', 'depth')
+
+    def __init__(self, title):
+        self.title = title
+        self.parent = None
+        self.children = []
+        self.depth = 0
+
+    def __repr__(self):
+        return 'WikiNode({!r})'.format(self.title)
+
+
+class WikiTree(object):
+    """
+    Hierarchy of the Redmine Wiki pages (parent - child pages), built once from the Wiki index.
+    Pages whose parent is missing in the index are top level pages.
+    """
+
+    def __init__(self, pages_info=()):
+        """
+        Parameters:
+            pages_info (list): Wiki pages info (dictionaries with the title and the parent), as
+                returned by the Redmine Wiki index.
+        """
+        self._nodes = dict()
+        for page in pages_info:
+            self._nodes[page['title']] = WikiNode(page['title'])
+        for page in pages_info:
+            parent = self._nodes.get(page['parent']['title']) if 'parent' in page else None
+            if parent is not None:
+                node = self._nodes[page['title']]
+                node.parent = parent
+                parent.children.append(node)
+        self.roots = [node for node in self._nodes.values() if node.parent is None]
+        for node in self.walk():
+            node.depth = node.parent.depth + 1 if node.parent is not None else 0
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, title):
+        return title in self._nodes
+
+    def node(self, title):
+        """
+        Returns the node of a given page title, None if the page is not in the Wiki.
+        """
+        return self._nodes.get(title)
+
+    def children(self, title):
+        """
+        Returns the titles of the child pages of a given page.
+        """
+        node = self._nodes.get(title)
+        return [child.title for child in node.children] if node is not None else []
+
+    def walk(self, title=None):
+        """
+        Walks through the pages in topological order (breadth first), parents before their children.
+        Parameters:
+            title (str): Optional, the walk is limited to the section (subtree) of the given page.
+        Returns:
+            Yields the nodes.
+        """
+        if title is None:
+            queue = collections.deque(self.roots)
+        else:
+            queue = collections.deque([self._nodes[title]] if title in self._nodes else [])
+        while queue:
+            node = queue.popleft()
+            yield node
+            queue.extend(node.children)
+
+    def subtree(self, title):
+        """
+        Returns the titles of a given page and of all its descendants, in topological order.
+        """
+        return [node.title for node in self.walk(title)]
@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import collections
+import contextvars
+
+
+def _submit(executor, func, item):
+    # Run in a copy of the context of the caller, e.g. to keep the current tracing span.
+    return executor.submit(contextvars.copy_context().run, func, item)
+
+
+def run_concurrently(func, items, workers, follow_up=None):
+    """
+    Runs a function for each of the given items on a bounded pool of threads.
+    Items are consumed lazily, at most twice the number of workers are pending at any time.
+    Parameters:
+        func (function): Function called with a single item.
+        items (iterable): Items to process.
+        workers (int): Number of threads.
+        follow_up (function): Optional, called with an item and its result once the item is
+            processed. The returned items are scheduled as well.
+    Returns:
+        Yields an (item, result, error) tuple for each processed item, error is None if successful.
+    """
+    items = iter(items)
+    scheduled = collections.deque()
+    max_pending = 2 * max(workers, 1)
+    pending = {}
+    exhausted = False
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        while True:
+            while len(pending) < max_pending:
+                if scheduled:
+                    item = scheduled.popleft()
+                elif not exhausted:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                else:
+                    break
+                pending[_submit(executor, func, item)] = item
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    result = future.result()
+                except (Exception, SystemExit) as error:
+                    yield item, None, error
+                    continue
+                if follow_up:
+                    scheduled.extend(follow_up(item, result) or [])
+                yield item, result, None
+
+
+def map_ordered(func, items, workers):
+    """
+    Runs a function for each of the given items on a bounded pool of threads, and yields the results
+    in the order of the items. The next items are processed while the caller consumes a result.
+    Parameters:
+        func (function): Function called with a single item.
+        items (iterable): Items to process.
+        workers (int): Number of threads.
+    Returns:
+        Yields an (item, result, error) tuple for each item, in order, error is None if successful.
+    """
+    items = iter(items)
+    max_pending = 2 * max(workers, 1)
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for item in items:
+            pending.append((item, _submit(executor, func, item)))
+            if len(pending) >= max_pending:
+                break
+        while pending:
+            item, future = pending.popleft()
+            try:
+                result, error = future.result(), None
+            except (Exception, SystemExit) as e:
+                result, error = None, e
+            for next_item in items:
+                pending.append((next_item, _submit(executor, func, next_item)))
+                break
+            yield item, result, error
@@ -2,8 +2,16 @@
 Python program for exporting issues/wiki pages from Remine to Jira/Confluence
 """
 
+import helpers.ledger as ledger
+import helpers.macros as macros
+import helpers.prefetch as prefetch
 import helpers.process as process
+import helpers.rate_limit as rate_limit
 import helpers.settings as settings
+import helpers.tracing as tracing
+import helpers.users as users
+import helpers.wiki_index as wiki_index
+import helpers.wiki_tree as wiki_tree
 import logging
 
 
@@ -18,52 +26,73 @@ def main():
     # Initialize global variables and connections to the Redmine and Jira/Confluence servers.
 
     settings.init()
+    # Directory of the Redmine users, used to resolve the reporter and the assignee of the issues.
+    settings.user_directory = users.UserDirectory(process.get_users, process.get_user, process.find_user_id,
+                                                  cache_file=settings.yaml_vars.get('users_cache_file'),
+                                                  ttl_hours=settings.yaml_vars.get('users_cache_ttl'))
+    # Local record of the migrated issues and pages, kept between the runs.
+    settings.migration_ledger = ledger.MigrationLedger(settings.yaml_vars.get('ledger_file') or 'migration_ledger.db',
+                                                       settings.yaml_vars['jira_project'],
+                                                       settings.yaml_vars['redmine_wiki_project'],
+                                                       settings.yaml_vars['confluence_space'])
+
+    if not settings.arg_vars.wiki:
+        # Reads the Redmine issues (journals, attachments, relations and children), their checklists and
+        # sub-tasks concurrently.
+        settings.issue_prefetcher = prefetch.IssuePrefetcher(
+            process.fetch_issue, process.fetch_checklists,
+            settings.yaml_vars.get('prefetch_workers') or process.PREFETCH_WORKERS)
 
     # Perform Remine to Jira/Confluence migration.
-    if settings.arg_vars.pbi:
+    if settings.arg_vars.export_snapshot:
+        # Export the selected issues/pages to an offline snapshot, migrated later with --snapshot.
+        try:
+            process.export_snapshot(settings.arg_vars.export_snapshot)
+        except Exception as e:
+            print("Failed while exporting the snapshot {}: {}".format(settings.arg_vars.export_snapshot, e))
+
+    elif settings.arg_vars.query or (settings.arg_vars.pbi and not settings.arg_vars.pbi.isdigit()):
+        # Import a batch of Redmine issues (saved query, list or range of PBIs).
+        try:
+            process.import_issues(process.get_issues())
+        except Exception as e:
+            print("Failed while importing the Redmine issues: {}".format(e))
+
+    elif settings.arg_vars.pbi:
         try:
             # Fetch the Redmine issue.
-            redmine_issue = settings.redmine.issue.get(settings.arg_vars.pbi)
-            if process.validate_issue(redmine_issue):
-                if not settings.is_imported(redmine_issue.subject):
-                    # Create an issue in Jira.
-                    jira_issue = process.create_jira_issue(redmine_issue)
-                    # Update the Remine issue.
-                    process.update_redmine_issue(jira_issue.key, redmine_issue)
-                else:
-                    print("PBI is already imported in Jira")
+            redmine_issue = process.fetch_issue(settings.arg_vars.pbi)
+            process.import_issue(redmine_issue)
         except Exception as e:
             print("Failed while importing the Redmine issue {}: {}".format(
                 settings.arg_vars.pbi, e))
 
     elif settings.arg_vars.wiki:
         try:
-            settings.wiki_pages_rel = dict()
+            settings.wiki_tree = wiki_tree.WikiTree()
             settings.wiki_pages_imported = set()
+            # Index of the Redmine and Confluence titles, used to resolve the links between the pages.
+            settings.link_index = wiki_index.WikiLinkIndex(settings.yaml_vars['redmine_project_id'],
+                                                           process.get_pages_info,
+                                                           process.get_confluence_pages,
+                                                           process.get_wiki_page)
+            # Macros known by Confluence, the unknown ones are escaped before creating the pages.
+            settings.macro_registry = macros.MacroRegistry(process.get_confluence_macros,
+                                                           cache_file=settings.yaml_vars.get('macro_cache_file'))
             if settings.arg_vars.multiple or settings.arg_vars.all:
-                # Fetch Redmine wiki pages and initialize a dict with Parent - Child relations.
+                # Fetch Redmine wiki pages and build the hierarchy of the Wiki.
                 wiki_pages = process.get_pages_info()
-                for page in wiki_pages:
-                    if 'parent' in page:
-                        if page['parent']['title'] not in settings.wiki_pages_rel:
-                            settings.wiki_pages_rel[page['parent']['title']] = page['title']
-                        else:
-                            if not settings.wiki_pages_rel[page['parent']['title']]:
-                                settings.wiki_pages_rel[page['parent']['title']] = page['title']
-                            else:
-                                settings.wiki_pages_rel[page['parent']['title']] += ', ' + page[
-                                    'title']
-                    else:
-                        if page['title'] not in settings.wiki_pages_rel:
-                            settings.wiki_pages_rel[page['title']] = ''
+                settings.wiki_tree = wiki_tree.WikiTree(wiki_pages)
+                settings.link_index.add_redmine_pages(wiki_pages)
 
                 if settings.arg_vars.all:
-                    for wiki_page in settings.wiki_pages_rel:
-                        if wiki_page not in settings.wiki_pages_imported:
-                            process.import_confluence_wiki(wiki_page)
+                    # Fetch the original authors of the pages ahead, in parallel.
+                    process.prefetch_original_authors(wiki_pages)
+                    # Start from the top level pages, child pages are imported along with their parents.
+                    process.import_confluence_wikis([node.title for node in settings.wiki_tree.roots])
 
             if not settings.arg_vars.all:
-                process.import_confluence_wiki(settings.arg_vars.wiki)
+                process.import_confluence_wikis([settings.arg_vars.wiki])
 
         except Exception as e:
             print("Failed while importing the Redmine Wiki - {} : {}".format(
@@ -72,6 +101,22 @@ def main():
         finally:
             print("Migrated {} pages to Confluence".format(len(settings.wiki_pages_imported)))
 
+    if not settings.arg_vars.wiki:
+        settings.issue_prefetcher.close()
+
+    # Servers which throttled the requests: current limit of the concurrent requests and time spent waiting.
+    for host_stats in rate_limit.stats():
+        if host_stats['throttled']:
+            print("{host}: {throttled} of {requests} requests throttled, waited {backoff_seconds:.1f}s, "
+                  "concurrent requests limited to {limit}/{max_limit} (lowest {min_limit}), "
+                  "{rate:.1f} requests/s".format(**host_stats))
+
+    if tracing.enabled():
+        print("\nRequests sent to the servers (latencies in seconds):")
+        for line in tracing.summary():
+            print(line)
+        tracing.close()
+
 
 main()
 